@@ -24,6 +24,16 @@ static inline void writeq(__u64 val, volatile void __iomem *addr)
    #endif
 #endif /* X86 */
 
+/* hrtimer sleeps are in 2.6.28: before that, sleep a jiffy */
+#if LINUX_VERSION_CODE < KERNEL_VERSION(2,6,28)
+static inline int schedule_hrtimeout_range(ktime_t *expires,
+					   unsigned long delta, int mode)
+{
+	schedule_timeout(1);
+	return 0;
+}
+#endif
+
 /* Hack... something I sometimes need */
 static inline void dumpstruct(char *name, void *ptr, int size)
 {
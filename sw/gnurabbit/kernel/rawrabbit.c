@@ -16,12 +16,17 @@
 #include <linux/init.h>
 #include <linux/pci.h>
 #include <linux/fs.h>
+#include <linux/slab.h>
+#include <linux/mutex.h>
+#include <linux/poll.h>
 #include <linux/miscdevice.h>
 #include <linux/completion.h>
 #include <linux/interrupt.h>
 #include <linux/ioctl.h>
 #include <linux/vmalloc.h>
 #include <linux/mm.h>
+#include <linux/hrtimer.h>
+#include <linux/version.h>
 #include <asm/uaccess.h>
 
 #include "rawrabbit.h"
@@ -35,98 +40,304 @@ module_param_named(device, rr_device, int, 0);
 static int rr_bufsize = RR_DEFAULT_BUFSIZE;
 module_param_named(bufsize, rr_bufsize, int, 0);
 
-static struct rr_dev rr_dev; /* defined later */
+/*
+ * Every matching card gets its own rr_dev and /dev/rawrabbitN node. The
+ * historical /dev/rawrabbit node is bound to one of them, chosen by
+ * RR_DEVSEL for each open file, or to rr_nodev if no card is there.
+ */
+static struct file_operations rr_fops; /* defined later */
+static struct miscdevice rr_misc; /* defined later */
+
+static LIST_HEAD(rr_list);
+static DEFINE_SPINLOCK(rr_lock);	/* list, usecounts, rr_cards */
+static DEFINE_MUTEX(rr_select_lock);	/* RR_DEVSEL vs. driver registration */
+static unsigned long rr_cards;		/* bitmask of used indexes */
+static int rr_usecount;			/* open files, over all nodes */
+static unsigned long rr_flags;
+static struct completion rr_complete;
+
+static struct rr_dev rr_nodev = {
+	.q = __WAIT_QUEUE_HEAD_INITIALIZER(rr_nodev.q),
+	.lock = __SPIN_LOCK_UNLOCKED(rr_nodev.lock),
+	.index = -1,
+};
+
+static int rr_do_iocmd(struct rr_dev *dev, unsigned int cmd,
+		       struct rr_iocmd *iocmd); /* defined later */
+
+/* Access a 32-bit register from the interrupt handler, 0 on error */
+static u32 rr_irq_access(struct rr_dev *dev, unsigned int cmd, u32 address,
+			 u32 datum)
+{
+	struct rr_iocmd iocmd;
+
+	iocmd.address = address;
+	iocmd.datasize = 4;
+	iocmd.data32 = datum;
+	if (rr_do_iocmd(dev, cmd, &iocmd) < 0)
+		return 0;
+	return iocmd.data32;
+}
 
-/* Interrupt handler: just disable the interrupt in the controller */
+/*
+ * Interrupt handler: record the event and disable the interrupt in the
+ * controller, unless RR_IRQSRC told us how to acknowledge it in the board
+ */
 irqreturn_t rr_interrupt(int irq, void *devid)
 {
 	struct rr_dev *dev = devid;
+	struct rr_irqevent *ev;
+	u32 status = 0, ack = 0;
 
 	spin_lock(&dev->lock);
+	if (dev->irqsrcflags & RR_IRQSRC_STATUS) {
+		status = rr_irq_access(dev, RR_READ, dev->irqstatus, 0);
+		if (!status && (dev->irqsrcflags & RR_IRQSRC_ENABLE)) {
+			spin_unlock(&dev->lock);
+			return IRQ_NONE; /* another device on a shared line */
+		}
+	}
+	if (dev->irqsrcflags & RR_IRQSRC_ACK_READ)
+		ack = rr_irq_access(dev, RR_READ, dev->irqack, 0);
+	if (dev->irqsrcflags & RR_IRQSRC_ACK_WRITE)
+		rr_irq_access(dev, RR_WRITE, dev->irqack, status);
 	getnstimeofday(&dev->irqtime);
 	dev->irqcount++;
-	dev->flags |= RR_FLAG_IRQDISABLE;
-	disable_irq_nosync(irq);
+
+	/* the ring overwrites the oldest event when full */
+	ev = dev->events + (dev->ehead & (RR_NEVENTS - 1));
+	ev->time_ns = timespec_to_ns(&dev->irqtime);
+	ev->seq = dev->irqcount;
+	ev->status = status;
+	ev->ack = ack;
+	ev->unused = 0;
+	if (++dev->ehead - dev->etail > RR_NEVENTS) {
+		dev->etail++;
+		dev->elost++;
+	}
+
+	if (!(dev->irqsrcflags & RR_IRQSRC_ENABLE)) {
+		dev->flags |= RR_FLAG_IRQDISABLE;
+		disable_irq_nosync(irq);
+	}
 	spin_unlock(&dev->lock);
 	wake_up_interruptible(&dev->q);
+	kill_fasync(&dev->fasync, SIGIO, POLL_IN);
 	return IRQ_HANDLED;
 }
 
 /*
  * We have a PCI driver, used to access the BAR areas.
- * One device id only is supported. 
+ * One device id only is supported, but all cards with that id are driven.
  */
 
 static struct pci_device_id rr_idtable[2]; /* last must be zero */
+static struct rr_devsel rr_devsel;
 
-static void rr_fill_table(struct rr_dev *dev)
+static void rr_fill_table(struct rr_devsel *devsel)
 {
-	if (dev->devsel->subvendor == RR_DEVSEL_UNUSED) {
-		dev->id_table->subvendor = PCI_ANY_ID;
-		dev->id_table->subdevice = PCI_ANY_ID;
+	if (devsel->subvendor == RR_DEVSEL_UNUSED) {
+		rr_idtable->subvendor = PCI_ANY_ID;
+		rr_idtable->subdevice = PCI_ANY_ID;
 	} else {
-		dev->id_table->subvendor = dev->devsel->subvendor;
-		dev->id_table->subdevice = dev->devsel->subdevice;
+		rr_idtable->subvendor = devsel->subvendor;
+		rr_idtable->subdevice = devsel->subdevice;
 	}
-	dev->id_table->vendor = dev->devsel->vendor;
-	dev->id_table->device = dev->devsel->device;
+	rr_idtable->vendor = devsel->vendor;
+	rr_idtable->device = devsel->device;
 }
 
-static int rr_fill_table_and_probe(struct rr_dev *dev)
+static struct pci_driver rr_pcidrv; /* defined later */
+
+static int rr_fill_table_and_probe(void)
 {
 	int ret;
 
-	spin_lock(&dev->lock);
-	if (dev->flags & RR_FLAG_REGISTERED) {
-		pci_unregister_driver(dev->pci_driver);
-		dev->flags &= ~ RR_FLAG_REGISTERED;
+	if (rr_flags & RR_FLAG_REGISTERED) {
+		pci_unregister_driver(&rr_pcidrv);
+		rr_flags &= ~ RR_FLAG_REGISTERED;
 	}
-	spin_unlock(&dev->lock);
 
-	rr_fill_table(dev);
+	rr_fill_table(&rr_devsel);
 
 	/* Use the completion mechanism to be notified of probes */
-	spin_lock(&dev->lock);
-	init_completion(&dev->complete);
-	ret = pci_register_driver(dev->pci_driver);
-	if (ret == 0)
-		dev->flags |= RR_FLAG_REGISTERED;
-	spin_unlock(&dev->lock);
-
+	init_completion(&rr_complete);
+	ret = pci_register_driver(&rr_pcidrv);
 	if (ret < 0) {
 		printk(KERN_ERR "%s: Can't register pci driver\n",
 		       KBUILD_MODNAME);
 		return ret;
 	}
+	rr_flags |= RR_FLAG_REGISTERED;
+
 	/* This ret is 0 (timeout) or positive */
-	ret = wait_for_completion_timeout(&dev->complete, RR_PROBE_TIMEOUT);
+	ret = wait_for_completion_timeout(&rr_complete, RR_PROBE_TIMEOUT);
 	if (!ret) {
 		printk("%s: Warning: no device found\n", __func__);
 	}
 	return ret;
 }
 
+/* Return the first card matching devsel, with rr_lock held */
+static struct rr_dev *rr_find(struct rr_devsel *devsel)
+{
+	struct rr_dev *dev;
+	struct pci_dev *pdev;
+
+	list_for_each_entry(dev, &rr_list, list) {
+		pdev = dev->pdev;
+		if (devsel->vendor != pdev->vendor
+		    || devsel->device != pdev->device)
+			continue;
+		if (devsel->subvendor != RR_DEVSEL_UNUSED
+		    && (devsel->subvendor != pdev->subsystem_vendor
+			|| devsel->subdevice != pdev->subsystem_device))
+			continue;
+		if (devsel->bus != RR_DEVSEL_UNUSED
+		    && (devsel->bus != pdev->bus->number
+			|| devsel->devfn != pdev->devfn))
+			continue;
+		return dev;
+	}
+	return NULL;
+}
+
+/* The pages of the DMA buffer, from vmalloc or from the page allocator */
+static struct page *rr_bufpage(struct rr_dev *dev, unsigned long off)
+{
+	if (dev->bufflags & RR_DMA_CONTIGUOUS)
+		return virt_to_page(dev->dmabuf + off);
+	return vmalloc_to_page(dev->dmabuf + off);
+}
+
+static void rr_free_dmabuf(void *buf, int size, int flags)
+{
+	int i;
+
+	if (!buf)
+		return;
+	if (!(flags & RR_DMA_CONTIGUOUS)) {
+		vfree(buf);
+		return;
+	}
+	for (i = 0; i < size; i += PAGE_SIZE)
+		__free_page(virt_to_page(buf + i));
+}
+
+/*
+ * Contiguous buffers come from the page allocator, so they are limited to
+ * MAX_ORDER: the block is split, to map and free the pages one by one
+ */
+static void *rr_alloc_dmabuf(int size, int flags)
+{
+	struct page *page;
+	int i, order;
+
+	if (!(flags & RR_DMA_CONTIGUOUS))
+		return __vmalloc(size, GFP_KERNEL | __GFP_ZERO, PAGE_KERNEL);
+	order = get_order(size);
+	if (order >= MAX_ORDER)
+		return NULL;
+	page = alloc_pages(GFP_KERNEL | __GFP_ZERO | __GFP_NOWARN, order);
+	if (!page)
+		return NULL;
+	split_page(page, order);
+	for (i = size >> PAGE_SHIFT; i < (1 << order); i++)
+		__free_page(page + i);
+	return page_address(page);
+}
+
+static void rr_free(struct rr_dev *dev)
+{
+	rr_free_dmabuf(dev->dmabuf, dev->bufsize, dev->bufflags);
+	kfree(dev->events);
+	kfree(dev);
+}
+
+/* Bind a file to a card (or to rr_nodev), releasing the previous one */
+static void rr_bind(struct file *f, struct rr_dev *dev)
+{
+	struct rr_dev *old = f->private_data;
+	int gone = 0;
+
+	/* SIGIO is not moved to the new card: O_ASYNC must be set again */
+	if (old && old != dev)
+		fasync_helper(-1, f, 0, &old->fasync);
+
+	spin_lock(&rr_lock);
+	if (old) {
+		old->usecount--;
+		gone = (old->flags & RR_FLAG_GONE) && !old->usecount;
+	}
+	if (dev)
+		dev->usecount++;
+	f->private_data = dev;
+	spin_unlock(&rr_lock);
+	if (gone)
+		rr_free(old);
+}
+
+/* Select the card for this file: re-probe only if it's not ours yet */
+static int rr_select(struct file *f, struct rr_devsel *devsel)
+{
+	struct rr_dev *dev;
+	int ret = 0;
+
+	mutex_lock(&rr_select_lock);
+	spin_lock(&rr_lock);
+	dev = rr_find(devsel);
+	if (!dev && rr_usecount > 1) {
+		/* Re-registering the driver would remove cards in use */
+		printk("usecount %i\n", rr_usecount);
+		ret = -EBUSY;
+	}
+	spin_unlock(&rr_lock);
+	if (!dev && !ret) {
+		rr_bind(f, &rr_nodev);
+		rr_devsel = *devsel;
+		ret = rr_fill_table_and_probe();
+		if (ret >= 0) {
+			spin_lock(&rr_lock);
+			dev = rr_find(devsel);
+			spin_unlock(&rr_lock);
+			ret = dev ? 0 : -ENODEV; /* timeout or other bus/devfn */
+		}
+	}
+	if (dev)
+		rr_bind(f, dev);
+	mutex_unlock(&rr_select_lock);
+	return ret;
+}
+
 /* The probe and remove function can't get locks, as it's already locked */
 static int rr_pciprobe (struct pci_dev *pdev, const struct pci_device_id *id)
 {
-	struct rr_dev *dev = &rr_dev;
+	struct rr_dev *dev;
 	int i;
 
-	/* Only manage one device, refuse further probes */
-	if (dev->pdev)
-		return -EBUSY;
 	/* vendor/device and subvendor/subdevice have already been matched */
-	if (dev->devsel->bus != RR_DEVSEL_UNUSED) {
-		if (dev->devsel->bus != pdev->bus->number)
-			return -ENODEV;
-		if (dev->devsel->devfn != pdev->devfn)
-			return -ENODEV;
+	dev = kzalloc(sizeof(*dev), GFP_KERNEL);
+	if (!dev)
+		return -ENOMEM;
+	dev->bufsize = rr_bufsize;
+	dev->dmabuf = rr_alloc_dmabuf(dev->bufsize, 0);
+	dev->events = kzalloc(RR_NEVENTS * sizeof(*dev->events), GFP_KERNEL);
+	if (!dev->dmabuf || !dev->events) {
+		rr_free(dev);
+		return -ENOMEM;
 	}
+	spin_lock_init(&dev->lock);
+	init_waitqueue_head(&dev->q);
+	init_rwsem(&dev->bufsem);
+
 	i = pci_enable_device(pdev);
-	if (i < 0)
-	    return i;
+	if (i < 0) {
+		rr_free(dev);
+		return i;
+	}
 
 	dev->pdev = pdev;
+	pci_set_drvdata(pdev, dev);
 
 	/* FIXME: how to know if irq is valid? */
 	if (pdev->irq > 0) {
@@ -140,8 +351,6 @@ static int rr_pciprobe (struct pci_dev *pdev, const struct pci_device_id *id)
 		}
 	}
 
-	complete(&dev->complete);
-
 	if (0) {	/* Print some information about the bars */
 		int i;
 		struct resource *r;
@@ -167,15 +376,40 @@ static int rr_pciprobe (struct pci_dev *pdev, const struct pci_device_id *id)
 						r->end + 1 - r->start);
 	}
 
+	/* Give it a name and a device node: /dev/rawrabbitN */
+	spin_lock(&rr_lock);
+	dev->index = find_first_zero_bit(&rr_cards, RR_MAX_CARDS);
+	if (dev->index < RR_MAX_CARDS)
+		set_bit(dev->index, &rr_cards);
+	spin_unlock(&rr_lock);
+	if (dev->index < RR_MAX_CARDS) {
+		sprintf(dev->name, "rawrabbit%i", dev->index);
+		dev->misc.minor = MISC_DYNAMIC_MINOR;
+		dev->misc.name = dev->name;
+		dev->misc.fops = &rr_fops;
+		if (misc_register(&dev->misc) == 0)
+			dev->flags |= RR_FLAG_MISC;
+	}
+	if (!(dev->flags & RR_FLAG_MISC))
+		printk(KERN_WARNING "%s: no device node for %s\n",
+		       KBUILD_MODNAME, pci_name(pdev));
+
+	spin_lock(&rr_lock);
+	list_add_tail(&dev->list, &rr_list);
+	spin_unlock(&rr_lock);
+
+	complete(&rr_complete);
 	return 0;
 }
 
 /* This function is called when the pcidrv is removed, with lock held */
 static void rr_pciremove(struct pci_dev *pdev)
 {
-	struct rr_dev *dev = &rr_dev;
-	int i;
+	struct rr_dev *dev = pci_get_drvdata(pdev);
+	int i, gone;
 
+	if (dev->flags & RR_FLAG_MISC)
+		misc_deregister(&dev->misc);
 	if (dev->flags & RR_FLAG_IRQREQUEST) {
 		free_irq(pdev->irq, dev);
 		dev->flags &= ~RR_FLAG_IRQREQUEST;
@@ -191,7 +425,19 @@ static void rr_pciremove(struct pci_dev *pdev)
 		dev->area[i] = NULL;
 	}
 
+	/* Files still open get ENODEV; the last one (or mapping) frees us */
+	spin_lock(&rr_lock);
+	list_del(&dev->list);
+	if (dev->index < RR_MAX_CARDS)
+		clear_bit(dev->index, &rr_cards);
 	dev->pdev = NULL;
+	dev->flags |= RR_FLAG_GONE;
+	gone = !dev->usecount;
+	spin_unlock(&rr_lock);
+	wake_up_interruptible(&dev->q); /* poll reports the hangup */
+	pci_set_drvdata(pdev, NULL);
+	if (gone)
+		rr_free(dev);
 }
 
 static struct pci_driver rr_pcidrv = {
@@ -201,15 +447,6 @@ static struct pci_driver rr_pcidrv = {
 	.remove = rr_pciremove,
 };
 
-/* There is only one device by now; I didn't find how to associate to pcidev */
-static struct rr_devsel rr_devsel;
-static struct rr_dev rr_dev = {
-	.pci_driver = &rr_pcidrv,
-	.id_table = rr_idtable,
-	.q = __WAIT_QUEUE_HEAD_INITIALIZER(rr_dev.q),
-	.devsel = &rr_devsel,
-};
-
 
 /*
  * These functions are (inlined) helpers for ioctl
@@ -358,8 +595,8 @@ static int rr_do_write_io(struct rr_dev *dev, struct rr_iocmd *iocmd)
 static int rr_do_iocmd_dmabuf(struct rr_dev *dev, unsigned int cmd,
 		       struct rr_iocmd *iocmd)
 {
-	int off = __RR_GET_OFF(iocmd->address);
-	if (off >= rr_bufsize)
+	int off = __RR_GET_BUFOFF(iocmd->address);
+	if (off >= dev->bufsize)
 		return -ENOMEDIUM;
 
 	switch(iocmd->datasize) {
@@ -402,7 +639,7 @@ static int rr_do_iocmd_dmabuf(struct rr_dev *dev, unsigned int cmd,
 static int rr_do_iocmd(struct rr_dev *dev, unsigned int cmd,
 		       struct rr_iocmd *iocmd)
 {
-	int bar;
+	int bar, ret;
 	unsigned off;
 	struct resource *r;
 
@@ -412,8 +649,13 @@ static int rr_do_iocmd(struct rr_dev *dev, unsigned int cmd,
 	if (!rr_is_valid_bar(iocmd->address))
 		return -EINVAL;
 
-	if (rr_is_dmabuf_bar(iocmd->address))
-		return rr_do_iocmd_dmabuf(dev, cmd, iocmd);
+	if (rr_is_dmabuf_bar(iocmd->address)) {
+		/* never in the interrupt handler: see rr_do_irqsrc */
+		down_read(&dev->bufsem);
+		ret = rr_do_iocmd_dmabuf(dev, cmd, iocmd);
+		up_read(&dev->bufsem);
+		return ret;
+	}
 
 	bar /= 2;			/* use 0,1,2 as index */
 	r = dev->area[bar];
@@ -436,6 +678,220 @@ static int rr_do_iocmd(struct rr_dev *dev, unsigned int cmd,
 	return -EIO;
 }
 
+/* Run a number of commands, stopping at the first error */
+static int rr_do_batch(struct rr_dev *dev, struct rr_iobatch *batch)
+{
+	struct rr_iocmd __user *uptr;
+	struct rr_iocmd iocmd;
+	unsigned int cmd;
+	int i, ret = 0;
+
+	if (batch->count > RR_BATCH_MAX)
+		return -EINVAL;
+	uptr = (struct rr_iocmd __user *)(unsigned long)batch->cmds;
+	if (!access_ok(VERIFY_WRITE, uptr, batch->count * sizeof(*uptr)))
+		return -EFAULT;
+
+	for (i = 0; i < batch->count; i++, uptr++) {
+		if (__copy_from_user(&iocmd, uptr, sizeof(iocmd)))
+			return -EFAULT;
+		cmd = RR_READ;
+		if (iocmd.datasize & RR_BATCH_WRITE)
+			cmd = RR_WRITE;
+		iocmd.datasize &= ~RR_BATCH_WRITE;
+		ret = rr_do_iocmd(dev, cmd, &iocmd);
+		if (ret < 0)
+			break;
+		if (cmd == RR_READ && __copy_to_user(&uptr->data64,
+				&iocmd.data64, sizeof(iocmd.data64)))
+			return -EFAULT;
+	}
+	return ret;
+}
+
+/*
+ * Poll a register: spin for a while, as most waits are short, then
+ * sleep between reads so long waits don't burn a CPU. The sleeps are
+ * hrtimer ones, doubling from a few microseconds, so a wait just past
+ * the spin is not rounded up to a jiffy.
+ */
+static int rr_do_poll(struct rr_dev *dev, struct rr_iopoll *poll)
+{
+	struct rr_iocmd iocmd;
+	struct timespec t0, t;
+	unsigned long sleep_ns = RR_POLL_SLEEP_MIN_NS;
+	ktime_t expires;
+	int ret, match;
+
+	iocmd.address = poll->address;
+	iocmd.datasize = poll->datasize;
+	getnstimeofday(&t0);
+	while (1) {
+		iocmd.data64 = 0;
+		ret = rr_do_iocmd(dev, RR_READ, &iocmd);
+		if (ret < 0)
+			return ret;
+		getnstimeofday(&t);
+		poll->data64 = iocmd.data64;
+		poll->elapsed_ns = (u64)(t.tv_sec - t0.tv_sec) * NSEC_PER_SEC
+			+ t.tv_nsec - t0.tv_nsec;
+		match = (iocmd.data64 & poll->mask) == poll->value;
+		if (poll->flags & RR_POLL_NE)
+			match = !match;
+		if (match)
+			return 0;
+		if (poll->elapsed_ns >= poll->timeout_ns)
+			return -ETIMEDOUT;
+		if (signal_pending(current))
+			return -EINTR;
+		if (poll->elapsed_ns < RR_POLL_SPIN_NS) {
+			cpu_relax();
+			continue;
+		}
+		if (sleep_ns > poll->timeout_ns - poll->elapsed_ns)
+			sleep_ns = poll->timeout_ns - poll->elapsed_ns;
+		expires = ktime_set(0, sleep_ns);
+		set_current_state(TASK_INTERRUPTIBLE);
+		schedule_hrtimeout_range(&expires, sleep_ns / 4,
+					 HRTIMER_MODE_REL);
+		sleep_ns = min(sleep_ns * 2, (unsigned long)RR_POLL_SLEEP_MAX_NS);
+	}
+}
+
+/* Change how the interrupt handler finds the source and acknowledges */
+static int rr_do_irqsrc(struct rr_dev *dev, struct rr_irqsrc *src)
+{
+	int ack = src->flags & (RR_IRQSRC_ACK_READ | RR_IRQSRC_ACK_WRITE);
+
+	/* the handler can't wait for the DMA buffer, that may be resized */
+	if ((src->flags & RR_IRQSRC_STATUS) && (!rr_is_valid_bar(src->status)
+					|| rr_is_dmabuf_bar(src->status)))
+		return -EINVAL;
+	if (ack && (!rr_is_valid_bar(src->ack) || rr_is_dmabuf_bar(src->ack)))
+		return -EINVAL;
+	/* keeping the line enabled with no acknowledge would lock the host */
+	if ((src->flags & RR_IRQSRC_ENABLE) && !ack)
+		return -EINVAL;
+
+	spin_lock_irq(&dev->lock);
+	dev->irqstatus = src->status;
+	dev->irqack = src->ack;
+	dev->irqsrcflags = src->flags;
+	if ((src->flags & RR_IRQSRC_ENABLE)
+	    && (dev->flags & RR_FLAG_IRQDISABLE)) {
+		dev->flags &= ~RR_FLAG_IRQDISABLE;
+		enable_irq(dev->pdev->irq);
+	}
+	spin_unlock_irq(&dev->lock);
+	return 0;
+}
+
+/* Copy the recorded events to user space, possibly waiting for one */
+static int rr_do_getevents(struct rr_dev *dev, struct rr_ioevents *ioev)
+{
+	struct rr_irqevent __user *uptr;
+	struct rr_irqevent ev;
+	int i;
+
+	if (ioev->count > RR_NEVENTS)
+		ioev->count = RR_NEVENTS;
+	uptr = (struct rr_irqevent __user *)(unsigned long)ioev->events;
+	if (!access_ok(VERIFY_WRITE, uptr, ioev->count * sizeof(*uptr)))
+		return -EFAULT;
+
+	if ((ioev->flags & RR_EVENTS_WAIT)
+	    && wait_event_interruptible(dev->q, dev->ehead != dev->etail
+					|| !dev->pdev))
+		return -ERESTARTSYS;
+
+	spin_lock_irq(&dev->lock);
+	ioev->lost = dev->elost;
+	dev->elost = 0;
+	spin_unlock_irq(&dev->lock);
+
+	/* one at a time, as we can't copy to user space with the lock */
+	for (i = 0; i < ioev->count; i++) {
+		spin_lock_irq(&dev->lock);
+		if (dev->ehead == dev->etail) {
+			spin_unlock_irq(&dev->lock);
+			break;
+		}
+		ev = dev->events[dev->etail++ & (RR_NEVENTS - 1)];
+		spin_unlock_irq(&dev->lock);
+		if (__copy_to_user(uptr + i, &ev, sizeof(ev)))
+			return -EFAULT;
+	}
+	ioev->count = i;
+	return 0;
+}
+
+/* The frame numbers of the DMA buffer, for buffers of any size */
+static int rr_do_getplist64(struct rr_dev *dev, struct rr_plist *plist)
+{
+	__u64 __user *uptr;
+	int i, npages;
+
+	down_read(&dev->bufsem);
+	npages = dev->bufsize >> PAGE_SHIFT;
+	if (plist->count > npages)
+		plist->count = npages;
+	uptr = (__u64 __user *)(unsigned long)plist->pages;
+	if (!access_ok(VERIFY_WRITE, uptr, plist->count * sizeof(*uptr)))
+		npages = -EFAULT;
+	for (i = 0; npages > 0 && i < plist->count; i++)
+		if (__put_user(page_to_pfn(rr_bufpage(dev, i * PAGE_SIZE)),
+			       uptr + i))
+			npages = -EFAULT;
+	up_read(&dev->bufsem);
+	return npages;
+}
+
+/* Replace the DMA buffer, unless it is mapped; the old one is freed */
+static int rr_do_setdmasize(struct rr_dev *dev, struct rr_dmasize *ds)
+{
+	int size = PAGE_ALIGN(ds->size), oldsize, oldflags;
+	void *buf, *old;
+
+	if (!size || ds->size > RR_MAX_BUFSIZE
+	    || (ds->flags & ~RR_DMA_CONTIGUOUS))
+		return -EINVAL;
+	if (atomic_read(&dev->bufmaps))
+		return -EBUSY;
+	buf = rr_alloc_dmabuf(size, ds->flags);
+	if (!buf)
+		return -ENOMEM;
+
+	down_write(&dev->bufsem);
+	if (atomic_read(&dev->bufmaps)) {	/* mapped meanwhile */
+		up_write(&dev->bufsem);
+		rr_free_dmabuf(buf, size, ds->flags);
+		return -EBUSY;
+	}
+	old = dev->dmabuf;
+	oldsize = dev->bufsize;
+	oldflags = dev->bufflags;
+	dev->dmabuf = buf;
+	dev->bufsize = size;
+	dev->bufflags = ds->flags;
+	up_write(&dev->bufsem);
+
+	rr_free_dmabuf(old, oldsize, oldflags);
+	return 0;
+}
+
+/* Nanoseconds from the interrupt to now, capped at 1s to fit the int */
+static int rr_delay_ns(struct timespec *now, struct timespec *irq)
+{
+	long ns;
+
+	if (now->tv_sec - irq->tv_sec > 1)
+		return NSEC_PER_SEC;
+	ns = (now->tv_sec - irq->tv_sec) * NSEC_PER_SEC
+		+ now->tv_nsec - irq->tv_nsec;
+	if (ns > NSEC_PER_SEC)
+		return NSEC_PER_SEC;
+	return ns;
+}
 
 /*
  * The ioctl method is the one used for strange stuff (see docs)
@@ -447,13 +903,18 @@ static long rr_ioctl(struct file *f, unsigned int cmd, unsigned long arg)
 	int ret = 0;
 	unsigned long count;
 	struct timespec tv, tvirq;
-	void *addr;
 	u32 __user *uptr = (u32 __user *)arg;
 
 	/* local copies: use a union to save stack space */
 	union {
 		struct rr_iocmd iocmd;
 		struct rr_devsel devsel;
+		struct rr_iobatch iobatch;
+		struct rr_iopoll iopoll;
+		struct rr_irqsrc irqsrc;
+		struct rr_ioevents ioevents;
+		struct rr_plist plist;
+		struct rr_dmasize dmasize;
 	} karg;
 
 	/*
@@ -483,32 +944,22 @@ static long rr_ioctl(struct file *f, unsigned int cmd, unsigned long arg)
 		if (copy_from_user(&karg, (void *)arg, size))
 			return -EFAULT;
 
+	/* the card may be missing or removed: only DEVSEL can fix it */
+	if (!dev->pdev && cmd != RR_DEVSEL)
+		return -ENODEV;
+
 	switch(cmd) {
 
 	case RR_DEVSEL:
-		/* If we are the only user, change device requested id */
-		spin_lock(&dev->lock);
-		if (dev->usecount > 1) {
-			printk("usecount %i\n", dev->usecount);
-			ret = -EBUSY;
-		}
-		spin_unlock(&dev->lock);
-		if (ret < 0)
-			break;
-		/* Warning: race: we can't take the lock */
-		*dev->devsel = karg.devsel;
-		ret = rr_fill_table_and_probe(dev);
-		if (!ret)
-			ret = -ENODEV; /* timeout */
-		else if (ret > 0)
-			ret = 0; /* success */
+		/* Bind this file to the requested card, probing if needed */
+		ret = rr_select(f, &karg.devsel);
 		break;
 
 	case RR_DEVGET:
 		/* Return to user space the id of the current device */
-		spin_lock(&dev->lock);
+		spin_lock(&rr_lock);
 		if (!dev->pdev) {
-			spin_unlock(&dev->lock);
+			spin_unlock(&rr_lock);
 			return -ENODEV;
 		}
 		memset(&karg.devsel, 0, sizeof(karg.devsel));
@@ -518,7 +969,7 @@ static long rr_ioctl(struct file *f, unsigned int cmd, unsigned long arg)
 		karg.devsel.subdevice = dev->pdev->subsystem_device;
 		karg.devsel.bus = dev->pdev->bus->number;
 		karg.devsel.devfn = dev->pdev->devfn;
-		spin_unlock(&dev->lock);
+		spin_unlock(&rr_lock);
 		break;
 
 	case RR_READ:	/* Read a "word" of memory */
@@ -526,6 +977,25 @@ static long rr_ioctl(struct file *f, unsigned int cmd, unsigned long arg)
 		ret = rr_do_iocmd(dev, cmd, &karg.iocmd);
 		break;
 
+	case RR_BATCH:	/* Run several reads and writes at once */
+		ret = rr_do_batch(dev, &karg.iobatch);
+		break;
+
+	case RR_POLL:	/* Wait for a register to reach a value */
+		ret = rr_do_poll(dev, &karg.iopoll);
+		if (ret == -ETIMEDOUT) /* return the last value anyways */
+			if (copy_to_user((void *)arg, &karg, size))
+				return -EFAULT;
+		break;
+
+	case RR_IRQSRC:	/* Acknowledge the interrupt in the handler */
+		ret = rr_do_irqsrc(dev, &karg.irqsrc);
+		break;
+
+	case RR_GETEVENTS: /* Return the interrupts recorded so far */
+		ret = rr_do_getevents(dev, &karg.ioevents);
+		break;
+
 	case RR_IRQWAIT: /* Wait for an interrupt to happen */
 		spin_lock_irq(&dev->lock);
 		count = dev->irqcount;
@@ -534,10 +1004,18 @@ static long rr_ioctl(struct file *f, unsigned int cmd, unsigned long arg)
 		spin_unlock_irq(&dev->lock);
 		if (ret < 0)
 			return ret;
-		wait_event_interruptible(dev->q, count != dev->irqcount);
+		wait_event_interruptible(dev->q, count != dev->irqcount
+					 || !dev->pdev);
 		if (signal_pending(current))
 			return -ERESTARTSYS;
-		return 0;
+		if (!dev->pdev)
+			return -ENODEV; /* the card was removed meanwhile */
+		/* return the wakeup delay to user space, capped at 1s */
+		spin_lock_irq(&dev->lock);
+		getnstimeofday(&tv);
+		tvirq = dev->irqtime;
+		spin_unlock_irq(&dev->lock);
+		return rr_delay_ns(&tv, &tvirq);
 
 	case RR_IRQENA:	/* Re-enable the interrupt after handling it */
 		spin_lock_irq(&dev->lock);
@@ -553,16 +1031,13 @@ static long rr_ioctl(struct file *f, unsigned int cmd, unsigned long arg)
 		if (ret < 0)
 			return ret;
 		/* return the delay to user space, capped at 1s */
-		if (tv.tv_sec - tvirq.tv_sec > 1)
-			return NSEC_PER_SEC;
-		ret = (tv.tv_sec - tvirq.tv_sec) * NSEC_PER_SEC
-			+ tv.tv_nsec - tvirq.tv_nsec;
-		if (ret > NSEC_PER_SEC)
-			return NSEC_PER_SEC;
-		return ret;
+		return rr_delay_ns(&tv, &tvirq);
 
 	case RR_GETDMASIZE:	/* Return the current dma size */
-		return rr_bufsize;
+		return dev->bufsize;
+
+	case RR_SETDMASIZE:	/* Replace the buffer */
+		return rr_do_setdmasize(dev, &karg.dmasize);
 
 	case RR_GETPLIST:	/* Return the page list */
 
@@ -574,17 +1049,25 @@ static long rr_ioctl(struct file *f, unsigned int cmd, unsigned long arg)
 
 		if (!access_ok(VERIFY_WRITE, arg, RR_PLIST_SIZE))
 			return -EFAULT;
-		for (addr = dev->dmabuf; addr - dev->dmabuf < rr_bufsize;
-		     addr += PAGE_SIZE) {
+		/* 32 bits each, and only a page of them: see GETPLIST64 */
+		down_read(&dev->bufsem);
+		for (count = 0; count < dev->bufsize
+			     && uptr - (u32 __user *)arg < RR_PLIST_LEN;
+		     count += PAGE_SIZE) {
 			if (0) {
-				printk("page @ %p - pfn %08lx\n", addr,
-				       page_to_pfn(vmalloc_to_page(addr)));
+				printk("page @ %p - pfn %08lx\n",
+				       dev->dmabuf + count,
+				       page_to_pfn(rr_bufpage(dev, count)));
 			}
-			__put_user(page_to_pfn(vmalloc_to_page(addr)), uptr);
+			__put_user(page_to_pfn(rr_bufpage(dev, count)), uptr);
 			uptr++;
 		}
+		up_read(&dev->bufsem);
 		return 0;
 
+	case RR_GETPLIST64:	/* Return the whole page list, 64 bits */
+		return rr_do_getplist64(dev, &karg.plist);
+
 	default:
 		return -ENOIOCTLCMD;
 	}
@@ -603,30 +1086,167 @@ static long rr_ioctl(struct file *f, unsigned int cmd, unsigned long arg)
  */
 static int rr_open(struct inode *ino, struct file *f)
 {
-	struct rr_dev *dev = &rr_dev;
-	f->private_data = dev;
+	struct rr_dev *dev, *found = NULL;
+	int minor = iminor(ino);
+
+	spin_lock(&rr_lock);
+	if (minor == rr_misc.minor) {
+		/* the legacy node: the selected card, if any */
+		found = rr_find(&rr_devsel);
+		if (!found)
+			found = &rr_nodev;
+	} else {
+		list_for_each_entry(dev, &rr_list, list)
+			if ((dev->flags & RR_FLAG_MISC)
+			    && dev->misc.minor == minor)
+				found = dev;
+	}
+	if (found) {
+		found->usecount++;
+		rr_usecount++;
+	}
+	spin_unlock(&rr_lock);
+	if (!found)
+		return -ENODEV;
+	f->private_data = found;
+	return 0;
+}
 
-	spin_lock(&dev->lock);
-	dev->usecount++;
-	spin_unlock(&dev->lock);
+static int rr_release(struct inode *ino, struct file *f)
+{
+	rr_bind(f, NULL);
 
+	spin_lock(&rr_lock);
+	rr_usecount--;
+	spin_unlock(&rr_lock);
 	return 0;
 }
 
-static int rr_release(struct inode *ino, struct file *f)
+/*
+ * poll/select report a pending interrupt as input, so a single process
+ * can wait for several cards; as for RR_IRQWAIT, the interrupt stays
+ * pending (the line disabled) until RR_IRQENA.
+ */
+static unsigned int rr_poll(struct file *f, struct poll_table_struct *wait)
 {
 	struct rr_dev *dev = f->private_data;
+	unsigned int mask = 0;
+
+	poll_wait(f, &dev->q, wait);
+	if (!dev->pdev)
+		return POLLERR | POLLHUP;
+	spin_lock_irq(&dev->lock);
+	if (dev->irqsrcflags & RR_IRQSRC_ENABLE) {
+		/* the line is never disabled: report unread events */
+		if (dev->ehead != dev->etail)
+			mask |= POLLIN | POLLRDNORM | POLLPRI;
+	} else if (dev->flags & RR_FLAG_IRQDISABLE) {
+		mask |= POLLIN | POLLRDNORM | POLLPRI;
+	}
+	spin_unlock_irq(&dev->lock);
+	return mask;
+}
 
-	spin_lock(&dev->lock);
-	dev->usecount--;
-	spin_unlock(&dev->lock);
+static int rr_fasync(int fd, struct file *f, int on)
+{
+	struct rr_dev *dev = f->private_data;
+
+	return fasync_helper(fd, f, on, &dev->fasync);
+}
 
+/*
+ * The DMA buffer is vmalloc memory (or single pages), so it is mapped page
+ * by page at fault time. BAR areas, instead, are physically contiguous and
+ * remapped at once. The buffer can't be resized while it is mapped.
+ */
+static int rr_vm_fault(struct vm_area_struct *vma, struct vm_fault *vmf)
+{
+	struct rr_dev *dev = vma->vm_private_data;
+	unsigned long off = __RR_GET_BUFOFF(vmf->pgoff << PAGE_SHIFT);
+	struct page *page;
+
+	if (off >= dev->bufsize)
+		return VM_FAULT_SIGBUS;
+	page = rr_bufpage(dev, off);
+	get_page(page);
+	vmf->page = page;
 	return 0;
 }
 
+/* A mapping holds the card like an open file: it outlives DEVSEL or close */
+static void rr_vm_open(struct vm_area_struct *vma)
+{
+	struct rr_dev *dev = vma->vm_private_data;
+
+	spin_lock(&rr_lock);
+	dev->usecount++;
+	spin_unlock(&rr_lock);
+	atomic_inc(&dev->bufmaps);
+}
+
+static void rr_vm_close(struct vm_area_struct *vma)
+{
+	struct rr_dev *dev = vma->vm_private_data;
+	int gone;
+
+	atomic_dec(&dev->bufmaps);
+	spin_lock(&rr_lock);
+	dev->usecount--;
+	gone = (dev->flags & RR_FLAG_GONE) && !dev->usecount;
+	spin_unlock(&rr_lock);
+	if (gone)
+		rr_free(dev);
+}
+
+static struct vm_operations_struct rr_vm_ops = {
+	.open = rr_vm_open,
+	.close = rr_vm_close,
+	.fault = rr_vm_fault,
+};
+
 static int rr_mmap(struct file *f, struct vm_area_struct *vma)
 {
-	return -EOPNOTSUPP;
+	struct rr_dev *dev = f->private_data;
+	unsigned long pos = vma->vm_pgoff << PAGE_SHIFT;
+	unsigned long size = vma->vm_end - vma->vm_start;
+	struct resource *r;
+	int bar, off;
+
+	if (!dev->pdev)
+		return -ENODEV;
+	if (!rr_is_valid_bar(pos))
+		return -EINVAL;
+	off = __RR_GET_OFF(pos);
+
+	if (RR_IS_DMABUF(pos)) {
+		off = __RR_GET_BUFOFF(pos);
+		down_read(&dev->bufsem);
+		if (off + size > dev->bufsize) {
+			up_read(&dev->bufsem);
+			return -EINVAL;
+		}
+		vma->vm_ops = &rr_vm_ops;
+		vma->vm_private_data = dev;
+		rr_vm_open(vma); /* not called by the kernel for the first one */
+		up_read(&dev->bufsem);
+		return 0;
+	}
+
+	bar = __RR_GET_BAR(pos) / 2; /* index in the array */
+	r = dev->area[bar];
+	if (!r)
+		return -ENODEV;
+	/* I/O ports can't be mapped, like they can't be read or written */
+	if (!(r->flags & IORESOURCE_MEM))
+		return -EINVAL;
+	if (off + size > r->end + 1 - r->start)
+		return -EINVAL;
+
+	vma->vm_flags |= VM_IO | VM_RESERVED;
+	vma->vm_page_prot = pgprot_noncached(vma->vm_page_prot);
+	return io_remap_pfn_range(vma, vma->vm_start,
+				  (r->start + off) >> PAGE_SHIFT,
+				  size, vma->vm_page_prot);
 }
 
 static ssize_t rr_read(struct file *f, char __user *buf, size_t count,
@@ -635,24 +1255,29 @@ static ssize_t rr_read(struct file *f, char __user *buf, size_t count,
 	struct rr_dev *dev = f->private_data;
 	void *base;
 	loff_t pos = *offp;
-	int bar, off, size;
+	int bar, off, size, i;
 
 	bar = __RR_GET_BAR(pos) / 2; /* index in the array */
 	off = __RR_GET_OFF(pos);
 	if (0)
 		printk("%s: pos %llx = bar %x off %x\n", __func__, pos,
 		       bar*2, off);
+	if (!dev->pdev)
+		return -ENODEV;
 	if (!rr_is_valid_bar(pos))
 		return -EINVAL;
 
 	/* reading the DMA buffer is trivial, so do it first */
 	if (RR_IS_DMABUF(pos)) {
-		base = dev->dmabuf;
-		if (off >= rr_bufsize)
-			return 0; /* EOF */
-		if (off + count > rr_bufsize)
-			count = rr_bufsize - off;
-		if (copy_to_user(buf, base + off, count))
+		off = __RR_GET_BUFOFF(pos);
+		down_read(&dev->bufsem);
+		if (off >= dev->bufsize)
+			count = 0; /* EOF */
+		else if (off + count > dev->bufsize)
+			count = dev->bufsize - off;
+		i = copy_to_user(buf, dev->dmabuf + off, count);
+		up_read(&dev->bufsem);
+		if (i)
 			return -EFAULT;
 		*offp += count;
 		return count;
@@ -687,8 +1312,15 @@ static ssize_t rr_read(struct file *f, char __user *buf, size_t count,
 			return -EFAULT;
 		break;
 	default:
-		if (copy_to_user(buf, base + off, count))
-			return -EFAULT;
+		/* registers are 32 bits wide: copy words if aligned */
+		if ((off | count) & 3) {
+			if (copy_to_user(buf, base + off, count))
+				return -EFAULT;
+			break;
+		}
+		for (i = 0; i < count; i += 4)
+			if (put_user(readl(base + off + i), (u32 *)(buf + i)))
+				return -EFAULT;
 	}
 	*offp += count;
 	return count;
@@ -700,21 +1332,28 @@ static ssize_t rr_write(struct file *f, const char __user *buf, size_t count,
 	struct rr_dev *dev = f->private_data;
 	void *base;
 	loff_t pos = *offp;
-	int bar, off, size;
+	int bar, off, size, i;
 	union {u8 d8; u16 d16; u32 d32; u64 d64;} data;
 	bar = __RR_GET_BAR(pos) / 2; /* index in the array */
 	off = __RR_GET_OFF(pos);
+	if (!dev->pdev)
+		return -ENODEV;
 	if (!rr_is_valid_bar(pos))
 		return -EINVAL;
 
 	/* writing the DMA buffer is trivial, so do it first */
 	if (RR_IS_DMABUF(pos)) {
-		base = dev->dmabuf;
-		if (off >= rr_bufsize)
+		off = __RR_GET_BUFOFF(pos);
+		down_read(&dev->bufsem);
+		if (off >= dev->bufsize) {
+			up_read(&dev->bufsem);
 			return -ENOSPC;
-		if (off + count > rr_bufsize)
-			count = rr_bufsize - off;
-		if (copy_from_user(base + off, buf, count))
+		}
+		if (off + count > dev->bufsize)
+			count = dev->bufsize - off;
+		i = copy_from_user(dev->dmabuf + off, buf, count);
+		up_read(&dev->bufsem);
+		if (i)
 			return -EFAULT;
 		*offp += count;
 		return count;
@@ -754,8 +1393,17 @@ static ssize_t rr_write(struct file *f, const char __user *buf, size_t count,
 		writeq(data.d64, base + off);
 		break;
 	default:
-		if (copy_from_user(base + off, buf, count))
-			return -EFAULT;
+		/* registers are 32 bits wide: copy words if aligned */
+		if ((off | count) & 3) {
+			if (copy_from_user(base + off, buf, count))
+				return -EFAULT;
+			break;
+		}
+		for (i = 0; i < count; i += 4) {
+			if (get_user(data.d32, (u32 *)(buf + i)))
+				return -EFAULT;
+			writel(data.d32, base + off + i);
+		}
 	}
 	*offp += count;
 	return count;
@@ -767,6 +1415,8 @@ static struct file_operations rr_fops = {
 	.read = rr_read,
 	.write = rr_write,
 	.mmap = rr_mmap,
+	.poll = rr_poll,
+	.fasync = rr_fasync,
 	.unlocked_ioctl = rr_ioctl,
 };
 
@@ -781,7 +1431,6 @@ static struct miscdevice rr_misc = {
 static int rr_init(void)
 {
 	int ret;
-	struct rr_dev *dev = &rr_dev; /* always use dev as pointer */
 
 	if (rr_bufsize > RR_MAX_BUFSIZE) {
 		printk(KERN_WARNING "rawrabbit: too big a size, using 0x%x\n",
@@ -789,11 +1438,6 @@ static int rr_init(void)
 		rr_bufsize = RR_MAX_BUFSIZE;
 	}
 
-	dev->dmabuf = __vmalloc(rr_bufsize, GFP_KERNEL | __GFP_ZERO,
-				PAGE_KERNEL);
-	if (!dev->dmabuf)
-		return -ENOMEM;
-
 	/* misc device, that's trivial */
 	ret = misc_register(&rr_misc);
 	if (ret < 0) {
@@ -803,13 +1447,13 @@ static int rr_init(void)
 	}
 
 	/* prepare registration of the pci driver according to parameters */
-	dev->devsel->vendor = rr_vendor;
-	dev->devsel->device = rr_device;
-	dev->devsel->subvendor = RR_DEVSEL_UNUSED;
-	dev->devsel->bus = RR_DEVSEL_UNUSED;
+	rr_devsel.vendor = rr_vendor;
+	rr_devsel.device = rr_device;
+	rr_devsel.subvendor = RR_DEVSEL_UNUSED;
+	rr_devsel.bus = RR_DEVSEL_UNUSED;
 
 	/* This function return < 0 on error, 0 on timeout, > 0 on success */
-	ret = rr_fill_table_and_probe(dev);
+	ret = rr_fill_table_and_probe();
 	if (ret < 0) {
 		misc_deregister(&rr_misc);
 		return ret;
@@ -820,11 +1464,10 @@ static int rr_init(void)
 
 static void rr_exit(void)
 {
-	struct rr_dev *dev = &rr_dev;
-
-	pci_unregister_driver(&rr_pcidrv);
+	/* no file is open, so removing the cards frees them all */
+	if (rr_flags & RR_FLAG_REGISTERED)
+		pci_unregister_driver(&rr_pcidrv);
 	misc_deregister(&rr_misc);
-	vfree(dev->dmabuf);
 }
 
 module_init(rr_init);
@@ -17,29 +17,48 @@
 #include <linux/spinlock.h>
 #include <linux/completion.h>
 #include <linux/wait.h>
+#include <linux/list.h>
+#include <linux/miscdevice.h>
+#include <linux/rwsem.h>
+#include <asm/atomic.h>
 
-struct rr_devsel;
-
+/* One of these for each card we drive, with its own device node */
 struct rr_dev {
-	struct rr_devsel	*devsel;
-	struct pci_driver	*pci_driver;
-	struct pci_device_id	*id_table;
+	struct list_head	 list;
 	struct pci_dev		*pdev;		/* non-null after pciprobe */
 	spinlock_t		 lock;
 	wait_queue_head_t	 q;
 	void			*dmabuf;
+	int			 bufsize;	/* bytes, see RR_SETDMASIZE */
+	int			 bufflags;	/* RR_DMA_CONTIGUOUS */
+	atomic_t		 bufmaps;	/* mappings of the buffer */
+	struct rw_semaphore	 bufsem;	/* taken for writing to resize */
 	struct timespec		 irqtime;
 	unsigned long		 irqcount;
-	struct completion	 complete;
+	struct fasync_struct	*fasync;	/* SIGIO on interrupt */
+	struct rr_irqevent	*events;	/* ring of RR_NEVENTS */
+	unsigned long		 ehead, etail;	/* produced, consumed */
+	unsigned long		 elost;		/* overwritten, not read */
+	__u32			 irqstatus;	/* see struct rr_irqsrc */
+	__u32			 irqack;
+	__u32			 irqsrcflags;
 	struct resource		*area[3];	/* bar 0, 2, 4 */
 	void			*remap[3];	/* ioremap of bar 0, 2, 4 */
 	unsigned long		 flags;
-	int			 usecount;
+	int			 usecount;	/* files, buffer maps; rr_lock */
+	int			 index;		/* N in /dev/rawrabbitN */
+	char			 name[16];
+	struct miscdevice	 misc;
 };
 
 #define RR_FLAG_REGISTERED	0x00000001
 #define RR_FLAG_IRQDISABLE	0x00000002
-#define RR_FLAG_IRQREQUEST	0x00000002
+#define RR_FLAG_IRQREQUEST	0x00000004
+#define RR_FLAG_MISC		0x00000008	/* misc device registered */
+#define RR_FLAG_GONE		0x00000010	/* removed, free on release */
+
+#define RR_MAX_CARDS		BITS_PER_LONG
+#define RR_NEVENTS		256		/* a power of two */
 
 
 #define RR_PROBE_TIMEOUT	(HZ/10)		/* for pci_register_drv */
@@ -52,8 +71,8 @@ struct rr_dev {
 
 #define RR_DEFAULT_BUFSIZE	(1<<20)		/* 1MB */
 #define RR_PLIST_SIZE		4096		/* no PAGE_SIZE in user space */
-#define RR_PLIST_LEN		(RR_PLIST_SIZE / sizeof(void *))
-#define RR_MAX_BUFSIZE		(RR_PLIST_SIZE * RR_PLIST_LEN)
+#define RR_PLIST_LEN		(RR_PLIST_SIZE / sizeof(__u32)) /* GETPLIST */
+#define RR_MAX_BUFSIZE		(1<<30)		/* RR_BAR_BUF to 4G */
 
 
 /* This structure is used to select the device to be accessed, via ioctl */
@@ -77,17 +96,19 @@ struct rr_devsel {
 #define __RR_GET_BAR(x)		((x) >> 28)
 #define __RR_SET_BAR(x)		((x) << 28)
 #define __RR_GET_OFF(x)		((x) & 0x0fffffff)
+#define __RR_GET_BUFOFF(x)	((x) - RR_BAR_BUF) /* up to RR_MAX_BUFSIZE */
 
 static inline int rr_is_valid_bar(unsigned long address)
 {
 	int bar = __RR_GET_BAR(address);
-	return bar == 0 || bar == 2 || bar == 4 || bar == 0x0c;
+	return bar == 0 || bar == 2 || bar == 4
+		|| (bar >= 0x0c && bar <= 0x0f);
 }
 
 static inline int rr_is_dmabuf_bar(unsigned long address)
 {
 	int bar = __RR_GET_BAR(address);
-	return bar == 0x0c;
+	return bar >= 0x0c && bar <= 0x0f;
 }
 
 struct rr_iocmd {
@@ -101,6 +122,97 @@ struct rr_iocmd {
 	};
 };
 
+/*
+ * A batch of read/write commands, run in order by a single ioctl. Each
+ * datasize is or'd with RR_BATCH_WRITE to ask for a write instead of a read.
+ * Execution stops at the first error, which is returned to the caller.
+ */
+struct rr_iobatch {
+	__u64 cmds; /* user pointer to an array of struct rr_iocmd */
+	__u32 count;
+	__u32 unused;
+};
+
+#define RR_BATCH_WRITE		0x80000000
+#define RR_BATCH_MAX		4096
+
+/*
+ * Poll a register in the driver until (data & mask) == value, or until
+ * it differs if RR_POLL_NE is set in flags. The last value read and the
+ * time spent are returned, also when the timeout expires (-ETIMEDOUT).
+ */
+struct rr_iopoll {
+	__u32 address; /* bar and offset */
+	__u32 datasize; /* 1 or 2 or 4 or 8 */
+	__u64 mask;
+	__u64 value;
+	__u64 timeout_ns;
+	__u64 data64; /* returned: last value read */
+	__u64 elapsed_ns; /* returned */
+	__u32 flags;
+	__u32 unused;
+};
+
+#define RR_POLL_NE		0x00000001
+#define RR_POLL_SPIN_NS		20000	/* busy-wait this long, then sleep */
+#define RR_POLL_SLEEP_MIN_NS	2000	/* first sleep, doubled each time */
+#define RR_POLL_SLEEP_MAX_NS	200000	/* ... up to this, below a jiffy */
+
+/*
+ * Every interrupt is recorded in a ring, read by RR_GETEVENTS. With
+ * RR_IRQSRC the handler reads a 32-bit status register (the source) and
+ * acknowledges the interrupt itself, by reading the ack register or by
+ * writing the status to it: the line then stays enabled, and interrupts
+ * where status reads as 0 are left to other devices sharing the line.
+ */
+struct rr_irqsrc {
+	__u32 status;	/* bar and offset, if RR_IRQSRC_STATUS */
+	__u32 ack;	/* bar and offset, if RR_IRQSRC_ACK_* */
+	__u32 flags;
+	__u32 unused;
+};
+
+#define RR_IRQSRC_STATUS	0x00000001	/* read status in the handler */
+#define RR_IRQSRC_ACK_READ	0x00000002	/* read ack (read to clear) */
+#define RR_IRQSRC_ACK_WRITE	0x00000004	/* write status to ack */
+#define RR_IRQSRC_ENABLE	0x00000008	/* don't disable the line */
+
+struct rr_irqevent {
+	__u64 time_ns;	/* CLOCK_REALTIME of the interrupt */
+	__u32 seq;	/* the irqcount after it: gaps are lost events */
+	__u32 status;	/* the status register, or 0 */
+	__u32 ack;	/* the ack register, if read, or 0 */
+	__u32 unused;
+};
+
+/* Get up to count events (count is updated), waiting if RR_EVENTS_WAIT */
+struct rr_ioevents {
+	__u64 events;	/* user pointer to an array of struct rr_irqevent */
+	__u32 count;
+	__u32 lost;	/* returned: events overwritten since the last call */
+	__u32 flags;
+	__u32 unused;
+};
+
+#define RR_EVENTS_WAIT		0x00000001
+
+/* A new DMA buffer for the card (RR_SETDMASIZE), replacing the current
+ * one: its size is rounded up to pages, and the content is not kept */
+struct rr_dmasize {
+	__u32 size;
+	__u32 flags;
+};
+
+#define RR_DMA_CONTIGUOUS	0x00000001	/* physically contiguous */
+
+/* The page list, with 64-bit frame numbers: RR_GETPLIST64 returns the
+ * number of pages in the DMA buffer, and fills at most count entries */
+struct rr_plist {
+	__u64 pages;	/* user pointer to an array of __u64 */
+	__u32 count;
+	__u32 unused;
+};
+
 /* ioctl commands */
 #define __RR_IOC_MAGIC '4' /* random or so */
 
@@ -111,8 +223,13 @@ struct rr_iocmd {
 #define RR_IRQWAIT	  _IO(__RR_IOC_MAGIC, 4)
 #define RR_IRQENA	  _IO(__RR_IOC_MAGIC, 5)
 #define RR_GETDMASIZE	  _IO(__RR_IOC_MAGIC, 6)
-/* #define RR_SETDMASIZE	  _IO(__RR_IOC_MAGIC, 7, unsigned long) */
-#define RR_GETPLIST	  _IO(__RR_IOC_MAGIC, 8) /* returns a whole page */
+#define RR_SETDMASIZE	 _IOW(__RR_IOC_MAGIC, 7, struct rr_dmasize)
+#define RR_GETPLIST	  _IO(__RR_IOC_MAGIC, 8) /* fills a page, 32 bits */
+#define RR_BATCH	 _IOW(__RR_IOC_MAGIC, 9, struct rr_iobatch)
+#define RR_POLL		_IOWR(__RR_IOC_MAGIC, 10, struct rr_iopoll)
+#define RR_IRQSRC	 _IOW(__RR_IOC_MAGIC, 11, struct rr_irqsrc)
+#define RR_GETEVENTS	_IOWR(__RR_IOC_MAGIC, 12, struct rr_ioevents)
+#define RR_GETPLIST64	 _IOW(__RR_IOC_MAGIC, 13, struct rr_plist)
 
 
 #define VFAT_IOCTL_READDIR_BOTH         _IOR('r', 1, struct dirent [2])
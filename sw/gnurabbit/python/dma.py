@@ -0,0 +1,537 @@
+#!  /usr/bin/env python
+#   :vi:ts=4 sw=4 et
+
+# The DMA engine of the GN4124 core, in BAR0 (see dma_controller.vhd
+# and dma_controller_wb_slave.wb).
+#
+#   dma = DmaController(card)
+#   dma.submit(carrier_addr, host_addr, length, dma.L2P)
+#   dma.wait()
+#
+# or, once the done interrupt is routed to the host (GPIO 8, as in
+# dmatest.py), dma.complete(length): it spins as long as transfers of
+# that size recently took, then sleeps until the interrupt.
+#
+# The registers of a transfer are written with a single batch, skipping
+# those that still hold the value written for the previous transfer.
+# Transfers spanning many pages of the DMA buffer run as a single chain:
+#
+#   dma.submit(*dma.chain(carrier_addr, offset, length, dma.P2L))
+#
+# and data can flow from the carrier continuously, with the next
+# transfer started before each completed one is handed over:
+#
+#   for data in dma.stream(carrier_addr, 0x10000):
+#       consume(data)
+#
+# or, with no setup at all once started, from a ring of chain items
+# that the engine follows endlessly (see DmaRing):
+#
+#   ring = DmaRing(dma, carrier_addr, 0x1000, 64)
+#   ring.start()
+#   for data in ring:
+#       consume(data)
+
+import os, errno, struct, select, time
+import rr
+from dma_controller_regs import DmaControllerRegs as Regs
+from gn4124_regs import Gn4124Regs
+
+# DMASTATR values, as in dma_controller.vhd
+DMA_IDLE, DMA_DONE, DMA_BUSY, DMA_ERROR, DMA_ABORT = range(5)
+status_names = { DMA_IDLE: 'idle', DMA_DONE: 'done', DMA_BUSY: 'busy',
+                 DMA_ERROR: 'error', DMA_ABORT: 'abort' }
+
+# DMACTRLR and DMAATTRIBR bits
+CTRL_START          = 1 << 0    # a pulse: the engine clears it
+CTRL_ABORT          = 1 << 1
+CTRL_SWAP_SHIFT     = 2         # 2 bits of byte swapping
+ATTRIB_CHAIN        = 1 << 0    # fetch another item from NEXTL/NEXTH
+ATTRIB_P2L          = 1 << 1    # from the host to the carrier
+
+ECANCELED = getattr(errno, 'ECANCELED', 125)    # not in python 2.x
+
+# a chain item in host memory, the registers from DMACSTARTR to DMAATTRIBR
+chain_item = struct.Struct('<7I')
+PAGE_SIZE = 4096
+
+class DmaController(object):
+    """the DMA engine of the GN4124 core
+
+    The direction of a transfer is L2P (from the carrier to the host)
+    or P2L (from the host to the carrier); addresses in the host are
+    bus addresses, like those of Gennum.dmamap().
+
+    The values written to the registers are remembered, to skip them
+    next time: they are forgotten when the card is bound again or its
+    caches dropped (Gennum.invalidate, after reloading the FPGA), but
+    any other write to the registers of the engine, out of this object,
+    must be followed by invalidate().
+    """
+    L2P = 0
+    P2L = ATTRIB_P2L
+    bar = Regs.bar
+
+    # complete() spins for spin_margin times the usual duration of a
+    # transfer of that size, if no longer than spin_max nanoseconds:
+    # past that the driver sleeps between reads (RR_POLL_SPIN_NS)
+    spin_max = rr.RR_POLL_SPIN_NS
+    spin_margin = 1.5
+
+    def __init__(self, card, base=Regs.base, swap=0):
+        """drive the engine at base in BAR0 of card (a Gennum)
+
+            swap = byte swapping mode, from 0 to 3
+        """
+        self.card = card
+        self.base = base
+        self.ctrl = (swap & 3) << CTRL_SWAP_SHIFT
+        self.written = {}       # offset -> last value written
+        self.generation = card.generation   # of the card, for written
+        self.expected = {}      # length.bit_length() -> ns, a running mean
+
+    def invalidate(self):
+        """forget the values written to the registers"""
+        self.written.clear()
+
+    def chain(self, carrier_addr, offset, length, direction=L2P,
+              where=None, split=1):
+        """prepare a transfer between the carrier and the DMA buffer
+
+            carrier_addr = byte address in the carrier
+            offset = byte offset in the DMA buffer
+            length = bytes, a multiple of 4
+            direction = L2P (carrier to host) or P2L (host to carrier)
+            where = offset in the DMA buffer for the chain items
+                    (default: the last pages of the buffer)
+            split = cut the region in at least this many items, like
+                    a more fragmented buffer would (for benchmarks)
+
+        The region is split into one item per group of physically
+        adjacent pages; all items but the first are written to the
+        buffer with a single write, in order and never across a page
+        boundary. Return the head of the chain, as the arguments of
+        submit: (carrier_addr, host_addr, length, direction, next_addr).
+        """
+        if length <= 0:
+            raise ValueError('nothing to transfer')
+        if split < 1:
+            raise ValueError('at least one item is needed')
+        dmamap = self.card.dmamap()
+        piece = (-(-length // split) + 3) & ~3
+        parts = []
+        for start in range(offset, offset + length, piece):
+            parts.extend(dmamap.region(start,
+                                       min(piece, offset + length - start)))
+        where, places, bus = self.layout(len(parts) - 1, where,
+                                         offset, length)
+        size = places and places[-1] + chain_item.size or 0
+        items = bytearray(size)
+        carrier = carrier_addr + parts[0][1]
+        for i, place in enumerate(places):
+            host, count = parts[i + 1]
+            if i + 1 < len(places):
+                nxt, attrib = bus(places[i + 1]), direction | ATTRIB_CHAIN
+            else:
+                nxt, attrib = 0, direction
+            chain_item.pack_into(items, place, carrier, host & 0xffffffff,
+                                 host >> 32, count, nxt & 0xffffffff,
+                                 nxt >> 32, attrib)
+            carrier += count
+        if size:
+            self.card.write_dmabuf(where, items)
+        host, count = parts[0]
+        return (carrier_addr, host, count, direction,
+                places and bus(places[0]) or None)
+
+    def layout(self, count, where, offset, length):
+        """place count chain items at where, away from the data
+
+        Return where (chosen if None), the offsets of the items relative
+        to it, moving to the next page the items that would cross a
+        page boundary, and a function turning them into bus addresses.
+        """
+        per_page = PAGE_SIZE // chain_item.size
+        places = [ (i // per_page) * PAGE_SIZE + (i % per_page) *
+                   chain_item.size for i in range(count) ]
+        size = places and places[-1] + chain_item.size or 0
+        if where is None:
+            where = (self.card.getdmasize() - size) & ~(PAGE_SIZE - 1)
+        if where & (PAGE_SIZE - 1):
+            raise ValueError('chain not page-aligned')
+        if size and where < offset + length and offset < where + size:
+            raise ValueError('chain overlaps the data')
+        phys = self.card.dmamap().phys
+        def bus(place):
+            return phys(where + place)
+        return where, places, bus
+
+    def setup(self, batch, carrier_addr, host_addr, length, direction=L2P,
+              next_addr=None):
+        """queue in batch the writes that prepare a transfer
+
+        next_addr is the host address of the next item of a chain (see
+        submit); the registers written with the same value for the
+        previous transfer are not written again.
+        """
+        attrib = direction
+        if next_addr is not None:
+            attrib |= ATTRIB_CHAIN
+        else:
+            next_addr = 0
+        if self.generation != self.card.generation:
+            self.written.clear()        # bound again, or reloaded
+            self.generation = self.card.generation
+        written = self.written
+        for offset, value in ((Regs.CSTART, carrier_addr),
+                              (Regs.HSTARTL, host_addr & 0xffffffff),
+                              (Regs.HSTARTH, host_addr >> 32),
+                              (Regs.LEN, length),
+                              (Regs.NEXTL, next_addr & 0xffffffff),
+                              (Regs.NEXTH, next_addr >> 32),
+                              (Regs.ATTRIB, attrib)):
+            if written.get(offset) != value:
+                batch.iwrite(self.bar, self.base + offset, 4, value)
+                written[offset] = value
+        if attrib & ATTRIB_CHAIN:
+            # the engine loads the next items into the same registers
+            written.clear()
+
+    def start(self, batch=None):
+        """start the transfer set up so far (in batch, if given)"""
+        if batch is None:
+            self.card.write(self.bar, self.base + Regs.CTRL, 4,
+                            self.ctrl | CTRL_START)
+        else:
+            batch.iwrite(self.bar, self.base + Regs.CTRL, 4,
+                         self.ctrl | CTRL_START)
+
+    def submit(self, carrier_addr, host_addr, length, direction=L2P,
+               next_addr=None):
+        """start a transfer, with a single system call
+
+            carrier_addr = byte address in the carrier
+            host_addr = bus address in the host (64 bits)
+            length = bytes, a non-zero multiple of 4
+            direction = L2P (carrier to host) or P2L (host to carrier)
+            next_addr = bus address of the next item of a chain (7
+                        words: carrier, host low, host high, length,
+                        next low, next high, attrib), None for no chain
+        """
+        with self.card.batch() as b:
+            self.setup(b, carrier_addr, host_addr, length, direction,
+                       next_addr)
+            self.start(b)
+
+    def status(self):
+        """return the current status, one of the DMA_* values"""
+        return self.card.read(self.bar, self.base + Regs.STAT, 4) & 7
+
+    def abort(self):
+        """stop the transfer in progress, wait() then raises ECANCELED"""
+        self.card.write(self.bar, self.base + Regs.CTRL, 4,
+                        self.ctrl | CTRL_ABORT)
+
+    def wait(self, timeout=1.0):
+        """wait for the transfer to end, polling in the driver
+
+        Return DMA_DONE (or DMA_IDLE, if nothing was started); raise
+        IOError with EIO if the engine reports an error, ECANCELED if
+        it was aborted and ETIMEDOUT if it is still busy after timeout
+        seconds.
+        """
+        status, elapsed = self.card.wait_for(self.bar, self.base + Regs.STAT,
+                                             7, DMA_BUSY, timeout * 1e9,
+                                             equal=False)
+        return self.check(status & 7)
+
+    def complete(self, length, timeout=1.0):
+        """wait for a transfer of length bytes to end, spinning first
+
+        The status is polled in the driver for a while, learnt from the
+        completion times of the recent transfers of a similar length;
+        if it is still busy by then (or at once, for the lengths that
+        take longer than spin_max) the caller sleeps in irqwait until
+        the done interrupt, which must be routed to the host. A pending
+        interrupt is acknowledged (GPIO_INT_STATUS) and the line enabled
+        again. Return and raise like wait.
+        """
+        card = self.card
+        t0 = time.time()
+        bucket = int(length).bit_length()
+        expected = self.expected.get(bucket)
+        if expected is not None and expected <= self.spin_max:
+            budget = min(expected * self.spin_margin, self.spin_max)
+            status, elapsed = card.wait_for(self.bar, self.base + Regs.STAT,
+                                            7, DMA_BUSY, budget, equal=False)
+            status &= 7
+            if status != DMA_BUSY:
+                if card.irqpending():
+                    self.acknowledge()
+                self.learn(bucket, elapsed)
+                return self.check(status)
+        try:
+            fd = card.fileno()
+        except IOError:
+            fd = None           # simulated: irqwait fails if nothing can come
+        deadline = t0 + timeout
+        while True:
+            if fd is not None:
+                remaining = max(deadline - time.time(), 0)
+                if not select.select([ fd ], [], [], remaining)[0]:
+                    status = self.status()
+                    break
+            err = card.irqwait()
+            if err < 0 and err != -errno.EAGAIN:   # EAGAIN: already there
+                raise IOError(-err, os.strerror(-err))
+            status, since = self.acknowledge()
+            # an interrupt left over by a transfer that completed while
+            # spinning wakes us up early: wait for the next one
+            if status != DMA_BUSY:
+                # the transfer ended with the interrupt, not when woken up
+                self.learn(bucket, int((time.time() - t0) * 1e9) - since)
+                break
+            if time.time() >= deadline:
+                break
+        return self.check(status)
+
+    def acknowledge(self):
+        """clear the done interrupt and enable the line again
+
+        Return the status of the engine and the nanoseconds since the
+        interrupt (0 if none was pending).
+        """
+        with self.card.batch() as b:
+            b.iread(4, Gn4124Regs.GPIO_INT_STATUS, 4)   # read to clear
+            b.iread(self.bar, self.base + Regs.STAT, 4)
+        since = self.card.irqena()
+        return b.results[1] & 7, max(since, 0)
+
+    def learn(self, bucket, ns):
+        """account a completion time in the running mean of its bucket"""
+        ns = max(ns, 0)
+        old = self.expected.get(bucket)
+        if old is None:
+            self.expected[bucket] = ns
+        else:
+            self.expected[bucket] = old + (ns - old) // 4
+
+    def check(self, status):
+        """return status, or raise IOError if it is not a success"""
+        if status in (DMA_IDLE, DMA_DONE):
+            return status
+        err = { DMA_BUSY: errno.ETIMEDOUT, DMA_ERROR: errno.EIO,
+                DMA_ABORT: ECANCELED }.get(status, errno.EIO)
+        raise IOError(err, 'DMA %s' % status_names.get(status, status))
+
+    def transfer(self, carrier_addr, host_addr, length, direction=L2P,
+                 timeout=1.0):
+        """run a single transfer to its end, see submit and wait"""
+        self.submit(carrier_addr, host_addr, length, direction)
+        return self.wait(timeout)
+
+    def stream(self, carrier_addr, size, regions=2, count=None, timeout=1.0,
+               copy=True):
+        """yield memoryviews of repeated transfers from the carrier
+
+            carrier_addr = byte address in the carrier (like a FIFO
+                           window: every transfer reads the same area)
+            size = bytes per transfer, a multiple of 4
+            regions = DMA buffer regions used in turn, at least 2
+            count = number of transfers, None to go on forever
+            copy = False to yield the regions of the DMA buffer in
+                   place (see Gennum.dmabuf_array): each one is only
+                   valid until the next is asked for
+
+        Each region of the DMA buffer has its own chain, built once,
+        so starting a transfer costs a single system call. As soon as
+        one completes the next one is started, in the next region, and
+        only then the completed data is copied out and yielded: the
+        DMA engine works while the caller consumes the data. A view is
+        valid until regions - 1 more have been yielded.
+        """
+        if regions < 2:
+            raise ValueError('at least two regions are needed')
+        span = (size + PAGE_SIZE - 1) & ~(PAGE_SIZE - 1)
+        per_page = PAGE_SIZE // chain_item.size
+        itemspan = (span // PAGE_SIZE // per_page + 1) * PAGE_SIZE
+        dmasize = self.card.getdmasize()
+        if regions * (span + itemspan) > dmasize:
+            raise ValueError('%i regions of %i bytes do not fit in the '
+                             'DMA buffer' % (regions, size))
+        heads = [ self.chain(carrier_addr, i * span, size, self.L2P,
+                             dmasize - (i + 1) * itemspan)
+                  for i in range(regions) ]
+        if copy:
+            bufs = [ bytearray(size) for i in range(regions) ]
+        else:
+            views = [ self.card.dmabuf_array('B', i * span, size)
+                      for i in range(regions) ]
+        n, running = 0, count != 0
+        if running:
+            self.submit(*heads[0])
+        try:
+            while running:
+                running = False
+                self.wait(timeout)
+                if count is None or n + 1 < count:
+                    self.submit(*heads[(n + 1) % regions])
+                    running = True
+                if copy:
+                    buf = bufs[n % regions]
+                    self.card.read_dmabuf(n % regions * span, buf=buf)
+                    yield memoryview(buf)
+                else:
+                    yield views[n % regions]
+                n += 1
+        finally:
+            if running:
+                # the caller stopped early: let the last transfer end
+                try:
+                    self.wait(timeout)
+                except IOError:
+                    pass
+
+class DmaRing(object):
+    """a ring of chain items, the engine filling blocks of the DMA buffer
+
+    The last item points back to the first one, so once started the
+    engine transfers block after block from the carrier, with no setup
+    and no end (and no interrupt: the done interrupt comes at the end of
+    a chain). The block in progress is found from DMAHSTARTLR, that the
+    engine loads from each item; all blocks before it are complete.
+
+    A block is overwritten when the engine comes back to it, one lap
+    later: read() notices it and skips the blocks lost, counting them
+    in lost (or raises IOError with EOVERFLOW, if strict). A lap that
+    goes by entirely between two calls can not be noticed: read the
+    ring at least once per lap.
+    """
+    def __init__(self, dma, carrier_addr, block, nblocks, offset=0,
+                 where=None, strict=False):
+        """lay out the ring, nblocks blocks of block bytes at offset
+
+            dma = the DmaController
+            carrier_addr = byte address in the carrier, read again for
+                           each block (block bytes, like a FIFO window)
+            where = offset in the DMA buffer for the chain items
+                    (default: the last pages of the buffer)
+            strict = raise IOError on overruns, instead of skipping
+        """
+        if nblocks < 2:
+            raise ValueError('at least two blocks are needed')
+        self.dma = dma
+        self.block = block
+        self.nblocks = nblocks
+        self.offset = offset
+        self.strict = strict
+        self.lost = 0           # blocks overwritten before being read
+        self.produced = 0       # blocks completed, as seen so far
+        self.consumed = 0       # blocks read
+        dmamap = dma.card.dmamap()
+        # the items, with the block that each one belongs to
+        self.items = []
+        self.blockof = {}       # host address (low) -> block
+        for b in range(nblocks):
+            done = 0
+            for host, count in dmamap.region(offset + b * block, block):
+                self.items.append((carrier_addr + done, host, count))
+                self.blockof[host & 0xffffffff] = b
+                done += count
+        where, places, bus = dma.layout(len(self.items), where, offset,
+                                        nblocks * block)
+        data = bytearray(places[-1] + chain_item.size)
+        for i, place in enumerate(places):
+            carrier, host, count = self.items[i]
+            nxt = bus(places[(i + 1) % len(places)])
+            chain_item.pack_into(data, place, carrier, host & 0xffffffff,
+                                 host >> 32, count, nxt & 0xffffffff,
+                                 nxt >> 32, dma.L2P | ATTRIB_CHAIN)
+        dma.card.write_dmabuf(where, data)
+        self.head = self.items[0] + (dma.L2P, bus(places[1 % len(places)]))
+        self.buf = bytearray(block)
+
+    def start(self):
+        """start the engine at the first block"""
+        self.produced = self.consumed = 0
+        self.dma.submit(*self.head)
+
+    def stop(self):
+        """stop the engine, abandoning the block in progress"""
+        self.dma.abort()
+        try:
+            self.dma.wait()
+        except IOError:
+            pass
+
+    def current(self):
+        """return the host address (low) of the item in progress"""
+        return self.dma.card.read(self.dma.bar,
+                                  self.dma.base + Regs.HSTARTL, 4)
+
+    def update(self, hostl=None):
+        """count the blocks completed since the last call, return them"""
+        if hostl is None:
+            hostl = self.current()
+        b = self.blockof.get(hostl)
+        if b is None:
+            # not loaded from the ring: the engine stopped
+            self.dma.check(self.dma.status())
+            raise IOError(errno.EIO, 'DMA ring broken')
+        self.produced += (b - self.produced) % self.nblocks
+        return self.produced
+
+    def wait(self, timeout=1.0):
+        """wait in the driver until the engine moves to another item"""
+        hostl = self.current()
+        value, elapsed = self.dma.card.wait_for(self.dma.bar,
+                                self.dma.base + Regs.HSTARTL, 0xffffffff,
+                                hostl, timeout * 1e9, equal=False)
+        if value == hostl:
+            self.dma.check(self.dma.status())
+            raise IOError(errno.ETIMEDOUT, 'DMA ring stalled')
+        return self.update(value)
+
+    def read(self, timeout=1.0):
+        """return a memoryview of the next block, waiting for it
+
+        The view is valid until the next call.
+        """
+        n = self.nblocks
+        while True:
+            while self.update() <= self.consumed:
+                self.wait(timeout)
+            # the block in progress is overwriting the one a lap before
+            oldest = self.produced - n + 1
+            if self.consumed < oldest:
+                self.overrun(oldest)
+                continue
+            self.dma.card.read_dmabuf(self.offset + self.consumed % n
+                                      * self.block, buf=self.buf)
+            if self.update() - n + 1 > self.consumed:
+                self.overrun(self.consumed + 1)   # overwritten meanwhile
+                continue
+            self.consumed += 1
+            return memoryview(self.buf)
+
+    def overrun(self, oldest):
+        self.lost += oldest - self.consumed
+        self.consumed = oldest
+        if self.strict:
+            raise IOError(errno.EOVERFLOW, 'DMA ring overrun')
+
+    def __iter__(self):
+        while True:
+            yield self.read()
+
+if __name__ == '__main__':
+    # stream from the carrier for a while, and report the throughput
+    import sys, time, rr
+    size = int(sys.argv[1:] and sys.argv[1] or '0x40000', 0)
+    card = rr.Gennum()
+    dma = DmaController(card)
+    total, t0 = 0, time.time()
+    for data in dma.stream(0, size, count=64):
+        total += len(data)
+    t = time.time() - t0
+    print('%i bytes in %.3f s: %.1f MB/s' % (total, t, total / t / 1e6))
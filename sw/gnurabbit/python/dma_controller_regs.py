@@ -0,0 +1,105 @@
+# generated by wb2py.py from dma_controller_wb_slave.wb: do not edit
+# sha1 e2ba1e8135eaa2f8a8e1d056c99fd30fe3531ecb
+
+class DmaControllerRegs(object):
+    """GN4124 core DMA controller
+
+    Wishbone slave for the DMA controller of the GN4124 core, at BAR0 + 0x0.
+    Accessors are bound to the read/write methods of the card
+    when created: create them after Gennum.select().
+    """
+    bar, base = 0, 0x0
+
+    CTRL                    = 0x000 # DMACTRLR: DMA engine control
+    STAT                    = 0x004 # DMASTATR: DMA engine status
+    CSTART                  = 0x008 # DMACSTARTR: DMA start address in the carrier
+    HSTARTL                 = 0x00c # DMAHSTARTLR: DMA start address (low) in the host
+    HSTARTH                 = 0x010 # DMAHSTARTHR: DMA start address (high) in the host
+    LEN                     = 0x014 # DMALENR: DMA read length in bytes
+    NEXTL                   = 0x018 # DMANEXTLR: Pointer (low) to next item in list
+    NEXTH                   = 0x01c # DMANEXTHR: Pointer (high) to next item in list
+    ATTRIB                  = 0x020 # DMAATTRIBR: DMA chain control
+
+    def __init__(self, card, bar=0, base=0x0):
+        read, write = card.read, card.write
+        a_ctrl = base + 0x0
+        def get_ctrl():
+            """DMACTRLR: DMA engine control"""
+            return read(bar, a_ctrl, 4)
+        def set_ctrl(value):
+            """DMACTRLR: DMA engine control"""
+            write(bar, a_ctrl, 4, value)
+        self.get_ctrl = get_ctrl
+        self.set_ctrl = set_ctrl
+        a_stat = base + 0x4
+        def get_stat():
+            """DMASTATR: DMA engine status"""
+            return read(bar, a_stat, 4)
+        def set_stat(value):
+            """DMASTATR: DMA engine status"""
+            write(bar, a_stat, 4, value)
+        self.get_stat = get_stat
+        self.set_stat = set_stat
+        a_cstart = base + 0x8
+        def get_cstart():
+            """DMACSTARTR: DMA start address in the carrier"""
+            return read(bar, a_cstart, 4)
+        def set_cstart(value):
+            """DMACSTARTR: DMA start address in the carrier"""
+            write(bar, a_cstart, 4, value)
+        self.get_cstart = get_cstart
+        self.set_cstart = set_cstart
+        a_hstartl = base + 0xc
+        def get_hstartl():
+            """DMAHSTARTLR: DMA start address (low) in the host"""
+            return read(bar, a_hstartl, 4)
+        def set_hstartl(value):
+            """DMAHSTARTLR: DMA start address (low) in the host"""
+            write(bar, a_hstartl, 4, value)
+        self.get_hstartl = get_hstartl
+        self.set_hstartl = set_hstartl
+        a_hstarth = base + 0x10
+        def get_hstarth():
+            """DMAHSTARTHR: DMA start address (high) in the host"""
+            return read(bar, a_hstarth, 4)
+        def set_hstarth(value):
+            """DMAHSTARTHR: DMA start address (high) in the host"""
+            write(bar, a_hstarth, 4, value)
+        self.get_hstarth = get_hstarth
+        self.set_hstarth = set_hstarth
+        a_len = base + 0x14
+        def get_len():
+            """DMALENR: DMA read length in bytes"""
+            return read(bar, a_len, 4)
+        def set_len(value):
+            """DMALENR: DMA read length in bytes"""
+            write(bar, a_len, 4, value)
+        self.get_len = get_len
+        self.set_len = set_len
+        a_nextl = base + 0x18
+        def get_nextl():
+            """DMANEXTLR: Pointer (low) to next item in list"""
+            return read(bar, a_nextl, 4)
+        def set_nextl(value):
+            """DMANEXTLR: Pointer (low) to next item in list"""
+            write(bar, a_nextl, 4, value)
+        self.get_nextl = get_nextl
+        self.set_nextl = set_nextl
+        a_nexth = base + 0x1c
+        def get_nexth():
+            """DMANEXTHR: Pointer (high) to next item in list"""
+            return read(bar, a_nexth, 4)
+        def set_nexth(value):
+            """DMANEXTHR: Pointer (high) to next item in list"""
+            write(bar, a_nexth, 4, value)
+        self.get_nexth = get_nexth
+        self.set_nexth = set_nexth
+        a_attrib = base + 0x20
+        def get_attrib():
+            """DMAATTRIBR: DMA chain control"""
+            return read(bar, a_attrib, 4)
+        def set_attrib(value):
+            """DMAATTRIBR: DMA chain control"""
+            write(bar, a_attrib, 4, value)
+        self.get_attrib = get_attrib
+        self.set_attrib = set_attrib
@@ -0,0 +1,193 @@
+#!  /usr/bin/env python
+#   :vi:ts=4 sw=4 et
+
+# Throughput and latency of DMA transfers between the carrier and the
+# DMA buffer, sweeping the transfer length, the chain depth (items per
+# transfer), the direction and the way completion is noticed (polling
+# in the driver, waiting for the interrupt or, as DmaController.complete
+# does, both). Results go out as JSON:
+#
+#   ./dmabench.py -o today.json
+#   ./dmabench.py -b today.json         # later: exit 1 on regressions
+#
+# Every measure is repeated, and compared by its runs: a regression is
+# a measure whose runs are all worse than the runs of the baseline.
+#
+# With --sim (or RR_DEVICE=sim) the simulated card of rrsim.py stands
+# in for /dev/rawrabbit: the figures then only show the rates set in
+# the simulator and the overhead of the software, but the whole suite
+# runs anywhere.
+
+import sys, errno, time, json, optparse
+import rr
+from dma import DmaController
+from gn4124_regs import Gn4124Regs
+
+directions = { 'l2p': DmaController.L2P, 'p2l': DmaController.P2L }
+modes = ('poll', 'irq', 'hybrid')
+
+def route_irq(card, enable):
+    """route the DMA done interrupt (GPIO 8) to INT0, as in dmatest.py,
+    or mask it; a stale one is cleared either way"""
+    with card.batch() as b:
+        b.iwrite(4, Gn4124Regs.GPIO_DIRECTION_MODE, 4, 0x00000100)
+        b.iwrite(4, Gn4124Regs.GPIO_INT_VALUE, 4, 0x00000100)
+        b.iwrite(4, Gn4124Regs.INT_CFG0, 4, 0x00008000)
+        if enable:
+            b.iwrite(4, Gn4124Regs.GPIO_INT_MASK_SET, 4, 0x0000feff)
+            b.iwrite(4, Gn4124Regs.GPIO_INT_MASK_CLR, 4, 0x00000100)
+        else:
+            b.iwrite(4, Gn4124Regs.GPIO_INT_MASK_SET, 4, 0x0000ffff)
+        b.iread(4, Gn4124Regs.GPIO_INT_STATUS, 4)     # read to clear
+    card.irqena()       # may be enabled already
+
+def run(card, dma, length, depth, direction, mode, count, *histograms):
+    """time count transfers, recording their latency in each of the
+    histograms, return MB/s"""
+    head = dma.chain(0, 0, length, directions[direction], split=depth)
+    route_irq(card, mode != 'poll')
+    t0 = time.time()
+    for i in range(count):
+        t = time.time()
+        dma.submit(*head)
+        if mode == 'irq':
+            err = card.irqwait()
+            if err < 0 and err != -errno.EAGAIN:    # EAGAIN: already there
+                raise IOError(-err, 'irqwait')
+            card.read(4, Gn4124Regs.GPIO_INT_STATUS, 4)  # read to clear
+            dma.check(dma.status())
+            card.irqena()
+        elif mode == 'hybrid':
+            dma.complete(length)
+        else:
+            dma.wait()
+        ns = int((time.time() - t) * 1e9)
+        for h in histograms:
+            h.record(ns)
+    return length * count / (time.time() - t0) / 1e6
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    return (values[(n - 1) // 2] + values[n // 2]) / 2.0
+
+def sweep(card, dma, points, count, repeat):
+    """measure each (length, depth, direction, mode) of points, return
+    their figures as a list of dictionaries
+
+    The points are run in turn, repeat times over, so that a slowdown
+    of the host is likely to hit one run of each at most. Throughput
+    and median latency are given for each run and as the median over
+    the runs; the latency summary covers all transfers.
+    """
+    runs = [ ([], [], rr.Histogram()) for p in points ]
+    for r in range(repeat):
+        for p, (mbps, p50, total) in zip(points, runs):
+            latency = rr.Histogram()
+            mbps.append(run(card, dma, *(p + (count, latency, total))))
+            p50.append(latency.percentile(50))
+    results = []
+    for p, (mbps, p50, total) in zip(points, runs):
+        length, depth, direction, mode = p
+        results.append({ 'length': length, 'depth': depth,
+                         'direction': direction, 'mode': mode,
+                         'count': count, 'repeat': repeat,
+                         'mbps': median(mbps), 'mbps_runs': mbps,
+                         'p50': median(p50), 'p50_runs': p50,
+                         'latency': total.summary() })
+    return results
+
+def key(result):
+    return (result['length'], result['depth'], result['direction'],
+            result['mode'])
+
+def compare(results, baseline, tolerance):
+    """return the regressions of results against baseline, as strings
+
+    Only the measures whose runs are all worse than all the runs of the
+    baseline, by more than tolerance (a fraction), count: throughput
+    if lower, median latency if higher. Noise that makes the runs of
+    the same code overlap is not reported.
+    """
+    old = dict([ (key(r), r) for r in baseline['results'] ])
+    out = []
+    for r in results['results']:
+        b = old.get(key(r))
+        if b is None or 'mbps_runs' not in b or b['count'] != r['count']:
+            continue            # not measured the same way
+        name = '%i bytes, depth %i, %s, %s' % key(r)
+        if max(r['mbps_runs']) < min(b['mbps_runs']) * (1 - tolerance):
+            out.append('%s: %.1f MB/s, was %.1f' % (name, r['mbps'],
+                                                   b['mbps']))
+        if min(r['p50_runs']) > max(b['p50_runs']) * (1 + tolerance):
+            out.append('%s: median latency %i ns, was %i' % (name,
+                       r['p50'], b['p50']))
+    return out
+
+def numbers(option, opt, value, parser):
+    setattr(parser.values, option.dest,
+            [ int(v, 0) for v in value.split(',') ])
+
+def words(option, opt, value, parser):
+    setattr(parser.values, option.dest, value.split(','))
+
+if __name__ == '__main__':
+    p = optparse.OptionParser(usage='%prog [options]')
+    p.add_option('-l', '--lengths', type='string', action='callback',
+                 callback=numbers, default=[0x1000, 0x4000, 0x10000, 0x40000],
+                 help='transfer lengths in bytes, comma separated')
+    p.add_option('-d', '--depths', type='string', action='callback',
+                 callback=numbers, default=[1, 4, 16],
+                 help='chain items per transfer (at least)')
+    p.add_option('-D', '--directions', type='string', action='callback',
+                 callback=words, default=sorted(directions),
+                 help='l2p (carrier to host) and/or p2l')
+    p.add_option('-m', '--modes', type='string', action='callback',
+                 callback=words, default=list(modes),
+                 help='poll (in the driver), irq and/or hybrid')
+    p.add_option('-n', '--count', type='int', default=100,
+                 help='transfers per run')
+    p.add_option('-r', '--repeat', type='int', default=5,
+                 help='runs per measure, compared by their median')
+    p.add_option('-o', '--output', help='write the results to this file')
+    p.add_option('-b', '--baseline', help='compare with these results')
+    p.add_option('-t', '--tolerance', type='float', default=0.1,
+                 help='regression threshold, as a fraction')
+    p.add_option('--sim', action='store_true', help='use the simulator')
+    opts, args = p.parse_args()
+    for d in opts.directions:
+        if d not in directions:
+            p.error('unknown direction %s' % d)
+    for m in opts.modes:
+        if m not in modes:
+            p.error('unknown mode %s' % m)
+    if opts.repeat < 1:
+        p.error('at least one run is needed')
+
+    if opts.sim:
+        rr.Gennum.device = 'sim'
+    card = rr.Gennum()
+    dma = DmaController(card)
+    results = { 'device': card.device, 'info': card.info(),
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': [] }
+    points = [ (length, depth, direction, mode)
+               for length in opts.lengths for depth in opts.depths
+               for direction in opts.directions for mode in opts.modes ]
+    results['results'] = sweep(card, dma, points, opts.count, opts.repeat)
+    text = json.dumps(results, indent=1, sort_keys=True)
+    if opts.output:
+        f = open(opts.output, 'w')
+        f.write(text + '\n')
+        f.close()
+    else:
+        print(text)
+
+    if opts.baseline:
+        f = open(opts.baseline)
+        baseline = json.load(f)
+        f.close()
+        regressions = compare(results, baseline, opts.tolerance)
+        for r in regressions:
+            sys.stderr.write('regression: %s\n' % r)
+        if regressions:
+            sys.exit(1)
@@ -3,11 +3,16 @@
 
 import sys
 import rr
+from array import array
+from gn4124_regs import Gn4124Regs
+from dma import DmaController
 
 if __name__ == '__main__':
 
     # bind to the Gennum kit
     card = rr.Gennum()
+    gn4124 = Gn4124Regs(card)
+    dma = DmaController(card)
 
     # Find the physical addresses of the three first pages of the buffer
     pages = card.getplist()         # get page list
@@ -17,68 +22,66 @@ if __name__ == '__main__':
 
     # Change local bus frequency to 100MHz
     print 'Set local bus freq to 100MHz'
-    card.iwrite(4, 0x0808, 4, 0xe001f07c)
-
-    # Gennum config for interrupt generation from GPIO
-    card.iwrite(4, 0x0A04, 4, 0x00000100) # set GPIO8 as input
-    card.iwrite(4, 0x0A1C, 4, 0x0000FEFF) # set GPIO interrupt mask
-    card.iwrite(4, 0x0A18, 4, 0x00000100) # set GPIO interrupt mask
-    card.iwrite(4, 0x0A28, 4, 0x00000100) # set GPIO8 polarity to rising edge
-    card.iwrite(4, 0x0820, 4, 0x00008000) # enable GPIO interrupt on INT0 line
+    gn4124.set_clk_csr(0xe001f07c)
 
     # Get pages 0-2 addresses
     address0 = pages[0]
     address1 = pages[1]
     address2 = pages[2]
 
+    # Queue the interrupt and chain setup, submitted with a single ioctl
+    b = card.batch()
+
+    # Gennum config for interrupt generation from GPIO
+    b.iwrite(4, gn4124.GPIO_DIRECTION_MODE, 4, 0x00000100) # set GPIO8 as input
+    b.iwrite(4, gn4124.GPIO_INT_MASK_SET, 4, 0x0000FEFF) # set GPIO interrupt mask
+    b.iwrite(4, gn4124.GPIO_INT_MASK_CLR, 4, 0x00000100) # set GPIO interrupt mask
+    b.iwrite(4, gn4124.GPIO_INT_VALUE, 4, 0x00000100) # set GPIO8 polarity to rising edge
+    b.iwrite(4, gn4124.INT_CFG0, 4, 0x00008000) # enable GPIO interrupt on INT0 line
+
     # Write the next item of the DMA chain in the first page (page 0)
     carrier_start1 = 0x0                        # Start address in the carrier
-    card.iwrite(0xc, 0x0000, 4, carrier_start1)	# Start address in the carrier
-    card.iwrite(0xc, 0x0004, 4, address2)	# Start address (low) in the host
-    card.iwrite(0xc, 0x0008, 4, 0x00000000)	# Start address (high) in the host
-    card.iwrite(0xc, 0x000c, 4, 0x40)	        # Length
-    card.iwrite(0xc, 0x0010, 4, 0x00000000)	# Address (low) of the next item in the host
-    card.iwrite(0xc, 0x0014, 4, 0x00000000)	# Address (high) of the next item in the host
-    card.iwrite(0xc, 0x0018, 4, 0x00000000)	# Control of the DMA chain
+    b.iwrite(0xc, 0x0000, 4, carrier_start1)	# Start address in the carrier
+    b.iwrite(0xc, 0x0004, 4, address2)	# Start address (low) in the host
+    b.iwrite(0xc, 0x0008, 4, 0x00000000)	# Start address (high) in the host
+    b.iwrite(0xc, 0x000c, 4, 0x40)	        # Length
+    b.iwrite(0xc, 0x0010, 4, 0x00000000)	# Address (low) of the next item in the host
+    b.iwrite(0xc, 0x0014, 4, 0x00000000)	# Address (high) of the next item in the host
+    b.iwrite(0xc, 0x0018, 4, 0x00000000)	# Control of the DMA chain
+
+    b.submit()
 
     # Write data to be catched by DMA engine in the second page (page 1)
-    wdata = 0xdead0000
-    for addr in xrange(0,16,1):
-        card.iwrite(0xc, 0x1000 + (addr << 2), 4, wdata)
-        wdata += 0x1
-
-    # Configure the first transfer in the DMA controller
-    card.iwrite(0, 0x0008, 4, carrier_start1)	# Start address in the carrier
-    card.iwrite(0, 0x000c, 4, address1)	        # Start address (low) in the host
-    card.iwrite(0, 0x0014, 4, 0x40)	        # Length
-    card.iwrite(0, 0x0018, 4, address0)	        # Address (low) of the next item in the host
-    card.iwrite(0, 0x0020, 4, 0x3)	        # Control of the DMA chain
+    card.write_dmabuf(0x1000, array('I', xrange(0xdead0000, 0xdead0010)))
 
     # Enable interrupts in the driver
     print 'Enable interrupts'
     card.irqena()
 
-    # Start the DMA transfer
+    # Configure the first transfer (host to carrier, then the next
+    # item in page 0) and start it, with a single system call
     print 'Starting transfer'
-    card.iwrite(0, 0x0, 4, 1)
+    dma.submit(carrier_start1, address1, 0x40, dma.P2L, next_addr=address0)
 
-    print 'Wait for end DMA interrupt'
-    card.irqwait()
-    print 'INTERRUPT RECEIVED'
+    # Wait for the two items: spinning for short transfers, then
+    # sleeping until the interrupt, which is cleared and enabled again
+    print 'Wait for end of DMA'
+    dma.complete(2 * 0x40)
+    print 'DMA DONE'
 
-    # Read GN4142 interrupt status registers to clear interrupt
-    print 'INT status  : %.8X' % card.iread(4, 0x814, 4)
-    print 'GPIO status : %.8X' % card.iread(4, 0xA20, 4)
+    # Read GN4142 interrupt status registers
+    print 'INT status  : %.8X' % gn4124.get_int_stat()
+    print 'GPIO status : %.8X' % gn4124.get_gpio_int_status()
 
     # Prints the three pages
     print 'Page 0 - Next transfer - ' + hex(address0)
-    for num in xrange(0, 24, 4):
-        print '%.8X' % card.iread(0xc, num, 4)
+    for word in card.read_dmabuf(0x0000, buf=array('I', [0] * 6)):
+        print '%.8X' % word
 
     print 'Page 1 - Data to write to the board - ' + hex(address1)
-    for num in xrange(0, 64, 4):
-        print '%.8X' % card.iread(0Xc, 0x1000 + num, 4)
+    for word in card.read_dmabuf(0x1000, buf=array('I', [0] * 16)):
+        print '%.8X' % word
 
     print 'Page 2 - Data read back from the board - ' + hex(address2)
-    for num in xrange(0, 64, 4):
-        print '%.8X' % card.iread(0Xc, 0x2000 + num, 4)
+    for word in card.read_dmabuf(0x2000, buf=array('I', [0] * 16)):
+        print '%.8X' % word
@@ -0,0 +1,55 @@
+# generated by wb2py.py from dummy_ctrl_regs_wb_slave.wb: do not edit
+# sha1 f5469c002241cee7d0202b4ffd42db79560b579d
+
+class DummyCtrlRegs(object):
+    """Dummy control registers
+
+    Wishbone slave for test of the CSR wishbone of the GN4124 core, at BAR0 + 0x80000.
+    Accessors are bound to the read/write methods of the card
+    when created: create them after Gennum.select().
+    """
+    bar, base = 0, 0x80000
+
+    REG_1                   = 0x000 # DUMMY_1: IRQ
+    REG_2                   = 0x004 # DUMMY_2: Dummy register 2
+    REG_3                   = 0x008 # DUMMY_3: Dummy register 3
+    LED                     = 0x00c # DUMMY_LED: Dummy register for LED control
+
+    def __init__(self, card, bar=0, base=0x80000):
+        read, write = card.read, card.write
+        a_reg_1 = base + 0x0
+        def get_reg_1():
+            """DUMMY_1: IRQ"""
+            return read(bar, a_reg_1, 4)
+        def set_reg_1(value):
+            """DUMMY_1: IRQ"""
+            write(bar, a_reg_1, 4, value)
+        self.get_reg_1 = get_reg_1
+        self.set_reg_1 = set_reg_1
+        a_reg_2 = base + 0x4
+        def get_reg_2():
+            """DUMMY_2: Dummy register 2"""
+            return read(bar, a_reg_2, 4)
+        def set_reg_2(value):
+            """DUMMY_2: Dummy register 2"""
+            write(bar, a_reg_2, 4, value)
+        self.get_reg_2 = get_reg_2
+        self.set_reg_2 = set_reg_2
+        a_reg_3 = base + 0x8
+        def get_reg_3():
+            """DUMMY_3: Dummy register 3"""
+            return read(bar, a_reg_3, 4)
+        def set_reg_3(value):
+            """DUMMY_3: Dummy register 3"""
+            write(bar, a_reg_3, 4, value)
+        self.get_reg_3 = get_reg_3
+        self.set_reg_3 = set_reg_3
+        a_led = base + 0xc
+        def get_led():
+            """DUMMY_LED: Dummy register for LED control"""
+            return read(bar, a_led, 4)
+        def set_led(value):
+            """DUMMY_LED: Dummy register for LED control"""
+            write(bar, a_led, 4, value)
+        self.get_led = get_led
+        self.set_led = set_led
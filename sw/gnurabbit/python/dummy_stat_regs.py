@@ -0,0 +1,39 @@
+# generated by wb2py.py from dummy_stat_regs_wb_slave.wb: do not edit
+# sha1 419e3e14a1a0681d5db2c653f7ff9bb517561d83
+
+class DummyStatRegs(object):
+    """Dummy status registers
+
+    Wishbone slave for test of the CSR wishbone of the GN4124 core, at BAR0 + 0x40000.
+    Accessors are bound to the read/write methods of the card
+    when created: create them after Gennum.select().
+    """
+    bar, base = 0, 0x40000
+
+    REG_1                   = 0x000 # DUMMY_1: Dummy register 1
+    REG_2                   = 0x004 # DUMMY_2: Dummy register 2
+    REG_3                   = 0x008 # DUMMY_3: Dummy register 3
+    SWITCH                  = 0x00c # DUMMY_SWITCH: Dummy register for switch status
+
+    def __init__(self, card, bar=0, base=0x40000):
+        read, write = card.read, card.write
+        a_reg_1 = base + 0x0
+        def get_reg_1():
+            """DUMMY_1: Dummy register 1"""
+            return read(bar, a_reg_1, 4)
+        self.get_reg_1 = get_reg_1
+        a_reg_2 = base + 0x4
+        def get_reg_2():
+            """DUMMY_2: Dummy register 2"""
+            return read(bar, a_reg_2, 4)
+        self.get_reg_2 = get_reg_2
+        a_reg_3 = base + 0x8
+        def get_reg_3():
+            """DUMMY_3: Dummy register 3"""
+            return read(bar, a_reg_3, 4)
+        self.get_reg_3 = get_reg_3
+        a_switch = base + 0xc
+        def get_switch():
+            """DUMMY_SWITCH: Dummy register for switch status"""
+            return read(bar, a_switch, 4)
+        self.get_switch = get_switch
@@ -4,66 +4,65 @@
 import sys
 import rr
 import time
+from gn4124_regs import Gn4124Regs
 
 if __name__ == '__main__':
 
     # bind to the Gennum kit
     card = rr.Gennum()
 
+    # LB_CTL is only changed by us: keep it in the shadow cache to
+    # save the bus read of its read-modify-write
+    card.shadow(4, Gn4124Regs.LB_CTL)
+
+    # Wait in the driver for the I2C bus to be idle
+    def twi_wait_idle(gennum):
+        return gennum.wait_for(4, Gn4124Regs.TWI_STATUS,
+                               Gn4124Regs.TWI_STATUS_BA_MASK, 0)
+
+    # Wait in the driver for a transfer to complete or fail, return the
+    # (read to clear) TWI_IRT_STATUS, 0 on timeout
+    def twi_wait_done(gennum):
+        mask = Gn4124Regs.TWI_IRT_STATUS_COMP_MASK | \
+               Gn4124Regs.TWI_IRT_STATUS_NACK_MASK | \
+               Gn4124Regs.TWI_IRT_STATUS_TO_MASK
+        tmp, elapsed = gennum.wait_for(4, Gn4124Regs.TWI_IRT_STATUS,
+                                       mask, 0, equal=False)
+        return tmp & mask
+
     # Read from I2C
     def i2c_read(gennum, i2c_addr, offset, length, read_data):
+        regs = Gn4124Regs(gennum)
         # Shut off EEPROM_INIT state machine if not done so */
-        tmp = gennum.iread(4, 0x804, 4)
-        #print 'LB_CTL=%.8X' % tmp
-        if tmp & 0x10000 == 0:
-            tmp |= 0x10000
-            #print 'LB_CTL=%.8X' % tmp
-            gennum.iwrite(4, 0x804, 4, tmp)
+        if not regs.get_lb_ctl_eeprom_stop():
+            regs.set_lb_ctl_eeprom_stop(1)
         # Init I2C clock Fpci/(22*Fscl)=(DIV_A+1)*(DIV_B+1)
         # CLR_FIFO=1, SLVMON=0, HOLD=0, ACKEN=1, NEA=1, MS=1, RW=0
-        gennum.iwrite(4, 0x900, 4, 0x384E)
-        # Read back from register to guarantee the mode change
-        tmp = gennum.iread(4, 0x900, 4)
-        #print 'TWI_CTRL=%.8X' % tmp
+        # The mode change is flushed by the TWI_STATUS read below
+        regs.set_twi_ctrl(0x384E)
         # Wait until I2C bus is idle
-        i=2000000
-        while i > 0:
-            i-=1
-            tmp = gennum.iread(4, 0x904, 4)
-            #print 'TWI_STATUS=%.8X' % tmp
-            #time.sleep(.5)
-            if tmp & 0x100 == 0:
-                #print 'I2C bus is idle'
-                break
+        twi_wait_idle(gennum)
         # Read to clear TWI_IRT_STATUS
-        tmp = gennum.iread(4, 0x910, 4)
+        tmp = regs.get_twi_irt_status()
         #print 'TWI_IRT_STATUS=%.8X (read to clear)' % tmp
         # Write word offset
         tmp=(0xFF & offset)
-        gennum.iwrite(4, 0x90C, 4, tmp)
+        regs.set_twi_data(tmp)
         #print 'Write offset %.8X' % tmp
         # Write device address
         tmp=(0x7F & i2c_addr)
-        gennum.iwrite(4, 0x908, 4, tmp)
+        regs.set_twi_address(tmp)
         #print 'Write I2C slave address %.8X' % tmp
         # Wait for transfer complete status
-        i=2000000
-        while i > 0:
-            tmp = gennum.iread(4, 0x910, 4)
-            #print 'TWI_IRT_STATUS=%.8X' % tmp
-            #time.sleep(.5)
-            if tmp & 0x1:
-                #print 'Transfer completed'
-                break
-            elif tmp & 0xC:
-                print 'NACK detected or TIMEOUT, IRT_STATUS = 0x%x!!' % tmp
-                sys.exit()
-            i-=1
-        if i == 0:
+        tmp = twi_wait_done(gennum)
+        if tmp & 0xC:
+            print 'NACK detected or TIMEOUT, IRT_STATUS = 0x%x!!' % tmp
+            sys.exit()
+        if tmp == 0:
             print 'ERROR, completion status not detected!!'
             sys.exit()
         # Change to read mode
-        gennum.iwrite(4, 0x900, 4, 0x384F)
+        regs.set_twi_ctrl(0x384F)
         #print 'Change to read mode'
         # Perform sequential page read from the start address
         error_flag=0
@@ -77,24 +76,17 @@ if __name__ == '__main__':
                 transfer_len = length
                 length = 0
             # Update expected receive data size
-            gennum.iwrite(4, 0x914, 4, transfer_len)
+            regs.set_twi_tr_size(transfer_len)
             #print 'Transfer length=%.3d' % transfer_len
             # Write device address
-            gennum.iwrite(4, 0x908, 4, (0x7F & i2c_addr))
+            regs.set_twi_address((0x7F & i2c_addr))
             # Wait until transfer is completed
-            j=2000000
-            while j > 0:
-                tmp = gennum.iread(4, 0x910, 4)
-                if tmp & 0x1:
-                    #print 'Transfer completed'
-                    break
-                j-=1
-            if j == 0:
+            if not twi_wait_done(gennum) & 0x1:
                 error_flag = 1
                 print 'ERROR, completion status not detected!!'
             # Read data from fifo
             while transfer_len > 0:
-                read_data.append(0xFF & gennum.iread(4, 0x90C, 4))
+                read_data.append(0xFF & regs.get_twi_data())
                 #print 'read_data[%.3d]=%.2X' %(total_transfer,read_data[total_transfer])
                 transfer_len-=1
                 total_transfer+=1
@@ -103,41 +95,32 @@ if __name__ == '__main__':
 
     # Write to I2C
     def i2c_write(gennum, i2c_addr, offset, length, write_data):
+        regs = Gn4124Regs(gennum)
         # Shut off EEPROM_INIT state machine if not done so */
-        tmp = gennum.iread(4, 0x804, 4)
-        #print 'LB_CTL=%.8X' % tmp
-        if tmp & 0x10000 == 0:
-            tmp |= 0x10000
-            #print 'LB_CTL=%.8X' % tmp
-            gennum.iwrite(4, 0x804, 4, tmp)
+        if not regs.get_lb_ctl_eeprom_stop():
+            regs.set_lb_ctl_eeprom_stop(1)
         # Read to clear TWI_IRT_STATUS
-        gennum.iread(4, 0x910, 4)
+        regs.get_twi_irt_status()
         # Read to clear TWI_STATUS
-        gennum.iread(4, 0x904, 4)
+        regs.get_twi_status()
         # Init I2C clock Fpci/(22*Fscl)=(DIV_A+1)*(DIV_B+1)
         # CLR_FIFO=1, SLVMON=0, HOLD=0, ACKEN=1, NEA=1, MS=1, RW=0
-        gennum.iwrite(4, 0x900, 4, 0x384E)
-        # Read back from register to guarantee the mode change
-        gennum.iread(4, 0x900, 4)
+        # The mode change is flushed by the TWI_STATUS read below
+        regs.set_twi_ctrl(0x384E)
         # Wait until I2C bus is idle
-        i=2000000
-        while i > 0:
-            i-=1
-            tmp = gennum.iread(4, 0x904, 4)
-            if tmp & 0x100 == 0:
-                break
+        twi_wait_idle(gennum)
         # Perform sequential page write from the start address
         error_flag=0
         total_transfer=0
         while length > 0 and error_flag == 0:
             # Write word offset
-            gennum.iwrite(4, 0x90C, 4, (0xFF & offset))
+            regs.set_twi_data((0xFF & offset))
             #print 'Offset=%.2X' % offset
             i=6 # fifo size - 2
             while i > 0 and length > 0:
                 tmp = (0xFF & write_data[total_transfer])
                 #print 'data=%.2X' % tmp
-                gennum.iwrite(4, 0x90C, 4, tmp)
+                regs.set_twi_data(tmp)
                 total_transfer+=1
                 offset+=1
                 i-=1
@@ -149,25 +132,18 @@ if __name__ == '__main__':
                     #print 'page boundary reached!'
                     break
             # Write device address
-            gennum.iwrite(4, 0x908, 4, (0x7F & i2c_addr))
+            regs.set_twi_address((0x7F & i2c_addr))
             #print 'Write I2C address'
             # Wait until transfer is completed
-            i=2000000
-            while i > 0:
-                tmp = gennum.iread(4, 0x910, 4)
-                time.sleep(0.01)
-                if tmp & 0x1:
-                    #print 'Transfer completed!'
-                    tmp = gennum.iread(4, 0x914, 4)
-                    #print 'TR_SIZE=%d' % tmp
-                    break
-                elif tmp & 0xC:
+            tmp = twi_wait_done(gennum)
+            if not tmp & 0x1:
+                if tmp & 0xC:
                     print 'NACK detected or TIMEOUT, IRT_STATUS = 0x%x!!' % tmp
-                    tmp = gennum.iread(4, 0x914, 4)
-                    #print 'TR_SIZE=%d' % tmp
-                    #print total_transfer
-                    return total_transfer
-                i-=1
+                else:
+                    print 'ERROR, completion status not detected!!'
+                return total_transfer
+            # Leave the EEPROM its write cycle time
+            time.sleep(0.01)
         return total_transfer
 
     def eeprom_dump_to_screen(gennum):
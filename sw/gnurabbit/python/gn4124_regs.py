@@ -0,0 +1,465 @@
+# generated by wb2py.py from gn4124_regs.wb: do not edit
+# sha1 0d55303c976e297faf25d5ca5f903cde771731ad
+
+class Gn4124Regs(object):
+    """GN4124 BAR4 registers
+
+    Registers of the GN4124 PCIe bridge, at BAR4 + 0x0.
+    Accessors are bound to the read/write methods of the card
+    when created: create them after Gennum.select().
+    """
+    bar, base = 4, 0x0
+
+    LB_CTL                  = 0x804 # LB_CTL: Local bus control
+    LB_CTL_EEPROM_STOP_SHIFT= 16
+    LB_CTL_EEPROM_STOP_MASK = 0x10000
+    CLK_CSR                 = 0x808 # CLK_CSR: Local bus clock control and status
+    INT_CTRL                = 0x810 # INT_CTRL: Interrupt control
+    INT_STAT                = 0x814 # INT_STAT: Interrupt status
+    INT_STAT_GPIO_SHIFT     = 15
+    INT_STAT_GPIO_MASK      = 0x8000
+    INT_CFG0                = 0x820 # INT_CFG0: Interrupt sources of INT0
+    INT_CFG1                = 0x824 # INT_CFG1: Interrupt sources of INT1
+    INT_CFG2                = 0x828 # INT_CFG2: Interrupt sources of INT2
+    INT_CFG3                = 0x82c # INT_CFG3: Interrupt sources of INT3
+    INT_CFG4                = 0x830 # INT_CFG4: Interrupt sources of INT4
+    INT_CFG5                = 0x834 # INT_CFG5: Interrupt sources of INT5
+    INT_CFG6                = 0x838 # INT_CFG6: Interrupt sources of INT6
+    INT_CFG7                = 0x83c # INT_CFG7: Interrupt sources of INT7
+    TWI_CTRL                = 0x900 # TWI_CTRL: TWI control
+    TWI_CTRL_RW_SHIFT       = 0
+    TWI_CTRL_RW_MASK        = 0x1
+    TWI_CTRL_MS_SHIFT       = 1
+    TWI_CTRL_MS_MASK        = 0x2
+    TWI_CTRL_NEA_SHIFT      = 2
+    TWI_CTRL_NEA_MASK       = 0x4
+    TWI_CTRL_ACKEN_SHIFT    = 3
+    TWI_CTRL_ACKEN_MASK     = 0x8
+    TWI_CTRL_HOLD_SHIFT     = 4
+    TWI_CTRL_HOLD_MASK      = 0x10
+    TWI_CTRL_SLVMON_SHIFT   = 5
+    TWI_CTRL_SLVMON_MASK    = 0x20
+    TWI_CTRL_CLR_FIFO_SHIFT = 6
+    TWI_CTRL_CLR_FIFO_MASK  = 0x40
+    TWI_CTRL_DIV_B_SHIFT    = 8
+    TWI_CTRL_DIV_B_MASK     = 0x3f00
+    TWI_CTRL_DIV_A_SHIFT    = 14
+    TWI_CTRL_DIV_A_MASK     = 0xc000
+    TWI_STATUS              = 0x904 # TWI_STATUS: TWI status
+    TWI_STATUS_BA_SHIFT     = 8
+    TWI_STATUS_BA_MASK      = 0x100
+    TWI_ADDRESS             = 0x908 # TWI_ADDRESS: TWI slave address, starts the transfer
+    TWI_DATA                = 0x90c # TWI_DATA: TWI data FIFO
+    TWI_IRT_STATUS          = 0x910 # TWI_IRT_STATUS: TWI interrupt status, cleared on read
+    TWI_IRT_STATUS_COMP_SHIFT= 0
+    TWI_IRT_STATUS_COMP_MASK= 0x1
+    TWI_IRT_STATUS_NACK_SHIFT= 2
+    TWI_IRT_STATUS_NACK_MASK= 0x4
+    TWI_IRT_STATUS_TO_SHIFT = 3
+    TWI_IRT_STATUS_TO_MASK  = 0x8
+    TWI_TR_SIZE             = 0x914 # TWI_TR_SIZE: TWI transfer size
+    GPIO_BYPASS_MODE        = 0xa00 # GPIO_BYPASS_MODE: GPIO bypass mode
+    GPIO_DIRECTION_MODE     = 0xa04 # GPIO_DIRECTION_MODE: GPIO direction, 1 for input
+    GPIO_OUTPUT_ENABLE      = 0xa08 # GPIO_OUTPUT_ENABLE: GPIO output enable
+    GPIO_OUTPUT_VALUE       = 0xa0c # GPIO_OUTPUT_VALUE: GPIO output value
+    GPIO_INPUT_VALUE        = 0xa10 # GPIO_INPUT_VALUE: GPIO input value
+    GPIO_INT_MASK           = 0xa14 # GPIO_INT_MASK: GPIO interrupt mask, 1 for masked
+    GPIO_INT_MASK_CLR       = 0xa18 # GPIO_INT_MASK_CLR: GPIO interrupt mask, clear bits
+    GPIO_INT_MASK_SET       = 0xa1c # GPIO_INT_MASK_SET: GPIO interrupt mask, set bits
+    GPIO_INT_STATUS         = 0xa20 # GPIO_INT_STATUS: GPIO interrupt status, cleared on read
+    GPIO_INT_TYPE           = 0xa24 # GPIO_INT_TYPE: GPIO interrupt type, 1 for level
+    GPIO_INT_VALUE          = 0xa28 # GPIO_INT_VALUE: GPIO interrupt polarity, 1 for high or rising
+    GPIO_INT_ON_ANY         = 0xa2c # GPIO_INT_ON_ANY: GPIO interrupt on both edges
+
+    def __init__(self, card, bar=4, base=0x0):
+        read, write = card.read, card.write
+        a_lb_ctl = base + 0x804
+        def get_lb_ctl():
+            """LB_CTL: Local bus control"""
+            return read(bar, a_lb_ctl, 4)
+        def set_lb_ctl(value):
+            """LB_CTL: Local bus control"""
+            write(bar, a_lb_ctl, 4, value)
+        self.get_lb_ctl = get_lb_ctl
+        self.set_lb_ctl = set_lb_ctl
+        def get_lb_ctl_eeprom_stop():
+            """EEPROM_INIT state machine stopped"""
+            return (read(bar, a_lb_ctl, 4) & 0x10000) >> 16
+        def set_lb_ctl_eeprom_stop(value):
+            """EEPROM_INIT state machine stopped"""
+            write(bar, a_lb_ctl, 4, (read(bar, a_lb_ctl, 4) & 0xfffeffff) | ((value << 16) & 0x10000))
+        self.get_lb_ctl_eeprom_stop = get_lb_ctl_eeprom_stop
+        self.set_lb_ctl_eeprom_stop = set_lb_ctl_eeprom_stop
+        a_clk_csr = base + 0x808
+        def get_clk_csr():
+            """CLK_CSR: Local bus clock control and status"""
+            return read(bar, a_clk_csr, 4)
+        def set_clk_csr(value):
+            """CLK_CSR: Local bus clock control and status"""
+            write(bar, a_clk_csr, 4, value)
+        self.get_clk_csr = get_clk_csr
+        self.set_clk_csr = set_clk_csr
+        a_int_ctrl = base + 0x810
+        def get_int_ctrl():
+            """INT_CTRL: Interrupt control"""
+            return read(bar, a_int_ctrl, 4)
+        def set_int_ctrl(value):
+            """INT_CTRL: Interrupt control"""
+            write(bar, a_int_ctrl, 4, value)
+        self.get_int_ctrl = get_int_ctrl
+        self.set_int_ctrl = set_int_ctrl
+        a_int_stat = base + 0x814
+        def get_int_stat():
+            """INT_STAT: Interrupt status"""
+            return read(bar, a_int_stat, 4)
+        def set_int_stat(value):
+            """INT_STAT: Interrupt status"""
+            write(bar, a_int_stat, 4, value)
+        self.get_int_stat = get_int_stat
+        self.set_int_stat = set_int_stat
+        def get_int_stat_gpio():
+            """GPIO interrupt"""
+            return (read(bar, a_int_stat, 4) & 0x8000) >> 15
+        def set_int_stat_gpio(value):
+            """GPIO interrupt"""
+            write(bar, a_int_stat, 4, (read(bar, a_int_stat, 4) & 0xffff7fff) | ((value << 15) & 0x8000))
+        self.get_int_stat_gpio = get_int_stat_gpio
+        self.set_int_stat_gpio = set_int_stat_gpio
+        a_int_cfg0 = base + 0x820
+        def get_int_cfg0():
+            """INT_CFG0: Interrupt sources of INT0"""
+            return read(bar, a_int_cfg0, 4)
+        def set_int_cfg0(value):
+            """INT_CFG0: Interrupt sources of INT0"""
+            write(bar, a_int_cfg0, 4, value)
+        self.get_int_cfg0 = get_int_cfg0
+        self.set_int_cfg0 = set_int_cfg0
+        a_int_cfg1 = base + 0x824
+        def get_int_cfg1():
+            """INT_CFG1: Interrupt sources of INT1"""
+            return read(bar, a_int_cfg1, 4)
+        def set_int_cfg1(value):
+            """INT_CFG1: Interrupt sources of INT1"""
+            write(bar, a_int_cfg1, 4, value)
+        self.get_int_cfg1 = get_int_cfg1
+        self.set_int_cfg1 = set_int_cfg1
+        a_int_cfg2 = base + 0x828
+        def get_int_cfg2():
+            """INT_CFG2: Interrupt sources of INT2"""
+            return read(bar, a_int_cfg2, 4)
+        def set_int_cfg2(value):
+            """INT_CFG2: Interrupt sources of INT2"""
+            write(bar, a_int_cfg2, 4, value)
+        self.get_int_cfg2 = get_int_cfg2
+        self.set_int_cfg2 = set_int_cfg2
+        a_int_cfg3 = base + 0x82c
+        def get_int_cfg3():
+            """INT_CFG3: Interrupt sources of INT3"""
+            return read(bar, a_int_cfg3, 4)
+        def set_int_cfg3(value):
+            """INT_CFG3: Interrupt sources of INT3"""
+            write(bar, a_int_cfg3, 4, value)
+        self.get_int_cfg3 = get_int_cfg3
+        self.set_int_cfg3 = set_int_cfg3
+        a_int_cfg4 = base + 0x830
+        def get_int_cfg4():
+            """INT_CFG4: Interrupt sources of INT4"""
+            return read(bar, a_int_cfg4, 4)
+        def set_int_cfg4(value):
+            """INT_CFG4: Interrupt sources of INT4"""
+            write(bar, a_int_cfg4, 4, value)
+        self.get_int_cfg4 = get_int_cfg4
+        self.set_int_cfg4 = set_int_cfg4
+        a_int_cfg5 = base + 0x834
+        def get_int_cfg5():
+            """INT_CFG5: Interrupt sources of INT5"""
+            return read(bar, a_int_cfg5, 4)
+        def set_int_cfg5(value):
+            """INT_CFG5: Interrupt sources of INT5"""
+            write(bar, a_int_cfg5, 4, value)
+        self.get_int_cfg5 = get_int_cfg5
+        self.set_int_cfg5 = set_int_cfg5
+        a_int_cfg6 = base + 0x838
+        def get_int_cfg6():
+            """INT_CFG6: Interrupt sources of INT6"""
+            return read(bar, a_int_cfg6, 4)
+        def set_int_cfg6(value):
+            """INT_CFG6: Interrupt sources of INT6"""
+            write(bar, a_int_cfg6, 4, value)
+        self.get_int_cfg6 = get_int_cfg6
+        self.set_int_cfg6 = set_int_cfg6
+        a_int_cfg7 = base + 0x83c
+        def get_int_cfg7():
+            """INT_CFG7: Interrupt sources of INT7"""
+            return read(bar, a_int_cfg7, 4)
+        def set_int_cfg7(value):
+            """INT_CFG7: Interrupt sources of INT7"""
+            write(bar, a_int_cfg7, 4, value)
+        self.get_int_cfg7 = get_int_cfg7
+        self.set_int_cfg7 = set_int_cfg7
+        a_twi_ctrl = base + 0x900
+        def get_twi_ctrl():
+            """TWI_CTRL: TWI control"""
+            return read(bar, a_twi_ctrl, 4)
+        def set_twi_ctrl(value):
+            """TWI_CTRL: TWI control"""
+            write(bar, a_twi_ctrl, 4, value)
+        self.get_twi_ctrl = get_twi_ctrl
+        self.set_twi_ctrl = set_twi_ctrl
+        def get_twi_ctrl_rw():
+            """Read (1) or write (0) transfer"""
+            return (read(bar, a_twi_ctrl, 4) & 0x1) >> 0
+        def set_twi_ctrl_rw(value):
+            """Read (1) or write (0) transfer"""
+            write(bar, a_twi_ctrl, 4, (read(bar, a_twi_ctrl, 4) & 0xfffffffe) | ((value << 0) & 0x1))
+        self.get_twi_ctrl_rw = get_twi_ctrl_rw
+        self.set_twi_ctrl_rw = set_twi_ctrl_rw
+        def get_twi_ctrl_ms():
+            """Master mode"""
+            return (read(bar, a_twi_ctrl, 4) & 0x2) >> 1
+        def set_twi_ctrl_ms(value):
+            """Master mode"""
+            write(bar, a_twi_ctrl, 4, (read(bar, a_twi_ctrl, 4) & 0xfffffffd) | ((value << 1) & 0x2))
+        self.get_twi_ctrl_ms = get_twi_ctrl_ms
+        self.set_twi_ctrl_ms = set_twi_ctrl_ms
+        def get_twi_ctrl_nea():
+            """Normal (7-bit) addressing"""
+            return (read(bar, a_twi_ctrl, 4) & 0x4) >> 2
+        def set_twi_ctrl_nea(value):
+            """Normal (7-bit) addressing"""
+            write(bar, a_twi_ctrl, 4, (read(bar, a_twi_ctrl, 4) & 0xfffffffb) | ((value << 2) & 0x4))
+        self.get_twi_ctrl_nea = get_twi_ctrl_nea
+        self.set_twi_ctrl_nea = set_twi_ctrl_nea
+        def get_twi_ctrl_acken():
+            """Acknowledge enable"""
+            return (read(bar, a_twi_ctrl, 4) & 0x8) >> 3
+        def set_twi_ctrl_acken(value):
+            """Acknowledge enable"""
+            write(bar, a_twi_ctrl, 4, (read(bar, a_twi_ctrl, 4) & 0xfffffff7) | ((value << 3) & 0x8))
+        self.get_twi_ctrl_acken = get_twi_ctrl_acken
+        self.set_twi_ctrl_acken = set_twi_ctrl_acken
+        def get_twi_ctrl_hold():
+            """Hold the bus"""
+            return (read(bar, a_twi_ctrl, 4) & 0x10) >> 4
+        def set_twi_ctrl_hold(value):
+            """Hold the bus"""
+            write(bar, a_twi_ctrl, 4, (read(bar, a_twi_ctrl, 4) & 0xffffffef) | ((value << 4) & 0x10))
+        self.get_twi_ctrl_hold = get_twi_ctrl_hold
+        self.set_twi_ctrl_hold = set_twi_ctrl_hold
+        def get_twi_ctrl_slvmon():
+            """Slave monitor mode"""
+            return (read(bar, a_twi_ctrl, 4) & 0x20) >> 5
+        def set_twi_ctrl_slvmon(value):
+            """Slave monitor mode"""
+            write(bar, a_twi_ctrl, 4, (read(bar, a_twi_ctrl, 4) & 0xffffffdf) | ((value << 5) & 0x20))
+        self.get_twi_ctrl_slvmon = get_twi_ctrl_slvmon
+        self.set_twi_ctrl_slvmon = set_twi_ctrl_slvmon
+        def get_twi_ctrl_clr_fifo():
+            """Clear the FIFO"""
+            return (read(bar, a_twi_ctrl, 4) & 0x40) >> 6
+        def set_twi_ctrl_clr_fifo(value):
+            """Clear the FIFO"""
+            write(bar, a_twi_ctrl, 4, (read(bar, a_twi_ctrl, 4) & 0xffffffbf) | ((value << 6) & 0x40))
+        self.get_twi_ctrl_clr_fifo = get_twi_ctrl_clr_fifo
+        self.set_twi_ctrl_clr_fifo = set_twi_ctrl_clr_fifo
+        def get_twi_ctrl_div_b():
+            """Clock divisor B"""
+            return (read(bar, a_twi_ctrl, 4) & 0x3f00) >> 8
+        def set_twi_ctrl_div_b(value):
+            """Clock divisor B"""
+            write(bar, a_twi_ctrl, 4, (read(bar, a_twi_ctrl, 4) & 0xffffc0ff) | ((value << 8) & 0x3f00))
+        self.get_twi_ctrl_div_b = get_twi_ctrl_div_b
+        self.set_twi_ctrl_div_b = set_twi_ctrl_div_b
+        def get_twi_ctrl_div_a():
+            """Clock divisor A"""
+            return (read(bar, a_twi_ctrl, 4) & 0xc000) >> 14
+        def set_twi_ctrl_div_a(value):
+            """Clock divisor A"""
+            write(bar, a_twi_ctrl, 4, (read(bar, a_twi_ctrl, 4) & 0xffff3fff) | ((value << 14) & 0xc000))
+        self.get_twi_ctrl_div_a = get_twi_ctrl_div_a
+        self.set_twi_ctrl_div_a = set_twi_ctrl_div_a
+        a_twi_status = base + 0x904
+        def get_twi_status():
+            """TWI_STATUS: TWI status"""
+            return read(bar, a_twi_status, 4)
+        def set_twi_status(value):
+            """TWI_STATUS: TWI status"""
+            write(bar, a_twi_status, 4, value)
+        self.get_twi_status = get_twi_status
+        self.set_twi_status = set_twi_status
+        def get_twi_status_ba():
+            """Bus active"""
+            return (read(bar, a_twi_status, 4) & 0x100) >> 8
+        def set_twi_status_ba(value):
+            """Bus active"""
+            write(bar, a_twi_status, 4, (read(bar, a_twi_status, 4) & 0xfffffeff) | ((value << 8) & 0x100))
+        self.get_twi_status_ba = get_twi_status_ba
+        self.set_twi_status_ba = set_twi_status_ba
+        a_twi_address = base + 0x908
+        def get_twi_address():
+            """TWI_ADDRESS: TWI slave address, starts the transfer"""
+            return read(bar, a_twi_address, 4)
+        def set_twi_address(value):
+            """TWI_ADDRESS: TWI slave address, starts the transfer"""
+            write(bar, a_twi_address, 4, value)
+        self.get_twi_address = get_twi_address
+        self.set_twi_address = set_twi_address
+        a_twi_data = base + 0x90c
+        def get_twi_data():
+            """TWI_DATA: TWI data FIFO"""
+            return read(bar, a_twi_data, 4)
+        def set_twi_data(value):
+            """TWI_DATA: TWI data FIFO"""
+            write(bar, a_twi_data, 4, value)
+        self.get_twi_data = get_twi_data
+        self.set_twi_data = set_twi_data
+        a_twi_irt_status = base + 0x910
+        def get_twi_irt_status():
+            """TWI_IRT_STATUS: TWI interrupt status, cleared on read"""
+            return read(bar, a_twi_irt_status, 4)
+        def set_twi_irt_status(value):
+            """TWI_IRT_STATUS: TWI interrupt status, cleared on read"""
+            write(bar, a_twi_irt_status, 4, value)
+        self.get_twi_irt_status = get_twi_irt_status
+        self.set_twi_irt_status = set_twi_irt_status
+        def get_twi_irt_status_comp():
+            """Transfer complete"""
+            return (read(bar, a_twi_irt_status, 4) & 0x1) >> 0
+        def set_twi_irt_status_comp(value):
+            """Transfer complete"""
+            write(bar, a_twi_irt_status, 4, (read(bar, a_twi_irt_status, 4) & 0xfffffffe) | ((value << 0) & 0x1))
+        self.get_twi_irt_status_comp = get_twi_irt_status_comp
+        self.set_twi_irt_status_comp = set_twi_irt_status_comp
+        def get_twi_irt_status_nack():
+            """Transfer not acknowledged"""
+            return (read(bar, a_twi_irt_status, 4) & 0x4) >> 2
+        def set_twi_irt_status_nack(value):
+            """Transfer not acknowledged"""
+            write(bar, a_twi_irt_status, 4, (read(bar, a_twi_irt_status, 4) & 0xfffffffb) | ((value << 2) & 0x4))
+        self.get_twi_irt_status_nack = get_twi_irt_status_nack
+        self.set_twi_irt_status_nack = set_twi_irt_status_nack
+        def get_twi_irt_status_to():
+            """Transfer timed out"""
+            return (read(bar, a_twi_irt_status, 4) & 0x8) >> 3
+        def set_twi_irt_status_to(value):
+            """Transfer timed out"""
+            write(bar, a_twi_irt_status, 4, (read(bar, a_twi_irt_status, 4) & 0xfffffff7) | ((value << 3) & 0x8))
+        self.get_twi_irt_status_to = get_twi_irt_status_to
+        self.set_twi_irt_status_to = set_twi_irt_status_to
+        a_twi_tr_size = base + 0x914
+        def get_twi_tr_size():
+            """TWI_TR_SIZE: TWI transfer size"""
+            return read(bar, a_twi_tr_size, 4)
+        def set_twi_tr_size(value):
+            """TWI_TR_SIZE: TWI transfer size"""
+            write(bar, a_twi_tr_size, 4, value)
+        self.get_twi_tr_size = get_twi_tr_size
+        self.set_twi_tr_size = set_twi_tr_size
+        a_gpio_bypass_mode = base + 0xa00
+        def get_gpio_bypass_mode():
+            """GPIO_BYPASS_MODE: GPIO bypass mode"""
+            return read(bar, a_gpio_bypass_mode, 4)
+        def set_gpio_bypass_mode(value):
+            """GPIO_BYPASS_MODE: GPIO bypass mode"""
+            write(bar, a_gpio_bypass_mode, 4, value)
+        self.get_gpio_bypass_mode = get_gpio_bypass_mode
+        self.set_gpio_bypass_mode = set_gpio_bypass_mode
+        a_gpio_direction_mode = base + 0xa04
+        def get_gpio_direction_mode():
+            """GPIO_DIRECTION_MODE: GPIO direction, 1 for input"""
+            return read(bar, a_gpio_direction_mode, 4)
+        def set_gpio_direction_mode(value):
+            """GPIO_DIRECTION_MODE: GPIO direction, 1 for input"""
+            write(bar, a_gpio_direction_mode, 4, value)
+        self.get_gpio_direction_mode = get_gpio_direction_mode
+        self.set_gpio_direction_mode = set_gpio_direction_mode
+        a_gpio_output_enable = base + 0xa08
+        def get_gpio_output_enable():
+            """GPIO_OUTPUT_ENABLE: GPIO output enable"""
+            return read(bar, a_gpio_output_enable, 4)
+        def set_gpio_output_enable(value):
+            """GPIO_OUTPUT_ENABLE: GPIO output enable"""
+            write(bar, a_gpio_output_enable, 4, value)
+        self.get_gpio_output_enable = get_gpio_output_enable
+        self.set_gpio_output_enable = set_gpio_output_enable
+        a_gpio_output_value = base + 0xa0c
+        def get_gpio_output_value():
+            """GPIO_OUTPUT_VALUE: GPIO output value"""
+            return read(bar, a_gpio_output_value, 4)
+        def set_gpio_output_value(value):
+            """GPIO_OUTPUT_VALUE: GPIO output value"""
+            write(bar, a_gpio_output_value, 4, value)
+        self.get_gpio_output_value = get_gpio_output_value
+        self.set_gpio_output_value = set_gpio_output_value
+        a_gpio_input_value = base + 0xa10
+        def get_gpio_input_value():
+            """GPIO_INPUT_VALUE: GPIO input value"""
+            return read(bar, a_gpio_input_value, 4)
+        def set_gpio_input_value(value):
+            """GPIO_INPUT_VALUE: GPIO input value"""
+            write(bar, a_gpio_input_value, 4, value)
+        self.get_gpio_input_value = get_gpio_input_value
+        self.set_gpio_input_value = set_gpio_input_value
+        a_gpio_int_mask = base + 0xa14
+        def get_gpio_int_mask():
+            """GPIO_INT_MASK: GPIO interrupt mask, 1 for masked"""
+            return read(bar, a_gpio_int_mask, 4)
+        def set_gpio_int_mask(value):
+            """GPIO_INT_MASK: GPIO interrupt mask, 1 for masked"""
+            write(bar, a_gpio_int_mask, 4, value)
+        self.get_gpio_int_mask = get_gpio_int_mask
+        self.set_gpio_int_mask = set_gpio_int_mask
+        a_gpio_int_mask_clr = base + 0xa18
+        def get_gpio_int_mask_clr():
+            """GPIO_INT_MASK_CLR: GPIO interrupt mask, clear bits"""
+            return read(bar, a_gpio_int_mask_clr, 4)
+        def set_gpio_int_mask_clr(value):
+            """GPIO_INT_MASK_CLR: GPIO interrupt mask, clear bits"""
+            write(bar, a_gpio_int_mask_clr, 4, value)
+        self.get_gpio_int_mask_clr = get_gpio_int_mask_clr
+        self.set_gpio_int_mask_clr = set_gpio_int_mask_clr
+        a_gpio_int_mask_set = base + 0xa1c
+        def get_gpio_int_mask_set():
+            """GPIO_INT_MASK_SET: GPIO interrupt mask, set bits"""
+            return read(bar, a_gpio_int_mask_set, 4)
+        def set_gpio_int_mask_set(value):
+            """GPIO_INT_MASK_SET: GPIO interrupt mask, set bits"""
+            write(bar, a_gpio_int_mask_set, 4, value)
+        self.get_gpio_int_mask_set = get_gpio_int_mask_set
+        self.set_gpio_int_mask_set = set_gpio_int_mask_set
+        a_gpio_int_status = base + 0xa20
+        def get_gpio_int_status():
+            """GPIO_INT_STATUS: GPIO interrupt status, cleared on read"""
+            return read(bar, a_gpio_int_status, 4)
+        def set_gpio_int_status(value):
+            """GPIO_INT_STATUS: GPIO interrupt status, cleared on read"""
+            write(bar, a_gpio_int_status, 4, value)
+        self.get_gpio_int_status = get_gpio_int_status
+        self.set_gpio_int_status = set_gpio_int_status
+        a_gpio_int_type = base + 0xa24
+        def get_gpio_int_type():
+            """GPIO_INT_TYPE: GPIO interrupt type, 1 for level"""
+            return read(bar, a_gpio_int_type, 4)
+        def set_gpio_int_type(value):
+            """GPIO_INT_TYPE: GPIO interrupt type, 1 for level"""
+            write(bar, a_gpio_int_type, 4, value)
+        self.get_gpio_int_type = get_gpio_int_type
+        self.set_gpio_int_type = set_gpio_int_type
+        a_gpio_int_value = base + 0xa28
+        def get_gpio_int_value():
+            """GPIO_INT_VALUE: GPIO interrupt polarity, 1 for high or rising"""
+            return read(bar, a_gpio_int_value, 4)
+        def set_gpio_int_value(value):
+            """GPIO_INT_VALUE: GPIO interrupt polarity, 1 for high or rising"""
+            write(bar, a_gpio_int_value, 4, value)
+        self.get_gpio_int_value = get_gpio_int_value
+        self.set_gpio_int_value = set_gpio_int_value
+        a_gpio_int_on_any = base + 0xa2c
+        def get_gpio_int_on_any():
+            """GPIO_INT_ON_ANY: GPIO interrupt on both edges"""
+            return read(bar, a_gpio_int_on_any, 4)
+        def set_gpio_int_on_any(value):
+            """GPIO_INT_ON_ANY: GPIO interrupt on both edges"""
+            write(bar, a_gpio_int_on_any, 4, value)
+        self.get_gpio_int_on_any = get_gpio_int_on_any
+        self.set_gpio_int_on_any = set_gpio_int_on_any
@@ -2,7 +2,10 @@
 #   :vi:ts=4 sw=4 et
 
 from ctypes import *
-import os, errno, re, sys, struct
+import os, errno, re, sys, struct, mmap, time, fcntl, glob, threading, select
+import bisect, collections, heapq
+from multiprocessing.pool import ThreadPool
+from array import array
 
 # python 2.4 kludge
 if not 'SEEK_SET' in dir(os):
@@ -11,25 +14,98 @@ if not 'SEEK_SET' in dir(os):
 # unsigned formats to unpack words
 fmt = { 1: 'B', 2: 'H', 4: 'I', 8: 'L' }
 
+# unsigned ctypes to access mapped registers with the right width
+ctype = { 1: c_ubyte, 2: c_ushort, 4: c_uint, 8: c_ulonglong }
+
+# ctypes types by struct format, for the python 2 dmabuf_array
+fmtctype = { 'b': c_byte, 'B': c_ubyte, 'h': c_short, 'H': c_ushort,
+             'i': c_int, 'I': c_uint, 'l': c_long, 'L': c_ulong,
+             'q': c_longlong, 'Q': c_ulonglong, 'f': c_float, 'd': c_double }
+
+# unsigned array typecodes, by width (no 'Q' before python 3.3)
+arraycode = {}
+for c in 'QLIHB':
+    try:
+        arraycode[array(c).itemsize] = c
+    except ValueError:
+        pass
+
 # some defaults from rawrabbit.h
 RR_DEVSEL_UNUSED    = 0xffff
 RR_DEFAULT_VENDOR 	= 0x1a39
 RR_DEFAULT_DEVICE 	= 0x0004
+RR_DEFAULT_BUFSIZE	= 1 << 20
 
 RR_BAR_0  	= 0x00000000
 RR_BAR_2  	= 0x20000000
 RR_BAR_4  	= 0x40000000
 RR_BAR_BUF	= 0xc0000000
 
+RR_PLIST_SIZE	= 4096
+RR_PLIST_LEN	= RR_PLIST_SIZE // 4	# RR_GETPLIST, 32 bits each
+RR_MAX_BUFSIZE	= 1 << 30
+RR_DMA_CONTIGUOUS	= 0x00000001
+
+RR_BATCH_WRITE	= 0x80000000
+RR_BATCH_MAX	= 4096
+RR_POLL_NE	= 0x00000001
+RR_POLL_SPIN_NS	= 20000
+RR_POLL_SLEEP_MIN_NS	= 2000
+RR_POLL_SLEEP_MAX_NS	= 200000
+RR_IRQSRC_STATUS	= 0x00000001
+RR_IRQSRC_ACK_READ	= 0x00000002
+RR_IRQSRC_ACK_WRITE	= 0x00000004
+RR_IRQSRC_ENABLE	= 0x00000008
+RR_NEVENTS	= 256
+RR_EVENTS_WAIT	= 0x00000001
+
 bar_map = {
     0 : RR_BAR_0,
 	2: RR_BAR_2,
 	4: RR_BAR_4,
 	0xc: RR_BAR_BUF }
 
-# classes to interface with the driver via ctypes
+def split_address(address):
+    """return (bar, offset) for an address made with bar_map
+
+    The DMA buffer takes all the space from RR_BAR_BUF up.
+    """
+    if address >= RR_BAR_BUF:
+        return 0xc, address - RR_BAR_BUF
+    return address >> 28, address & 0x0fffffff
+
+# positional I/O straight from libc: a single system call, no file offset
+libc = CDLL(None, use_errno=True)
+for f in libc.pread64, libc.pwrite64:
+    f.argtypes = [ c_int, c_void_p, c_size_t, c_longlong ]
+    f.restype = c_ssize_t
+
+def nbytes(data):
+    """return the size in bytes of a buffer object"""
+    try:
+        return memoryview(data).nbytes
+    except (TypeError, AttributeError):
+        return len(buffer(data))
+
+def pread(fd, buf, size, offset):
+    """read size bytes at offset straight into buf, return the count"""
+    ret = libc.pread64(fd, (c_char * size).from_buffer(buf), size, offset)
+    if ret < 0:
+        raise IOError(get_errno(), os.strerror(get_errno()))
+    return ret
 
-Plist = c_int * 256
+def pwrite(fd, data, size, offset):
+    """write size bytes from data at offset, return the count"""
+    try:
+        ptr = (c_char * size).from_buffer(data)
+    except TypeError:
+        ptr = (c_char * size).from_buffer_copy(data) # read-only data
+    ret = libc.pwrite64(fd, ptr, size, offset)
+    if ret < 0:
+        raise IOError(get_errno(), os.strerror(get_errno()))
+    return ret
+
+# classes to interface with the driver via ctypes
 
 class RR_Devsel(Structure):
     _fields_ = [
@@ -57,41 +133,1054 @@ class RR_Iocmd(Structure):
         ("data", 	RR_U),
     ]
 
+class RR_Iopoll(Structure):
+    _fields_ = [
+        ("address",	c_uint),
+        ("datasize",	c_uint),
+        ("mask", 	c_ulonglong),
+        ("value", 	c_ulonglong),
+        ("timeout_ns",	c_ulonglong),
+        ("data64", 	c_ulonglong),
+        ("elapsed_ns",	c_ulonglong),
+        ("flags", 	c_uint),
+        ("unused", 	c_uint),
+    ]
+
+class RR_Iobatch(Structure):
+    _fields_ = [
+        ("cmds", 	c_ulonglong),
+        ("count", 	c_uint),
+        ("unused", 	c_uint),
+    ]
+
+class RR_Irqsrc(Structure):
+    _fields_ = [
+        ("status", 	c_uint),
+        ("ack", 	c_uint),
+        ("flags", 	c_uint),
+        ("unused", 	c_uint),
+    ]
+
+class RR_Irqevent(Structure):
+    _fields_ = [
+        ("time_ns", 	c_ulonglong),
+        ("seq", 	c_uint),
+        ("status", 	c_uint),
+        ("ack", 	c_uint),
+        ("unused", 	c_uint),
+    ]
+
+class RR_Ioevents(Structure):
+    _fields_ = [
+        ("events", 	c_ulonglong),
+        ("count", 	c_uint),
+        ("lost", 	c_uint),
+        ("flags", 	c_uint),
+        ("unused", 	c_uint),
+    ]
+
+class RR_Dmasize(Structure):
+    _fields_ = [
+        ("size", 	c_uint),
+        ("flags", 	c_uint),
+    ]
+
+class RR_Plist(Structure):
+    _fields_ = [
+        ("pages", 	c_ulonglong),
+        ("count", 	c_uint),
+        ("unused", 	c_uint),
+    ]
+
+# ioctl commands, encoded like <asm-generic/ioctl.h> does
+_IOC_NONE, _IOC_WRITE, _IOC_READ = 0, 1, 2
+
+def _IOC(dir, type, nr, size):
+    return (dir << 30) | (size << 16) | (ord(type) << 8) | nr
+
+def _IO(type, nr):
+    return _IOC(_IOC_NONE, type, nr, 0)
+
+def _IOR(type, nr, struct):
+    return _IOC(_IOC_READ, type, nr, sizeof(struct))
+
+def _IOW(type, nr, struct):
+    return _IOC(_IOC_WRITE, type, nr, sizeof(struct))
+
+def _IOWR(type, nr, struct):
+    return _IOC(_IOC_READ | _IOC_WRITE, type, nr, sizeof(struct))
+
+RR_IOC_MAGIC = '4'
+
+RR_DEVSEL	=  _IOW(RR_IOC_MAGIC, 0, RR_Devsel)
+RR_DEVGET	=  _IOR(RR_IOC_MAGIC, 1, RR_Devsel)
+RR_READ		= _IOWR(RR_IOC_MAGIC, 2, RR_Iocmd)
+RR_WRITE	=  _IOW(RR_IOC_MAGIC, 3, RR_Iocmd)
+RR_IRQWAIT	=   _IO(RR_IOC_MAGIC, 4)
+RR_IRQENA	=   _IO(RR_IOC_MAGIC, 5)
+RR_GETDMASIZE	=   _IO(RR_IOC_MAGIC, 6)
+RR_SETDMASIZE	=  _IOW(RR_IOC_MAGIC, 7, RR_Dmasize)
+RR_GETPLIST	=   _IO(RR_IOC_MAGIC, 8)
+RR_BATCH	=  _IOW(RR_IOC_MAGIC, 9, RR_Iobatch)
+RR_POLL		= _IOWR(RR_IOC_MAGIC, 10, RR_Iopoll)
+RR_IRQSRC	=  _IOW(RR_IOC_MAGIC, 11, RR_Irqsrc)
+RR_GETEVENTS	= _IOWR(RR_IOC_MAGIC, 12, RR_Ioevents)
+RR_GETPLIST64	=  _IOW(RR_IOC_MAGIC, 13, RR_Plist)
+
+def ioctl(fd, request, arg=0):
+    """run an ioctl command, return its value or -errno
+
+    arg is an integer or a mutable buffer, like a ctypes object or an
+    array.array, that the driver reads and/or writes
+    """
+    try:
+        return fcntl.ioctl(fd, request, arg)
+    except IOError as e:
+        return -e.errno
+
+# names of the RR_U fields, by data size
+datafield = { 1: 'data8', 2: 'data16', 4: 'data32', 8: 'data64' }
+
+class Batch(object):
+    """a queue of ioctl reads and writes, run by a single system call
+
+    Use it as a context manager, through Gennum.batch(): the accesses
+    queued in the block are submitted on exit, and the values read are
+    then available, in order, in the results list. The driver takes up
+    to RR_BATCH_MAX commands per call: longer batches take more calls,
+    and if one fails the commands of the previous ones have been run.
+    """
+
+    def __init__(self, gennum):
+        self.gennum = gennum
+        self.cmds = []
+        self.results = []
+
+    def iread(self, bar, offset, width):
+        """queue a read, see Gennum.iread"""
+        self.cmds.append((bar_map[bar] + offset, width, 0))
+
+    def iwrite(self, bar, offset, width, datum):
+        """queue a write, see Gennum.iwrite"""
+        self.cmds.append((bar_map[bar] + offset, width | RR_BATCH_WRITE, datum))
+
+    def submit(self):
+        """run the queued commands and return the list of values read"""
+        cmds = (RR_Iocmd * len(self.cmds))()
+        for cmd, (address, datasize, datum) in zip(cmds, self.cmds):
+            cmd.address = address
+            cmd.datasize = datasize
+            setattr(cmd, datafield[datasize & ~RR_BATCH_WRITE], datum)
+        self.cmds = []
+        for first in range(0, len(cmds), RR_BATCH_MAX):
+            n = min(len(cmds) - first, RR_BATCH_MAX)
+            err = self.gennum.transports['ioctl'].batch(
+                (RR_Iocmd * n).from_buffer(cmds, first * sizeof(RR_Iocmd)))
+            self.gennum.errno = err
+            if err < 0:
+                raise IOError(-err, os.strerror(-err))
+        self.results = [ getattr(cmd, datafield[cmd.datasize])
+                         for cmd in cmds
+                         if not cmd.datasize & RR_BATCH_WRITE ]
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.submit()
+
+# little-endian formats, with standard sizes, for simulated memory
+lefmt = { 1: '<B', 2: '<H', 4: '<I', 8: '<Q' }
+
+# formats for the data union of struct rr_iocmd, used in native order
+nefmt = { 1: 'B', 2: 'H', 4: 'I', 8: 'Q' }
+
+class Transport(object):
+    """base class for the backends used by Gennum to reach the device
+
+    A transport reads and writes single registers of a BAR area (or of
+    the DMA buffer); the widths it can access safely are listed in
+    'widths'. It also offers the other driver services (bulk transfers,
+    interrupts, DMA buffer, device selection); like the ioctl commands,
+    these return 0 or a positive value on success and -errno on failure.
+    """
+    name = None
+    widths = (1, 2, 4, 8)
+
+    def read(self, bar, offset, width):
+        """read a register, raise IOError on failure"""
+        raise NotImplementedError
+
+    def write(self, bar, offset, width, datum):
+        """write a register, raise IOError on failure"""
+        raise NotImplementedError
+
+    def reset(self):
+        """forget any state tied to the device bound so far"""
+        pass
+
+    def batch(self, cmds):
+        """run an array of RR_Iocmd, see Batch"""
+        for cmd in cmds:
+            address, datasize = cmd.address, cmd.datasize & ~RR_BATCH_WRITE
+            bar, offset = split_address(address)
+            try:
+                if cmd.datasize & RR_BATCH_WRITE:
+                    self.write(bar, offset, datasize,
+                               getattr(cmd, datafield[datasize]))
+                else:
+                    setattr(cmd, datafield[datasize],
+                            self.read(bar, offset, datasize))
+            except IOError as e:
+                return -e.errno
+        return 0
+
+    def poll(self, p):
+        """wait for a register, as described by an RR_Iopoll
+
+        This one polls from user space, spinning like the driver does
+        and then sleeping between reads, twice as long each time.
+        """
+        bar, offset = split_address(p.address)
+        sleep_ns = RR_POLL_SLEEP_MIN_NS
+        t0 = time.time()
+        while True:
+            try:
+                p.data64 = self.read(bar, offset, p.datasize)
+            except IOError as e:
+                return -e.errno
+            p.elapsed_ns = int((time.time() - t0) * 1e9)
+            if ((p.data64 & p.mask) == p.value) != bool(p.flags & RR_POLL_NE):
+                return 0
+            if p.elapsed_ns >= p.timeout_ns:
+                return -errno.ETIMEDOUT
+            if p.elapsed_ns >= RR_POLL_SPIN_NS:
+                sleep_ns = min(sleep_ns, p.timeout_ns - p.elapsed_ns)
+                time.sleep(sleep_ns * 1e-9)
+                sleep_ns = min(sleep_ns * 2, RR_POLL_SLEEP_MAX_NS)
+
+    def read_block(self, bar, offset, count, width, out):
+        """read count registers into the buffer out
+
+        This one runs a batch, so the registers are accessed one by one
+        with the right width, in a single system call where possible.
+        """
+        view = (ctype[width] * count).from_buffer(out)
+        for first in range(0, count, RR_BATCH_MAX):
+            n = min(count - first, RR_BATCH_MAX)
+            cmds = (RR_Iocmd * n)()
+            for i, cmd in enumerate(cmds):
+                cmd.address = bar_map[bar] + offset + (first + i) * width
+                cmd.datasize = width
+            err = self.batch(cmds)
+            if err < 0:
+                raise IOError(-err, os.strerror(-err))
+            field = datafield[width]
+            view[first:first + n] = [ getattr(cmd, field) for cmd in cmds ]
+
+    def write_block(self, bar, offset, data, count, width):
+        """write count registers from the buffer data, see read_block"""
+        view = (ctype[width] * count).from_buffer_copy(data)
+        for first in range(0, count, RR_BATCH_MAX):
+            n = min(count - first, RR_BATCH_MAX)
+            cmds = (RR_Iocmd * n)()
+            field = datafield[width]
+            for i, cmd in enumerate(cmds):
+                cmd.address = bar_map[bar] + offset + (first + i) * width
+                cmd.datasize = width | RR_BATCH_WRITE
+                setattr(cmd, field, view[first + i])
+            err = self.batch(cmds)
+            if err < 0:
+                raise IOError(-err, os.strerror(-err))
+
+    def read_buf(self, address, buf, size):
+        """read size bytes at address into buf, return the count"""
+        raise NotImplementedError
+
+    def write_buf(self, address, data, size):
+        """write size bytes of data at address, return the count"""
+        raise NotImplementedError
+
+    def irqwait(self):
+        raise NotImplementedError
+
+    def irqena(self):
+        raise NotImplementedError
+
+    def irqfd(self):
+        """return a file descriptor readable while an interrupt is
+        pending, or None if there is none (see irqpending)"""
+        return None
+
+    def irqpending(self):
+        """return whether an interrupt fired and was not re-enabled"""
+        raise NotImplementedError
+
+    def irqsrc(self, src):
+        """set how interrupts are acknowledged, from an RR_Irqsrc"""
+        raise NotImplementedError
+
+    def getevents(self, ioev):
+        """fill the RR_Irqevent array of an RR_Ioevents"""
+        raise NotImplementedError
+
+    def getdmasize(self):
+        raise NotImplementedError
+
+    def setdmasize(self, ds):
+        raise NotImplementedError
+
+    def dmabuf(self):
+        """return a writable buffer object aliasing the DMA buffer"""
+        raise NotImplementedError
+
+    def getplist(self, plist):
+        raise NotImplementedError
+
+    def devsel(self, ds):
+        raise NotImplementedError
+
+    def devget(self, ds):
+        raise NotImplementedError
+
+class DeviceTransport(Transport):
+    """base class for the transports that use /dev/rawrabbit
+
+    Register access is left to subclasses; the other services go
+    through ioctl and positional I/O on the shared file descriptor
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def batch(self, cmds):
+        b = RR_Iobatch(cmds=addressof(cmds), count=len(cmds))
+        return ioctl(self.fd, RR_BATCH, b)
+
+    def poll(self, p):
+        return ioctl(self.fd, RR_POLL, p)
+
+    def read_block(self, bar, offset, count, width, out):
+        # the driver copies long transfers as 32-bit words, but takes
+        # 8 bytes as a single 64-bit access: two registers are batched
+        if bar != 0xc and (width != 4 or count == 2):
+            return Transport.read_block(self, bar, offset, count, width, out)
+        size = count * width
+        if pread(self.fd, out, size, bar_map[bar] + offset) != size:
+            raise IOError(errno.EIO, 'short read', hex(offset))
+
+    def write_block(self, bar, offset, data, count, width):
+        if bar != 0xc and (width != 4 or count == 2):
+            return Transport.write_block(self, bar, offset, data, count, width)
+        size = count * width
+        if pwrite(self.fd, data, size, bar_map[bar] + offset) != size:
+            raise IOError(errno.EIO, 'short write', hex(offset))
+
+    def read_buf(self, address, buf, size):
+        return pread(self.fd, buf, size, address)
+
+    def write_buf(self, address, data, size):
+        return pwrite(self.fd, data, size, address)
+
+    def irqwait(self):
+        return ioctl(self.fd, RR_IRQWAIT)
+
+    def irqena(self):
+        return ioctl(self.fd, RR_IRQENA)
+
+    def irqfd(self):
+        return self.fd
+
+    def irqpending(self):
+        return bool(select.select([ self.fd ], [], [], 0)[0])
+
+    def irqsrc(self, src):
+        return ioctl(self.fd, RR_IRQSRC, src)
+
+    def getevents(self, ioev):
+        return ioctl(self.fd, RR_GETEVENTS, ioev)
+
+    def getdmasize(self):
+        return ioctl(self.fd, RR_GETDMASIZE)
+
+    def setdmasize(self, ds):
+        return min(ioctl(self.fd, RR_SETDMASIZE, ds), 0)
+
+    def getplist(self, plist):
+        pl = RR_Plist(pages=addressof(plist), count=len(plist))
+        err = ioctl(self.fd, RR_GETPLIST64, pl)
+        if err != -errno.ENOTTY:
+            return min(err, 0)
+        # an older driver: a page of 32-bit frame numbers, at most
+        buf = (c_uint * RR_PLIST_LEN)()
+        err = ioctl(self.fd, RR_GETPLIST, buf)
+        if err < 0:
+            return err
+        for i in range(min(len(plist), RR_PLIST_LEN)):
+            plist[i] = buf[i]
+        return 0
+
+    def devsel(self, ds):
+        return ioctl(self.fd, RR_DEVSEL, ds)
+
+    def devget(self, ds):
+        return ioctl(self.fd, RR_DEVGET, ds)
+
+class IoctlTransport(DeviceTransport):
+    """register access by means of the RR_READ and RR_WRITE ioctls
+
+    This is the only transport that can reach I/O port BAR areas.
+    A struct rr_iocmd is kept in a preallocated buffer, one per thread,
+    packed and unpacked with precompiled formats.
+    """
+    name = 'ioctl'
+
+    def __init__(self, fd):
+        DeviceTransport.__init__(self, fd)
+        self.local = threading.local()
+        self.head = struct.Struct('=II').pack_into
+        # the data union follows address and datasize
+        self.pack = dict([ (w, struct.Struct('=II' + f).pack_into)
+                           for w, f in nefmt.items() ])
+        self.unpack = dict([ (w, struct.Struct('=' + f).unpack_from)
+                             for w, f in nefmt.items() ])
+
+    def buffer(self):
+        """return the rr_iocmd buffer of the calling thread"""
+        try:
+            return self.local.buf
+        except AttributeError:
+            self.local.buf = array('B', [0]) * sizeof(RR_Iocmd)
+            return self.local.buf
+
+    def read(self, bar, offset, width):
+        buf = self.buffer()
+        self.head(buf, 0, bar_map[bar] + offset, width)
+        fcntl.ioctl(self.fd, RR_READ, buf)
+        return self.unpack[width](buf, 8)[0]
+
+    def write(self, bar, offset, width, datum):
+        buf = self.buffer()
+        self.pack[width](buf, 0, bar_map[bar] + offset, width, datum)
+        fcntl.ioctl(self.fd, RR_WRITE, buf)
+
+class PreadTransport(DeviceTransport):
+    """register access by means of pread and pwrite
+
+    The driver performs a sized access for 1, 2, 4 and 8 bytes, and
+    positional I/O costs a single system call with no lseek.
+    """
+    name = 'pread'
+
+    def read(self, bar, offset, width):
+        buf = ctype[width]()
+        if libc.pread64(self.fd, byref(buf), width,
+                        bar_map[bar] + offset) != width:
+            raise IOError(get_errno() or errno.EIO, 'pread failed', hex(offset))
+        return buf.value
+
+    def write(self, bar, offset, width, datum):
+        buf = ctype[width](datum)
+        if libc.pwrite64(self.fd, byref(buf), width,
+                         bar_map[bar] + offset) != width:
+            raise IOError(get_errno() or errno.EIO, 'pwrite failed', hex(offset))
+
+class MmapTransport(DeviceTransport):
+    """register access by means of a memory mapping of the BAR areas
+
+    Areas are mapped on first use, and a ctypes object overlaying each
+    register is cached, so an access is a single load or store.
+    64-bit registers are only accessed atomically on 64-bit hosts.
+    """
+    name = 'mmap'
+    if sizeof(c_void_p) == 8:
+        widths = (1, 2, 4, 8)
+    else:
+        widths = (1, 2, 4)
+
+    def __init__(self, fd):
+        DeviceTransport.__init__(self, fd)
+        self.reset()
+
+    def mmap(self, bar, size):
+        """map a BAR area (or the DMA buffer), size is rounded to pages"""
+        size = (size + mmap.PAGESIZE - 1) & ~(mmap.PAGESIZE - 1)
+        m = mmap.mmap(self.fd, size, mmap.MAP_SHARED,
+                      mmap.PROT_READ | mmap.PROT_WRITE, offset=bar_map[bar])
+        self.maps[bar] = m
+        return m
+
+    def mreg(self, bar, offset, width):
+        """return the ctypes object overlaying a register of the mapping"""
+        try:
+            return self.mregs[bar, offset, width]
+        except KeyError:
+            pass
+        if offset & (width - 1):
+            raise IOError(errno.EIO, 'unaligned access', hex(offset))
+        reg = ctype[width].from_buffer(self.mapping(bar, offset + width),
+                                       offset)
+        self.mregs[bar, offset, width] = reg
+        return reg
+
+    def mapping(self, bar, end):
+        """return a mapping of the BAR area reaching at least end"""
+        m = self.maps.get(bar)
+        if m is None or len(m) < end:
+            if bar == 0xc:
+                m = self.mmap(bar, self.getdmasize())
+            else:
+                m = self.mmap(bar, end)
+        return m
+
+    def dmabuf(self):
+        return self.mapping(0xc, self.getdmasize())
+
+    def read_block(self, bar, offset, count, width, out):
+        if offset & (width - 1):
+            raise IOError(errno.EIO, 'unaligned access', hex(offset))
+        size = count * width
+        m = self.mapping(bar, offset + size)
+        if bar == 0xc:      # memory: any access size will do
+            memmove((c_char * size).from_buffer(out),
+                    (c_char * size).from_buffer(m, offset), size)
+            return
+        # registers: element by element, so each is loaded once and
+        # with its width (memmove may use wider or repeated loads)
+        regs = (ctype[width] * count).from_buffer(m, offset)
+        (ctype[width] * count).from_buffer(out)[:] = regs[:]
+
+    def write_block(self, bar, offset, data, count, width):
+        if offset & (width - 1):
+            raise IOError(errno.EIO, 'unaligned access', hex(offset))
+        size = count * width
+        m = self.mapping(bar, offset + size)
+        if bar == 0xc:
+            memmove((c_char * size).from_buffer(m, offset),
+                    (c_char * size).from_buffer_copy(data), size)
+            return
+        regs = (ctype[width] * count).from_buffer(m, offset)
+        regs[:] = (ctype[width] * count).from_buffer_copy(data)[:]
+
+    def read(self, bar, offset, width):
+        return self.mreg(bar, offset, width).value
+
+    def write(self, bar, offset, width, datum):
+        self.mreg(bar, offset, width).value = datum
+
+    def reset(self):
+        self.maps = {}
+        self.mregs = {}
+
+class SimTransport(Transport):
+    """an in-process simulated device, made of plain memory
+
+    Each BAR area, like the DMA buffer, is a bytearray; subclasses
+    model real hardware by overriding read and write for their
+    registers. The fake page list is physically contiguous.
+
+    Interrupts are delivered like the rawrabbit driver does, from the
+    line returned by irqline: never asserted here, subclasses wire it
+    to their registers and call check_irq when it may change. Events
+    of the model run when due, on the wall clock, after schedule.
+    """
+    name = 'sim'
+    ids = (RR_DEFAULT_VENDOR, RR_DEFAULT_DEVICE,
+           RR_DEFAULT_VENDOR, RR_DEFAULT_DEVICE, 1, 0)
+    max_lag = 0.01              # seconds an event may run late, on time
+    clock = staticmethod(time.time)
+
+    def __init__(self, barsize=0x100000, dmasize=RR_DEFAULT_BUFSIZE):
+        self.mem = { 0: bytearray(barsize), 2: bytearray(barsize),
+                     4: bytearray(barsize), 0xc: bytearray(dmasize) }
+        self.pack = dict([ (w, struct.Struct(f).pack_into)
+                           for w, f in lefmt.items() ])
+        self.unpack = dict([ (w, struct.Struct(f).unpack_from)
+                             for w, f in lefmt.items() ])
+        self.pfn0 = 0x10000
+        self.events = []        # heap of (time, seq, callback)
+        self.seq = 0
+        self.when = None        # time of the event running, if any
+        self.lock = threading.RLock()   # events run from any thread
+        self.irqcount = 0
+        self.irqtime = 0
+        self.irqdisabled = False
+        self.irqsrcs = RR_Irqsrc()      # set by irqsrc()
+        self.ring = collections.deque(maxlen=RR_NEVENTS)
+        self.lost = 0
+
+    def read(self, bar, offset, width):
+        try:
+            return self.unpack[width](self.mem[bar], offset)[0]
+        except struct.error:
+            raise IOError(errno.ENOMEDIUM, 'out of range', hex(offset))
+
+    def write(self, bar, offset, width, datum):
+        try:
+            self.pack[width](self.mem[bar], offset, datum)
+        except struct.error:
+            raise IOError(errno.ENOMEDIUM, 'out of range', hex(offset))
+
+    def read_block(self, bar, offset, count, width, out):
+        if self.read_buf(bar_map[bar] + offset, out, count * width) \
+                != count * width:
+            raise IOError(errno.ENOMEDIUM, 'out of range', hex(offset))
+
+    def write_block(self, bar, offset, data, count, width):
+        if self.write_buf(bar_map[bar] + offset, data, count * width) \
+                != count * width:
+            raise IOError(errno.ENOMEDIUM, 'out of range', hex(offset))
+
+    def read_buf(self, address, buf, size):
+        bar, offset = split_address(address)
+        mem = self.mem[bar]
+        size = max(0, min(size, len(mem) - offset))
+        memmove((c_char * size).from_buffer(buf),
+                bytes(mem[offset:offset + size]), size)
+        return size
+
+    def write_buf(self, address, data, size):
+        bar, offset = split_address(address)
+        mem = self.mem[bar]
+        size = max(0, min(size, len(mem) - offset))
+        mem[offset:offset + size] = (c_char * size).from_buffer_copy(data).raw
+        return size
+
+    def getdmasize(self):
+        return len(self.mem[0xc])
+
+    def dmabuf(self):
+        return self.mem[0xc]
+
+    def setdmasize(self, ds):
+        size = (ds.size + 0xfff) & ~0xfff
+        if not size or ds.size > RR_MAX_BUFSIZE \
+                or ds.flags & ~RR_DMA_CONTIGUOUS:
+            return -errno.EINVAL
+        # like the driver, refuse while the old buffer is mapped: a
+        # bytearray can't be resized while views of it are exported
+        mem = self.mem[0xc]
+        try:
+            mem.append(0)
+            mem.pop()
+        except BufferError:
+            return -errno.EBUSY
+        self.mem[0xc] = bytearray(size)
+        return 0
+
+    def getplist(self, plist):
+        for i in range(min(len(plist), self.getdmasize() >> 12)):
+            plist[i] = self.pfn0 + i
+        return 0
+
+    # time goes by
+    def schedule(self, delay, callback):
+        with self.lock:
+            self.seq += 1
+            # from an event, its own time: late updates lose no time,
+            # unless the simulation can not keep up with the clock
+            now = self.clock()
+            if self.when is None:
+                when = now + delay
+            else:
+                when = max(self.when, now - self.max_lag) + delay
+            heapq.heappush(self.events, (when, self.seq, callback))
+
+    def update(self):
+        """run the events that are due, one thread at a time"""
+        with self.lock:
+            now = self.clock()
+            try:
+                while self.events and self.events[0][0] <= now:
+                    self.when, seq, callback = heapq.heappop(self.events)
+                    callback()
+            finally:
+                self.when = None
+
+    def sleep(self):
+        """wait for the next event and run it, return False if none"""
+        if not self.events:
+            return False
+        delay = self.events[0][0] - self.clock()
+        if delay > 0:
+            time.sleep(delay)
+        self.update()
+        return True
+
+    # the interrupt line and the handler of the driver
+    def irqline(self):
+        """return whether the interrupt line is asserted"""
+        return False
+
+    def check_irq(self):
+        """raise the interrupt, if enabled and the line is asserted"""
+        if not self.irqdisabled and self.irqline():
+            self.interrupt()
+
+    def interrupt(self):
+        """what the interrupt handler of the driver does"""
+        src, status, ack = self.irqsrcs, 0, 0
+        if src.flags & RR_IRQSRC_STATUS:
+            status = self.read(*split_address(src.status) + (4,))
+        if src.flags & RR_IRQSRC_ACK_READ:
+            ack = self.read(*split_address(src.ack) + (4,))
+        if src.flags & RR_IRQSRC_ACK_WRITE:
+            self.write(*split_address(src.ack) + (4, status))
+        self.irqcount += 1
+        self.irqtime = self.clock()
+        if len(self.ring) == self.ring.maxlen:
+            self.lost += 1
+        self.ring.append((int(self.irqtime * 1e9), self.irqcount,
+                          status, ack))
+        if not src.flags & RR_IRQSRC_ENABLE:
+            self.irqdisabled = True
+
+    # the interrupt services of the driver
+    def irqwait(self):
+        if self.irqdisabled:
+            return -errno.EAGAIN
+        count = self.irqcount
+        while count == self.irqcount:
+            if not self.sleep():
+                return -errno.EDEADLK # nothing could ever wake us up
+        return min(int((self.clock() - self.irqtime) * 1e9), 1000000000)
+
+    def irqpending(self):
+        self.update()
+        if self.irqsrcs.flags & RR_IRQSRC_ENABLE:
+            return bool(self.ring)
+        return self.irqdisabled
+
+    def irqsrc(self, src):
+        ack = src.flags & (RR_IRQSRC_ACK_READ | RR_IRQSRC_ACK_WRITE)
+        if src.flags & RR_IRQSRC_ENABLE and not ack:
+            return -errno.EINVAL
+        self.irqsrcs = RR_Irqsrc.from_buffer_copy(src)
+        if src.flags & RR_IRQSRC_ENABLE and self.irqdisabled:
+            self.irqdisabled = False
+            self.check_irq()
+        return 0
+
+    def getevents(self, ioev):
+        while ioev.flags & RR_EVENTS_WAIT and not self.ring:
+            if not self.sleep():
+                return -errno.EDEADLK
+        events = (RR_Irqevent * ioev.count).from_address(ioev.events)
+        ioev.lost, self.lost = self.lost, 0
+        n = 0
+        while n < ioev.count and self.ring:
+            (events[n].time_ns, events[n].seq, events[n].status,
+             events[n].ack) = self.ring.popleft()
+            n += 1
+        ioev.count = n
+        return 0
+
+    def nextevent(self):
+        """return the time to the next event, in seconds, or None"""
+        with self.lock:
+            if not self.events:
+                return None
+            return max(self.events[0][0] - self.clock(), 0)
+
+    def irqena(self):
+        if not self.irqdisabled:
+            return -errno.EAGAIN
+        delay = int((self.clock() - self.irqtime) * 1e9)
+        self.irqdisabled = False
+        self.check_irq()
+        return min(delay, 1000000000)
+
+    def devsel(self, ds):
+        if (ds.vendor, ds.device) != self.ids[:2]:
+            return -errno.ENODEV
+        return 0
+
+    def devget(self, ds):
+        (ds.vendor, ds.device, ds.subvendor, ds.subdevice,
+         ds.bus, ds.devfn) = self.ids
+        return 0
+
+class Histogram(object):
+    """a histogram of latencies in nanoseconds, in constant memory
+
+    Like HdrHistogram, values below 2**bits are counted exactly and
+    larger ones in buckets of 2**(bits-1) counters each per power of
+    two, so the relative error is below 2**(1-bits) (1.6% by default)
+    up to the largest value, and recording costs a few operations.
+    """
+
+    def __init__(self, bits=7, highest=1000000000):   # the driver cap
+        self.bits = bits
+        self.counts = array('L', [0]) * (self.index(highest) + 1)
+        self.highest = highest
+        self.reset()
+
+    def index(self, value):
+        """return the counter for value"""
+        shift = value.bit_length() - self.bits
+        if shift <= 0:
+            return value
+        return (shift << (self.bits - 1)) + (value >> shift)
+
+    def value(self, index):
+        """return the highest value counted by a counter"""
+        half = 1 << (self.bits - 1)
+        if index < 2 * half:
+            return index
+        shift = index // half - 1
+        return ((index % half + half + 1) << shift) - 1
+
+    def record(self, value):
+        """count a value, clamped to the highest one"""
+        value = min(max(int(value), 0), self.highest)
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.min = min(self.min, value)
+
+    def reset(self):
+        """forget all values"""
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = self.total = self.max = 0
+        self.min = self.highest
+
+    def snapshot(self):
+        """return a copy, not affected by later values or reset"""
+        h = Histogram.__new__(Histogram)
+        h.__dict__.update(self.__dict__)
+        h.counts = array('L', self.counts)
+        return h
+
+    def mean(self):
+        return self.count and float(self.total) / self.count
+
+    def percentile(self, p):
+        """return the value below which p percent of the values are"""
+        if not self.count:
+            return 0
+        rank = max(int(self.count * p / 100.0 + 0.5), 1)
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self.value(i), self.max)
+        return self.max
+
+    def summary(self):
+        """return count, min, mean, max and the usual percentiles"""
+        s = { 'count': self.count, 'min': self.count and self.min,
+              'mean': self.mean(), 'max': self.max }
+        for p in 50, 90, 99, 99.9:
+            s['p%s' % str(p).replace('.', '')] = self.percentile(p)
+        return s
+
+class DmaMap(object):
+    """the DMA buffer as extents of physically contiguous pages
+
+    Built once from the page list, so translating a buffer offset to
+    a bus address (or a region to the extents covering it) is a binary
+    search over the extents, with no system call.
+    """
+
+    def __init__(self, plist, size):
+        """merge the first size >> 12 pages of plist (a page list)"""
+        self.size = size
+        self.extents = []       # (bus address, length), in buffer order
+        self.offsets = []       # offset in the buffer of each extent
+        for i in range(size >> 12):
+            address = plist[i] << 12
+            if self.extents and sum(self.extents[-1]) == address:
+                self.extents[-1] = (self.extents[-1][0],
+                                    self.extents[-1][1] + 4096)
+            else:
+                self.extents.append((address, 4096))
+                self.offsets.append(i << 12)
+
+    def __len__(self):
+        return len(self.extents)
+
+    def find(self, offset):
+        """return the index of the extent holding a buffer offset"""
+        if not 0 <= offset < self.size:
+            raise ValueError('offset 0x%x outside of the DMA buffer' % offset)
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def phys(self, offset):
+        """return the bus address of a buffer offset"""
+        i = self.find(offset)
+        return self.extents[i][0] + offset - self.offsets[i]
+
+    def region(self, offset, length):
+        """return [(bus address, count)] covering a region of the buffer"""
+        if offset + length > self.size:
+            raise ValueError('region beyond the end of the DMA buffer')
+        out = []
+        i = length > 0 and self.find(offset)
+        while length > 0:
+            start = offset - self.offsets[i]
+            count = min(length, self.extents[i][1] - start)
+            out.append((self.extents[i][0] + start, count))
+            offset += count
+            length -= count
+            i += 1
+        return out
+
 class Gennum(object):
-    device = '/dev/rawrabbit'
-    rrlib = './rrlib.so'
+    """access to a Gennum device, through the fastest transport
 
-    def __init__(self):
-        """get a file descriptor for the Gennum device"""
-        self.lib = CDLL(Gennum.rrlib)
-        self.fd = os.open(Gennum.device, os.O_RDWR)
+    The register methods read and write are bound, at creation or by
+    select(), to the transport in use, so they cost no more than the
+    transport itself. The methods iread/iwrite and mread/mwrite force
+    the ioctl or mmap transport, as before.
+
+    Several threads can share a Gennum with no locking: transports
+    use positional I/O, per-thread ioctl buffers or mappings, never
+    the file offset. Only errno is shared, and a read-modify-write
+    (like a field accessor) is not atomic towards other threads.
+    """
+    device = os.environ.get('RR_DEVICE', '/dev/rawrabbit')
+    probe = (4, 0xa08)          # harmless register to time transports
+
+    def __init__(self, transport=None, width=4, device=None):
+        """get a file descriptor for the Gennum device
+
+        With no transport, the device (by default Gennum.device) is
+        opened and the fastest transport that can do width-sized
+        accesses is selected. A transport (like a SimTransport) passed
+        by the caller serves all methods instead. The device 'sim' is a
+        simulated card, see rrsim.py.
+        """
         self.errno = 0
-        if self.fd < 0:
-            self.errno = self.fd
+        self.nonvolatile = set()
+        self.cache = {}
+        self.generation = 0             # bumped by invalidate
+        self.irqlatency = Histogram()   # interrupt to irqena, in ns
+        self.irqwakeup = Histogram()    # interrupt to irqwait return
+        self.irqlost = 0                # events lost by irqevents
+        self.plist = None               # page list, once per bind
+        self.buffermap = None           # its DmaMap
+        self.device = device or Gennum.device
+        if transport is None and self.device == 'sim':
+            import rrsim
+            transport = rrsim.Gn4124Sim()
+        if transport is None:
+            self.fd = os.open(self.device, os.O_RDWR)
+            self.transports = {}
+            for cls in IoctlTransport, PreadTransport, MmapTransport:
+                self.transports[cls.name] = cls(self.fd)
+            transport = self.calibrate(width)
+        else:
+            self.transports = dict.fromkeys(('ioctl', 'pread', 'mmap'),
+                                            transport)
+        self.select(transport)
 
-    def iread(self, bar, offset, width):
-        """do a read by means of the ioctl interface
+    def select(self, transport):
+        """use transport (or the transport with this name) for read/write"""
+        if isinstance(transport, str):
+            transport = self.transports[transport]
+        self.transport = transport
+        if self.nonvolatile:
+            self.read, self.write = self.cached(transport)
+        else:
+            self.read = transport.read
+            self.write = transport.write
+
+    def cached(self, transport):
+        """return read/write functions going through the shadow cache"""
+        read, write = transport.read, transport.write
+        nonvolatile, cache = self.nonvolatile, self.cache
+        def cached_read(bar, offset, width):
+            key = bar, offset, width
+            if key in cache:
+                return cache[key]
+            datum = read(bar, offset, width)
+            if key[:2] in nonvolatile:
+                cache[key] = datum
+            return datum
+        def cached_write(bar, offset, width, datum):
+            write(bar, offset, width, datum)
+            if (bar, offset) in nonvolatile:
+                cache[bar, offset, width] = datum
+        return cached_read, cached_write
+
+    def shadow(self, bar, offset):
+        """mark a register as non-volatile, and cache it from now on
+
+        Reads of the register are served by a shadow copy, read once or
+        updated by each write, so a read-modify-write costs a single bus
+        write. The hardware must never change it, and it must only be
+        written through write() (not iwrite/mwrite or a batch), with a
+        single width. Register accessors bind read/write when created:
+        create them after this call.
+        """
+        self.nonvolatile.add((bar, offset))
+        self.select(self.transport)
+
+    def invalidate(self, bar=None, offset=None):
+        """drop the shadow copies of a register, a BAR, or all of them
+
+        The values written that other objects remember, like those of
+        a DmaController, are dropped too: they check generation.
+        """
+        self.generation += 1
+        for key in list(self.cache):
+            if bar in (None, key[0]) and offset in (None, key[1]):
+                del self.cache[key]
+
+    def calibrate(self, width=4, count=1000):
+        """return the fastest transport that can do width-sized accesses
+
+        Each transport reads the probe register count times; those that
+        fail are discarded. If all of them fail (e.g. the device is not
+        bound), the ioctl transport is returned.
+        """
+        bar, offset = self.probe
+        best, fastest = self.transports['ioctl'], None
+        for t in self.transports.values():
+            if width not in t.widths:
+                continue
+            try:
+                t0 = time.time()
+                for i in range(count):
+                    t.read(bar, offset, width)
+                elapsed = time.time() - t0
+            except (EnvironmentError, ValueError):
+                continue
+            if fastest is None or elapsed < fastest:
+                best, fastest = t, elapsed
+        return best
+
+    def read(self, bar, offset, width):
+        """do a read by means of the selected transport
 
             bar = 0, 2, 4 (or c for DMA buffer access
             offset = address within bar
             width = data size (1, 2, 4 or 8 bytes)
         """
-        address = bar_map[bar] + offset
-        ds = RR_Iocmd(address=address, datasize=width)
-        self.errno = self.lib.rr_iread(self.fd, byref(ds))
-        return ds.data32
+        return self.transport.read(bar, offset, width)
 
-    def read(self, bar, offset, width):
-        """do a read by means of lseek+read
+    def write(self, bar, offset, width, datum):
+        """do a write by means of the selected transport
+
+            bar = 0, 2, 4 (or c for DMA buffer access
+            offset = address within bar
+            width = data size (1, 2, 4 or 8 bytes)
+            datum = value to be written
+        """
+        self.transport.write(bar, offset, width, datum)
+
+    def iread(self, bar, offset, width):
+        """do a read by means of the ioctl interface
 
             bar = 0, 2, 4 (or c for DMA buffer access
             offset = address within bar
             width = data size (1, 2, 4 or 8 bytes)
         """
-        address = bar_map[bar] + offset
-        self.errno = os.lseek(self.fd, address, os.SEEK_SET)
-        buf = os.read(self.fd, width)
-        return struct.unpack(fmt[width], buf)[0]
+        return self.transports['ioctl'].read(bar, offset, width)
 
     def iwrite(self, bar, offset, width, datum):
         """do a write by means of the ioctl interface
@@ -101,44 +1190,308 @@ class Gennum(object):
             width = data size (1, 2, 4 or 8 bytes)
             datum = value to be written
         """
-        address = bar_map[bar] + offset
-        ds = RR_Iocmd(address=address, datasize=width, data32=datum)
-        self.errno = self.lib.rr_iwrite(self.fd, byref(ds))
-        return ds.data32
+        self.transports['ioctl'].write(bar, offset, width, datum)
 
-    def write(self, bar, offset, width, datum):
-        """do a write by means of lseek+write
+    def wait_for(self, bar, offset, mask, value, timeout_ns=1000000000,
+                 width=4, equal=True):
+        """wait in the driver for a register to reach a value
+
+            bar = 0, 2, 4 (or c for DMA buffer access
+            offset = address within bar
+            mask, value = wait until (datum & mask) == value, or until
+                          it differs if equal is False
+            timeout_ns = give up after this time
+
+        Return the last value read and the time waited, in nanoseconds.
+        On timeout errno is set to -ETIMEDOUT (0 otherwise), and the
+        value returned does not match.
+        """
+        p = RR_Iopoll(address=bar_map[bar] + offset, datasize=width,
+                      mask=mask, value=value, timeout_ns=int(timeout_ns))
+        if not equal:
+            p.flags = RR_POLL_NE
+        err = self.transports['ioctl'].poll(p)
+        if err < 0 and err != -errno.ETIMEDOUT:
+            raise IOError(-err, os.strerror(-err))
+        self.errno = err
+        return p.data64, p.elapsed_ns
+
+    def batch(self):
+        """return a Batch, to run many iread/iwrite in one system call
+
+            with gennum.batch() as b:
+                b.iwrite(4, 0xa08, 4, 0xf000)
+                b.iread(4, 0xa08, 4)
+            print b.results
+        """
+        return Batch(self)
+
+    def mmap(self, bar, size):
+        """map a BAR area (or the DMA buffer) in our address space
+
+            bar = 0, 2, 4 (or c for DMA buffer access
+            size = length of the mapping, rounded up to whole pages
+        """
+        return self.transports['mmap'].mmap(bar, size)
+
+    def mread(self, bar, offset, width):
+        """do a read by means of a memory mapping of the BAR area
+
+            bar = 0, 2, 4 (or c for DMA buffer access
+            offset = address within bar
+            width = data size (1, 2, 4 or 8 bytes)
+        """
+        return self.transports['mmap'].read(bar, offset, width)
+
+    def mwrite(self, bar, offset, width, datum):
+        """do a write by means of a memory mapping of the BAR area
 
             bar = 0, 2, 4 (or c for DMA buffer access
             offset = address within bar
             width = data size (1, 2, 4 or 8 bytes)
             datum = value to be written
         """
-        address = bar_map[bar] + offset
-        self.errno = os.lseek(self.fd, address, os.SEEK_SET)
-        return os.write(self.fd, struct.pack(fmt[width], datum))
+        self.transports['mmap'].write(bar, offset, width, datum)
+
+    def read_block(self, bar, offset, count, width=4, out=None):
+        """read count contiguous registers at once
+
+            bar = 0, 2, 4 (or c for DMA buffer access
+            offset = address of the first register within bar
+            width = register size (1, 2, 4 or 8 bytes)
+            out = writable buffer to fill, like an array.array or a
+                  numpy array (default: a new array.array)
+
+        Each register is read with the given width, by the selected
+        transport; out is returned.
+        """
+        if out is None:
+            out = array(arraycode[width], [0]) * count
+        if nbytes(out) < count * width:
+            raise ValueError('buffer too small')
+        self.transport.read_block(bar, offset, count, width, out)
+        return out
+
+    def write_block(self, bar, offset, data, width=4):
+        """write contiguous registers at once, from the values in data
+
+            bar = 0, 2, 4 (or c for DMA buffer access
+            offset = address of the first register within bar
+            data = any buffer object, like an array.array or a numpy
+                   array, with width-sized items
+            width = register size (1, 2, 4 or 8 bytes)
+        """
+        self.transport.write_block(bar, offset, data, nbytes(data) // width,
+                                   width)
+
+    def read_dmabuf(self, offset, length=None, buf=None):
+        """read a region of the DMA buffer with a single system call
+
+            offset = address within the DMA buffer
+            length = number of bytes (default: the size of buf)
+            buf = writable buffer to fill, like a bytearray, an
+                  array.array or a numpy array (default: a new bytearray)
+
+        Data is copied by the driver straight into buf, which is returned
+        """
+        if buf is None:
+            buf = bytearray(length)
+        elif length is None:
+            length = nbytes(buf)
+        count = self.transport.read_buf(RR_BAR_BUF + offset, buf, length)
+        if count < length and type(buf) is bytearray:
+            del buf[count:]
+        return buf
+
+    def write_dmabuf(self, offset, data):
+        """write a region of the DMA buffer with a single system call
+
+            offset = address within the DMA buffer
+            data = any buffer object, like bytes, bytearray, array.array
+        """
+        return self.transport.write_buf(RR_BAR_BUF + offset, data,
+                                        nbytes(data))
 
     def irqwait(self):
-        """wait for an interrupt"""
-        return self.lib.rr_irqwait(self.fd);
+        """wait for an interrupt
+
+        Return the nanoseconds from the interrupt to the wakeup, also
+        counted in the irqwakeup histogram, or -errno.
+        """
+        ret = self.transport.irqwait()
+        if ret >= 0:
+            self.irqwakeup.record(ret)
+        return ret
 
     def irqena(self):
-        """enable the interrupt line"""
-        return self.lib.rr_irqena(self.fd);
+        """enable the interrupt line
+
+        Return the nanoseconds since the interrupt, also counted in the
+        irqlatency histogram, or -errno.
+        """
+        ret = self.transport.irqena()
+        if ret >= 0:
+            self.irqlatency.record(ret)
+        return ret
+
+    def irqsrc(self, status=None, ack=None, write=False, enable=True):
+        """have the driver identify and acknowledge the interrupts
+
+            status = (bar, offset) of a 32-bit register, read by the
+                     interrupt handler and recorded as the source
+            ack = (bar, offset) of the register that acknowledges the
+                  interrupt: it is read (read to clear) or, if write
+                  is True, the status is written to it
+            enable = if ack is given, keep the line always enabled,
+                     so that no event is lost and irqena is not needed
+
+        With no arguments the default is restored: the handler just
+        disables the line.
+        """
+        src = RR_Irqsrc()
+        if status is not None:
+            src.status = bar_map[status[0]] + status[1]
+            src.flags |= RR_IRQSRC_STATUS
+        if ack is not None:
+            src.ack = bar_map[ack[0]] + ack[1]
+            src.flags |= write and RR_IRQSRC_ACK_WRITE or RR_IRQSRC_ACK_READ
+            if enable:
+                src.flags |= RR_IRQSRC_ENABLE
+        self.errno = self.transport.irqsrc(src)
+        if self.errno < 0:
+            raise IOError(-self.errno, os.strerror(-self.errno))
+
+    def irqevents(self, batch=64, wait=True):
+        """yield the interrupts recorded by the driver, oldest first
+
+        Each event is a tuple (time_ns, seq, status, ack), see irqsrc;
+        seq is the interrupt count, so a gap means events were lost
+        (they are also added to irqlost). Up to batch events are read
+        with each system call. If wait is False, the generator ends
+        when no event is left; otherwise it waits for more.
+        """
+        events = (RR_Irqevent * min(batch, RR_NEVENTS))()
+        ioev = RR_Ioevents(events=addressof(events))
+        while True:
+            ioev.count = len(events)
+            ioev.flags = wait and RR_EVENTS_WAIT or 0
+            err = self.transport.getevents(ioev)
+            if err < 0:
+                raise IOError(-err, os.strerror(-err))
+            self.irqlost += ioev.lost
+            if not ioev.count and not wait:
+                return
+            for ev in events[:ioev.count]:
+                yield ev.time_ns, ev.seq, ev.status, ev.ack
+
+    def irqstats(self, reset=False):
+        """return the summaries of the irqlatency and irqwakeup
+        histograms (see Histogram.summary), then reset them if asked"""
+        stats = { 'latency': self.irqlatency.summary(),
+                  'wakeup': self.irqwakeup.summary() }
+        if reset:
+            self.irqlatency.reset()
+            self.irqwakeup.reset()
+        return stats
+
+    def irqpending(self):
+        """return whether an interrupt is waiting for irqena"""
+        return self.transport.irqpending()
+
+    def fileno(self):
+        """return the device file descriptor, readable while an
+        interrupt is pending, for select, poll or an event loop"""
+        fd = self.transport.irqfd()
+        if fd is None:
+            raise IOError(errno.ENOTTY, 'no file descriptor')
+        return fd
 
     def getdmasize(self):
         """return the size of the allocated DMA buffer (in bytes)"""
-        return self.lib.rr_getdmasize(self.fd);
+        return self.transport.getdmasize()
 
     def getplist(self):
         """get a list of pages for DMA access
 
-        The addresses returned, shifted by 12 bits, give the physical
-        addresses of the allocated pages
+        The addresses returned (64 bits, one per page of the buffer),
+        shifted by 12 bits, give the physical addresses of the allocated
+        pages. The list is read once after each bind, and shared: do not
+        modify it.
+        """
+        if self.plist is None:
+            size = self.getdmasize()
+            if size < 0:
+                raise IOError(-size, os.strerror(-size))
+            plist = (c_ulonglong * (size >> 12))()
+            err = self.transport.getplist(plist)
+            if err < 0:
+                raise IOError(-err, os.strerror(-err))
+            self.plist = plist
+        return self.plist
+
+    def setdmasize(self, size, contiguous=False):
+        """replace the DMA buffer with a new one, of size bytes
+
+        A contiguous buffer is a single extent, so a transfer over it
+        needs no chain, but the kernel can only allocate a few megabytes
+        of physically contiguous memory. The size is rounded up to pages
+        and the content is lost. The buffer can't be replaced while
+        mapped: the mappings of the transports are dropped here, and
+        IOError is raised with EBUSY if others are left.
         """
-        plist = Plist()
-        self.lib.rr_getplist(self.fd, plist);
-        return plist
+        for t in self.transports.values():
+            t.reset()
+        ds = RR_Dmasize(size=size)
+        if contiguous:
+            ds.flags = RR_DMA_CONTIGUOUS
+        err = self.transport.setdmasize(ds)
+        self.plist = self.buffermap = None
+        if err < 0:
+            raise IOError(-err, os.strerror(-err))
+
+    def dmabuf_array(self, dtype='B', offset=0, count=None):
+        """return an array aliasing the DMA buffer, for zero-copy access
+
+            dtype = item type: a numpy dtype, or a struct format
+            offset = byte offset in the buffer
+            count = number of items (default: up to the end)
+
+        The array is a numpy.ndarray if numpy is there, a memoryview
+        cast to dtype otherwise (or, in python 2, a ctypes array of a
+        native integer or floating point format). It maps the buffer
+        (see MmapTransport), so data moved by the device shows up in
+        it, and while it exists the buffer can't be resized. The CPU
+        may see stale cache lines: see the bugs section of the manual.
+        """
+        buf = self.transports['mmap'].dmabuf()
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        if numpy is not None:
+            dtype = numpy.dtype(dtype)
+            size = dtype.itemsize
+        else:
+            size = struct.calcsize(dtype)
+        if count is None:
+            count = (len(buf) - offset) // size
+        if offset < 0 or count < 0 or offset + count * size > len(buf):
+            raise ValueError('region beyond the end of the DMA buffer')
+        if numpy is not None:
+            return numpy.frombuffer(buf, dtype, count, offset)
+        try:
+            return memoryview(buf)[offset:offset + count * size].cast(dtype)
+        except (TypeError, AttributeError):     # python 2
+            t = fmtctype.get(dtype.lstrip('@'))
+            if t is None:
+                raise ValueError('unsupported format %r' % dtype)
+            return (t * count).from_buffer(buf, offset)
+
+    def dmamap(self):
+        """return the DmaMap of the DMA buffer, built once per bind"""
+        if self.buffermap is None:
+            self.buffermap = DmaMap(self.getplist(), self.getdmasize())
+        return self.buffermap
 
     def info(self):
         """get a string describing the interface the driver is bound to
@@ -147,7 +1500,7 @@ class Gennum(object):
             vendor:device/dubvendor:subdevice@bus:devfn
         """
         ds = RR_Devsel()
-        self.errno = self.lib.rr_devget(self.fd, byref(ds))
+        self.errno = self.transport.devget(ds)
         for key in RR_Devsel._fields_:
             setattr(self, key[0], getattr(ds, key[0], RR_DEVSEL_UNUSED))
         return '%04x:%04x/%04x:%04x@%04x:%04x' % (
@@ -183,15 +1536,78 @@ class Gennum(object):
         """
         d = self.parse_addr(device)
         ds = RR_Devsel(**d)
-        self.errno = self.lib.rr_devsel(self.fd, byref(ds))
+        self.errno = self.transport.devsel(ds)
+        for t in self.transports.values():
+            t.reset()
+        self.invalidate()
+        self.plist = self.buffermap = None
         return self.errno
 
+class CardPool(object):
+    """all the cards driven by rawrabbit, with a Gennum object each
+
+    Every card has its own device node (/dev/rawrabbitN), DMA buffer
+    and interrupt, so map() runs an operation on all of them at once,
+    one thread per card. With RR_DEVICE set to 'sim', a number of
+    simulated cards (RR_CARDS, default 2) is used instead.
+    """
+    pattern = '/dev/rawrabbit[0-9]*'
+
+    def __init__(self, devices=None, width=4):
+        """open devices (by default all the /dev/rawrabbitN nodes)"""
+        if devices is None:
+            devices = self.enumerate()
+        self.cards = [ Gennum(width=width, device=d) for d in devices ]
+        self.pool = None
+
+    def enumerate(self):
+        """return the device nodes of the cards, in probe order"""
+        if Gennum.device == 'sim':
+            return [ 'sim' ] * int(os.environ.get('RR_CARDS', '2'))
+        nodes = glob.glob(self.pattern)
+        nodes.sort(key=lambda n: int(re.sub(r'\D', '', n)))
+        return nodes
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __getitem__(self, i):
+        return self.cards[i]
+
+    def map(self, func, *args):
+        """call func(card, *args) for every card, in parallel
+
+        Return the list of results, in card order; the first exception
+        raised by func is raised again here.
+        """
+        if self.pool is None:
+            self.pool = ThreadPool(max(len(self.cards), 1))
+        return self.pool.map(lambda card: func(card, *args), self.cards)
+
+    def info(self):
+        """return the info() string of every card"""
+        return [ card.info() for card in self.cards ]
+
+    def close(self):
+        """stop the threads and close the cards"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        for card in self.cards:
+            if hasattr(card, 'fd'):
+                os.close(card.fd)
+        self.cards = []
+
 if __name__ == '__main__':
     g = Gennum()
-    print g.parse_addr('1a39:0004/1a39:0004@0020:0000')
-    print g.bind('1a39:0004/1a39:0004@0020:0000')
-    print '%x' % g.write(bar=RR_BAR_4, offset=0xa08, width=4, datum=0xdeadface)
-    print '%x' % g.read(bar=RR_BAR_4, offset=0xa08, width=4)
-    print g.getdmasize()
+    print(g.parse_addr('1a39:0004/1a39:0004@0020:0000'))
+    print(g.bind('1a39:0004/1a39:0004@0020:0000'))
+    g.write(bar=4, offset=0xa08, width=4, datum=0xdeadface)
+    print('%x' % g.read(bar=4, offset=0xa08, width=4))
+    print(g.getdmasize())
     for page in g.getplist():
-        print '%08x ' % (page<<12),
+        sys.stdout.write('%08x ' % (page<<12))
@@ -0,0 +1,77 @@
+#!  /usr/bin/env python3
+#   :vi:ts=4 sw=4 et
+
+# Interrupts of rawrabbit cards in an asyncio event loop (python 3.5+).
+#
+# The driver reports a pending interrupt (fired, not yet re-enabled
+# by RR_IRQENA) as readable data on the file, so a single thread can
+# wait for many cards with no blocking RR_IRQWAIT:
+#
+#   await rr_async.wait_irq(card)
+#   ... acknowledge the interrupt in the card ...
+#   card.irqena()
+#
+# Simulated cards (rrsim.py) have no file descriptor: simulated time
+# is let run with asyncio.sleep instead.
+
+import asyncio, errno
+import rr
+
+async def wait_irq(card):
+    """wait until an interrupt of card (a Gennum) is pending
+
+    Return at once if it is already pending. Only one coroutine at a
+    time may wait for a given card.
+    """
+    t = card.transport
+    fd = t.irqfd()
+    if fd is None:
+        while not t.irqpending():
+            delay = t.nextevent()
+            if delay is None:   # nothing could ever wake us up
+                raise IOError(errno.EDEADLK, 'no interrupt can happen')
+            await asyncio.sleep(delay)
+        return
+    loop = asyncio.get_event_loop()
+    ready = loop.create_future()
+    def wakeup():
+        if not ready.done():
+            ready.set_result(None)
+    loop.add_reader(fd, wakeup)
+    try:
+        await ready
+    finally:
+        loop.remove_reader(fd)
+
+if __name__ == '__main__':
+    # a DMA transfer on every card at once, waiting for the interrupts
+    # from a single thread; RR_DEVICE=sim RR_CARDS=4 runs it anywhere
+    import time
+    from gn4124_regs import Gn4124Regs
+    from dma_controller_regs import DmaControllerRegs
+
+    async def transfer(i, card):
+        host = card.getplist()[1] << 12
+        with card.batch() as b:
+            b.iwrite(4, Gn4124Regs.GPIO_INT_MASK_CLR, 4, 0x100)
+            b.iwrite(4, Gn4124Regs.INT_CFG0, 4, 0x8000)
+            b.iwrite(0, DmaControllerRegs.CSTART, 4, 0)
+            b.iwrite(0, DmaControllerRegs.HSTARTL, 4, host)
+            b.iwrite(0, DmaControllerRegs.LEN, 4, 0x1000)
+            b.iwrite(0, DmaControllerRegs.ATTRIB, 4, 0)
+        card.irqena()
+        t0 = time.time()
+        card.iwrite(0, DmaControllerRegs.CTRL, 4, 1)
+        await wait_irq(card)
+        t1 = time.time()
+        card.iread(4, Gn4124Regs.GPIO_INT_STATUS, 4)    # read to clear
+        status = card.iread(0, DmaControllerRegs.STAT, 4)
+        card.irqena()
+        print('card %i: status %i after %.1f us' % (i, status,
+                                                     (t1 - t0) * 1e6))
+
+    pool = rr.CardPool()
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(asyncio.gather(*[ transfer(i, card)
+                                              for i, card in enumerate(pool) ]))
+    pool.close()
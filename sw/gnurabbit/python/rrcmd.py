@@ -51,6 +51,18 @@ class RrCmd(cmd.Cmd):
     def do_getdmasize(self, args):
         print hex(self.gennum.getdmasize())
 
+    def do_setdmasize(self, args):
+        try:
+            args = args.split()
+            size = int(args[0], 16)
+            contiguous = args[1:] == ['contig']
+            if len(args) > 2 or args[1:] and not contiguous:
+                raise ValueError
+        except (ValueError, IndexError):
+            print "syntax: setdmasize size [contig]"
+            return
+        self.gennum.setdmasize(size, contiguous)
+
     def do_getplist(self, args):
         plist = self.gennum.getplist()
         width = 8
@@ -33,36 +33,59 @@ int rr_iwrite(int fd, struct rr_iocmd *iocmd)
 	return 0;
 }
 
-int rr_irqwait(int fd)
+int rr_batch(int fd, struct rr_iocmd *cmds, int count)
 {
-	if (ioctl(fd, RR_IRQWAIT) < 0)
+	struct rr_iobatch batch = {
+		.cmds = (uintptr_t)cmds,
+		.count = count,
+	};
+
+	if (ioctl(fd, RR_BATCH, &batch) < 0)
 		return -errno;
 	return 0;
 }
 
-int rr_irqena(int fd)
+int rr_poll(int fd, struct rr_iopoll *poll)
 {
-	if (ioctl(fd, RR_IRQENA) < 0)
+	if (ioctl(fd, RR_POLL, poll) < 0)
 		return -errno;
 	return 0;
 }
 
+int rr_irqwait(int fd)
+{
+	int ret = ioctl(fd, RR_IRQWAIT);
+
+	if (ret < 0)
+		return -errno;
+	return ret; /* nanoseconds since the interrupt */
+}
+
+int rr_irqena(int fd)
+{
+	int ret = ioctl(fd, RR_IRQENA);
+
+	if (ret < 0)
+		return -errno;
+	return ret; /* nanoseconds since the interrupt */
+}
+
 int rr_getdmasize(int fd)
 {
 	return ioctl(fd, RR_GETDMASIZE);
 }
 
-int rr_getplist(int fd, uintptr_t *plist)
+int rr_getplist(int fd, uint64_t *plist, int count)
 {
-	int i, size;
+	struct rr_plist pl = {
+		.pages = (uintptr_t)plist,
+		.count = count,
+	};
+	int ret = ioctl(fd, RR_GETPLIST64, &pl);
 
-	size = ioctl(fd, RR_GETDMASIZE);
-	if (size < 0)
+	if (ret < 0)
 		return -errno;
-	i = ioctl(fd, RR_GETPLIST, plist);
-	if (i < 0)
-		return -errno;
-	return 0;
+	return ret; /* pages in the buffer, maybe more than count */
 }
 
 int main(int argc, char *argv[])
@@ -1,9 +1,14 @@
 
+#include <stdint.h>
 #include <rawrabbit.h>
 
 int rr_devsel(int fd, struct rr_devsel *ds);
 int rr_devget(int fd, struct rr_devsel *ds);
 int rr_read(int fd, struct rr_iocmd *iocmd);
 int rr_write(int fd, struct rr_iocmd *iocmd);
+int rr_batch(int fd, struct rr_iocmd *cmds, int count);
+int rr_poll(int fd, struct rr_iopoll *poll);
 int rr_irqwait(int fd);
 int rr_irqena(int fd);
+int rr_getdmasize(int fd);
+int rr_getplist(int fd, uint64_t *plist, int count);
@@ -0,0 +1,373 @@
+#!  /usr/bin/env python
+#   :vi:ts=4 sw=4 et
+
+# A behavioral model of a GN4124 card running the gn4124 core, that can
+# stand in for /dev/rawrabbit: rr.Gennum(rrsim.Gn4124Sim()), or set
+# RR_DEVICE=sim in the environment to run unmodified scripts.
+
+import errno, random, struct, time
+import rr
+
+# GN4124 registers in BAR4
+LB_CTL              = 0x804
+CLK_CSR             = 0x808
+INT_CTRL            = 0x810
+INT_STAT            = 0x814
+INT_CFG0            = 0x820     # INT_CFG0..7, one per interrupt line
+TWI_CTRL            = 0x900
+TWI_STATUS          = 0x904
+TWI_ADDRESS         = 0x908
+TWI_DATA            = 0x90c
+TWI_IRT_STATUS      = 0x910
+TWI_TR_SIZE         = 0x914
+GPIO_DIRECTION_MODE = 0xa04
+GPIO_OUTPUT_ENABLE  = 0xa08
+GPIO_OUTPUT_VALUE   = 0xa0c
+GPIO_INPUT_VALUE    = 0xa10
+GPIO_INT_MASK       = 0xa14
+GPIO_INT_MASK_CLR   = 0xa18
+GPIO_INT_MASK_SET   = 0xa1c
+GPIO_INT_STATUS     = 0xa20
+GPIO_INT_TYPE       = 0xa24
+GPIO_INT_VALUE      = 0xa28
+
+# bits of INT_STAT, TWI_CTRL, TWI_STATUS and TWI_IRT_STATUS
+INT_STAT_GPIO       = 1 << 15
+TWI_CTRL_RW         = 1 << 0
+TWI_CTRL_CLR_FIFO   = 1 << 6
+TWI_STATUS_BUSY     = 1 << 8
+TWI_IRT_COMP        = 1 << 0
+TWI_IRT_NACK        = 1 << 2
+
+# DMA controller registers in BAR0, from dma_controller_wb_slave.wb
+DMACTRLR            = 0x00
+DMASTATR            = 0x04
+DMACSTARTR          = 0x08
+DMAHSTARTLR         = 0x0c
+DMAHSTARTHR         = 0x10
+DMALENR             = 0x14
+DMANEXTLR           = 0x18
+DMANEXTHR           = 0x1c
+DMAATTRIBR          = 0x20
+
+# DMA status codes, from dma_controller.vhd
+DMA_IDLE, DMA_DONE, DMA_BUSY, DMA_ERROR, DMA_ABORT = range(5)
+
+# a chain item in host memory, as fetched by the DMA controller
+chain_item = struct.Struct('<7I')
+
+class Gn4124Sim(rr.SimTransport):
+    """behavioral model of a GN4124 card running the gn4124 core
+
+    Modeled are the BAR4 registers for GPIO, interrupts, local bus and
+    TWI (with an EEPROM on the I2C bus), the BAR0 DMA controller with
+    chained transfers to and from a carrier memory, and the DMA buffer
+    of the driver, with a scattered page list like vmalloc returns.
+
+    DMA transfers and I2C transfers complete after a time computed from
+    the rates below, measured on the wall clock. The DMA controller
+    interrupt is wired to GPIO 8, like in the spec_gn4124_test design,
+    and interrupts are delivered like the rawrabbit driver does.
+    """
+    l2p_rate = 400e6            # bytes per second, carrier to host
+    p2l_rate = 200e6            # bytes per second, host to carrier
+    dma_setup = 2e-6            # seconds to start a transfer or fetch an item
+    max_contiguous = 4 << 20    # bytes, MAX_ORDER pages on x86
+    twi_byte_time = 90e-6       # seconds per I2C byte, at 100kHz
+    dma_irq_gpio = 8
+    eeprom_addr = 0x56
+
+    def __init__(self, dmasize=rr.RR_DEFAULT_BUFSIZE, carriersize=0x100000,
+                 seed=0):
+        rr.SimTransport.__init__(self, 0x100000, dmasize)
+        self.carrier = bytearray(carriersize)
+        self.eeprom = bytearray(b'\xff' * 256)
+
+        self.rnd = random.Random(seed)
+        self.alloc_pages(dmasize >> 12)
+
+        self.dma_status = DMA_IDLE
+        self.dma_token = 0      # bumped to cancel the transfer in progress
+        self.gpio_mask = 0xffff
+        self.gpio_status = 0
+        self.twi_fifo = []
+        self.twi_ptr = 0
+        self.twi_irt = 0
+        self.twi_busy = 0       # end time of the current I2C transfer
+
+        self.rhooks = {
+            (0, DMASTATR):          lambda: self.dma_status,
+            (4, INT_STAT):          self.int_stat,
+            (4, GPIO_INT_MASK):     lambda: self.gpio_mask,
+            (4, GPIO_INT_STATUS):   self.gpio_int_status,
+            (4, TWI_STATUS):        self.twi_status,
+            (4, TWI_DATA):          self.twi_pop,
+            (4, TWI_IRT_STATUS):    self.twi_irt_status,
+        }
+        self.whooks = {
+            (0, DMACTRLR):          self.dma_ctrl,
+            (4, GPIO_INT_MASK_CLR): self.gpio_mask_clr,
+            (4, GPIO_INT_MASK_SET): self.gpio_mask_set,
+            (4, TWI_CTRL):          self.twi_ctrl,
+            (4, TWI_ADDRESS):       self.twi_start,
+            (4, TWI_DATA):          self.twi_fifo.append,
+        }
+        for i in range(8):
+            self.whooks[4, INT_CFG0 + 4 * i] = lambda datum: self.check_irq()
+
+    # register access: run what is due, then hooks or plain memory
+    def read(self, bar, offset, width):
+        if self.events and self.events[0][0] <= self.clock():
+            self.update()
+        hook = self.rhooks.get((bar, offset))
+        if hook:
+            return hook()
+        return rr.SimTransport.read(self, bar, offset, width)
+
+    def write(self, bar, offset, width, datum):
+        if self.events and self.events[0][0] <= self.clock():
+            self.update()
+        rr.SimTransport.write(self, bar, offset, width, datum)
+        hook = self.whooks.get((bar, offset))
+        if hook:
+            hook(datum)
+
+    # blocks of registers go one by one through the hooks
+    def read_block(self, bar, offset, count, width, out):
+        if bar == 0xc:
+            return rr.SimTransport.read_block(self, bar, offset, count,
+                                              width, out)
+        return rr.Transport.read_block(self, bar, offset, count, width, out)
+
+    def write_block(self, bar, offset, data, count, width):
+        if bar == 0xc:
+            return rr.SimTransport.write_block(self, bar, offset, data,
+                                               count, width)
+        return rr.Transport.write_block(self, bar, offset, data, count, width)
+
+    def reg(self, bar, offset):
+        """return the value last written to a 32-bit register"""
+        return self.unpack[4](self.mem[bar], offset)[0]
+
+    # host memory is the DMA buffer, reached through the page list
+    def host_span(self, address, length):
+        """yield (offset in the DMA buffer, count) for a host memory area"""
+        while length > 0:
+            offset = (self.pages[address >> 12] << 12) + (address & 0xfff)
+            count = min(length, 0x1000 - (address & 0xfff))
+            yield offset, count
+            address += count
+            length -= count
+
+    def host_read(self, address, length):
+        buf, data = self.mem[0xc], bytearray()
+        for offset, count in self.host_span(address, length):
+            data += buf[offset:offset + count]
+        return data
+
+    def host_write(self, address, data):
+        buf, done = self.mem[0xc], 0
+        for offset, count in self.host_span(address, len(data)):
+            buf[offset:offset + count] = data[done:done + count]
+            done += count
+
+    # the DMA controller, following the FSM in dma_controller.vhd
+    def dma_ctrl(self, datum):
+        # the start bit is a one-tick pulse in hardware
+        self.pack[4](self.mem[0], DMACTRLR, datum & ~1)
+        if datum & 2 and self.dma_status == DMA_BUSY:
+            self.dma_token += 1
+            self.dma_status = DMA_ABORT
+        if datum & 1:
+            self.dma_start()
+
+    def dma_start(self):
+        length = self.reg(0, DMALENR)
+        if not length >> 2:
+            return self.dma_end(DMA_ERROR)
+        if self.reg(0, DMAATTRIBR) & 2:
+            rate = self.p2l_rate
+        else:
+            rate = self.l2p_rate
+        self.dma_status = DMA_BUSY
+        token = self.dma_token
+        def done():
+            if token == self.dma_token:
+                self.dma_transfer()
+        self.schedule(self.dma_setup + length / rate, done)
+
+    def dma_transfer(self):
+        carrier = self.reg(0, DMACSTARTR)
+        host = self.reg(0, DMAHSTARTHR) << 32 | self.reg(0, DMAHSTARTLR)
+        length = self.reg(0, DMALENR) & ~3
+        attrib = self.reg(0, DMAATTRIBR)
+        try:
+            if carrier + length > len(self.carrier):
+                raise KeyError(carrier)
+            if attrib & 2:
+                self.carrier[carrier:carrier + length] = \
+                    self.host_read(host, length)
+            else:
+                self.host_write(host, self.carrier[carrier:carrier + length])
+            if not attrib & 1:
+                return self.dma_end(DMA_DONE)
+            next = self.reg(0, DMANEXTHR) << 32 | self.reg(0, DMANEXTLR)
+            item = chain_item.unpack(bytes(self.host_read(next, 28)))
+        except KeyError:
+            # outside of the DMA buffer: the host would report an error
+            return self.dma_end(DMA_ERROR)
+        for offset, datum in zip(range(DMACSTARTR, DMAATTRIBR + 4, 4), item):
+            self.pack[4](self.mem[0], offset, datum)
+        self.dma_start()
+
+    def dma_end(self, status):
+        self.dma_status = status
+        self.gpio_status |= 1 << self.dma_irq_gpio
+        self.check_irq()
+
+    # GPIO and interrupt lines
+    def gpio_mask_clr(self, datum):
+        self.gpio_mask &= ~datum
+        self.check_irq()
+
+    def gpio_mask_set(self, datum):
+        self.gpio_mask |= datum & 0xffff
+
+    def gpio_int_status(self):
+        status, self.gpio_status = self.gpio_status, 0
+        return status
+
+    def int_stat(self):
+        if self.gpio_status & ~self.gpio_mask:
+            return INT_STAT_GPIO
+        return 0
+
+    def irqline(self):
+        """INT_STAT, through the lines enabled by INT_CFG0..7"""
+        stat = self.int_stat()
+        for i in range(8):
+            if stat & self.reg(4, INT_CFG0 + 4 * i):
+                return True
+        return False
+
+    def alloc_pages(self, count, contiguous=False):
+        """make up the page list of a new DMA buffer"""
+        if contiguous:
+            self.pfns = list(range(0x20000, 0x20000 + count))
+        else:
+            # like vmalloc: short physically contiguous runs
+            self.pfns = []
+            pfn = 0x20000
+            while len(self.pfns) < count:
+                run = self.rnd.randint(1, 8)
+                self.pfns.extend(range(pfn, pfn + run))
+                pfn += run + self.rnd.randint(1, 64)
+            del self.pfns[count:]
+        self.pages = dict([ (pfn, i) for i, pfn in enumerate(self.pfns) ])
+
+    def setdmasize(self, ds):
+        contiguous = ds.flags & rr.RR_DMA_CONTIGUOUS
+        if contiguous and ds.size > self.max_contiguous:
+            return -errno.ENOMEM
+        err = rr.SimTransport.setdmasize(self, ds)
+        if err == 0:
+            self.alloc_pages(self.getdmasize() >> 12, contiguous)
+        return err
+
+    def getplist(self, plist):
+        for i in range(min(len(plist), len(self.pfns))):
+            plist[i] = self.pfns[i]
+        return 0
+
+    # the TWI controller, with the EEPROM as the only I2C slave
+    def twi_ctrl(self, datum):
+        if datum & TWI_CTRL_CLR_FIFO:
+            del self.twi_fifo[:]
+
+    def twi_status(self):
+        if self.clock() < self.twi_busy:
+            return TWI_STATUS_BUSY
+        return 0
+
+    def twi_pop(self):
+        if self.twi_fifo:
+            return self.twi_fifo.pop(0)
+        return 0
+
+    def twi_irt_status(self):
+        status, self.twi_irt = self.twi_irt, 0
+        return status
+
+    def twi_start(self, datum):
+        size = len(self.eeprom)
+        if datum & 0x7f != self.eeprom_addr:
+            count, status = 1, TWI_IRT_NACK
+            def done():
+                pass
+        elif self.reg(4, TWI_CTRL) & TWI_CTRL_RW:
+            count, status = self.reg(4, TWI_TR_SIZE), TWI_IRT_COMP
+            def done():
+                for i in range(count):
+                    self.twi_fifo.append(self.eeprom[self.twi_ptr])
+                    self.twi_ptr = (self.twi_ptr + 1) % size
+        else:
+            data, self.twi_fifo[:] = self.twi_fifo[:], []
+            count, status = len(data), TWI_IRT_COMP
+            def done():
+                if not data:
+                    return
+                self.twi_ptr = data[0] % size
+                for datum in data[1:]:
+                    self.eeprom[self.twi_ptr] = datum & 0xff
+                    # page writes wrap at the page boundary
+                    page = self.twi_ptr & ~7
+                    self.twi_ptr = page | ((self.twi_ptr + 1) & 7)
+        def complete():
+            done()
+            self.twi_irt |= status
+        delay = (count + 1) * self.twi_byte_time
+        self.twi_busy = self.clock() + delay
+        self.schedule(delay, complete)
+
+if __name__ == '__main__':
+    # a chained transfer like dmatest.py, then a long one for throughput
+    from array import array
+    sim = Gn4124Sim()
+    card = rr.Gennum(sim)
+    pages = [ addr << 12 for addr in card.getplist()[:3] ]
+    with card.batch() as b:
+        b.iwrite(4, GPIO_INT_MASK_CLR, 4, 1 << sim.dma_irq_gpio)
+        b.iwrite(4, INT_CFG0, 4, INT_STAT_GPIO)
+        b.iwrite(0, DMACSTARTR, 4, 0)
+        b.iwrite(0, DMAHSTARTLR, 4, pages[1])
+        b.iwrite(0, DMALENR, 4, 0x40)
+        b.iwrite(0, DMANEXTLR, 4, pages[0])
+        b.iwrite(0, DMAATTRIBR, 4, 0x3)
+    card.write_dmabuf(0, array('I', [0, pages[2], 0, 0x40, 0, 0, 0]))
+    card.write_dmabuf(0x1000, array('I', range(0xdead0000, 0xdead0010)))
+    card.iwrite(0, DMACTRLR, 4, 1)
+    card.irqwait()
+    print('status %i, irq delay %i ns' % (card.iread(0, DMASTATR, 4),
+                                          card.irqena()))
+    print(' '.join([ '%08x' % w for w in
+                     card.read_dmabuf(0x2000, buf=array('I', [0] * 16)) ]))
+
+    # a chain of one item per page, items in the last page of the buffer
+    plist = card.getplist()
+    npages = min(len(sim.carrier) >> 12, 128)
+    items = (card.getdmasize() >> 12) - 1
+    chain = array('I')
+    for i in range(npages):
+        chain.extend([ i << 12, plist[i] << 12, 0, 0x1000,
+                       (plist[items] << 12) + 28 * (i + 1), 0, 1 ])
+    chain[-1] = 0
+    card.write_dmabuf(items << 12, chain)
+    with card.batch() as b:
+        for offset, datum in zip(range(DMACSTARTR, DMAATTRIBR + 4, 4), chain):
+            b.iwrite(0, offset, 4, datum)
+    t0 = time.time()
+    card.iwrite(0, DMACTRLR, 4, 1)
+    while card.iread(0, DMASTATR, 4) == DMA_BUSY:
+        pass
+    print('status %i, %i bytes in %.3f ms' % (card.iread(0, DMASTATR, 4),
+                                    npages << 12, (time.time() - t0) * 1e3))
@@ -0,0 +1,200 @@
+#!  /usr/bin/env python
+#   :vi:ts=4 sw=4 et
+
+# Compile wbgen2 register descriptions (.wb files) into Python modules
+# of register accessors.
+#
+#   wb2py.py [-b bar] [-a base] input.wb [output.py]
+#
+# The generated class holds offsets, masks and shifts as constants and,
+# per instance, one closure per register and field that calls the read
+# and write methods of a Gennum object, with everything else bound at
+# creation: no dict or string lookup on access.
+#
+# The output starts with a hash of the input and options; it is not
+# rewritten when they did not change, so generated modules can be
+# committed and imported with no cost.
+#
+# Registers are laid out one word after the other, like wbgen2 does.
+# For maps that are not wishbone slaves (like the GN4124 BAR4), two
+# keys are added to the syntax: "address" in a reg gives its byte
+# offset and "bit" in a field gives its first bit.
+
+import sys, os, re, getopt, hashlib
+
+version = 2
+
+token_re = re.compile(r'\s+|--[^\n]*|"[^"]*"|[{}=;,]|[^\s{}=;,"]+')
+
+def tokenize(text):
+    for tok in token_re.findall(text):
+        if tok.strip() and not tok.startswith('--'):
+            yield tok
+
+def parse_block(tokens):
+    """parse up to the closing brace into a dict, nested blocks in lists"""
+    block = { 'reg': [], 'field': [] }
+    for tok in tokens:
+        if tok == '}':
+            return block
+        if tok in ';,':
+            continue
+        nxt = next(tokens)
+        if nxt == '{':
+            block.setdefault(tok, []).append(parse_block(tokens))
+        elif nxt == '=':
+            value = next(tokens)
+            if value == '{':
+                value = parse_block(tokens)
+            elif value.startswith('"'):
+                value = value[1:-1]
+            block[tok] = value
+        else:
+            raise SyntaxError('unexpected "%s" after "%s"' % (nxt, tok))
+    raise SyntaxError('missing "}"')
+
+def parse(text):
+    """return the peripheral described in a .wb file"""
+    tokens = tokenize(text)
+    for tok in tokens:
+        if tok == 'peripheral' and next(tokens) == '{':
+            return parse_block(tokens)
+    raise SyntaxError('no peripheral')
+
+def number(s):
+    return int(s, 0)
+
+def layout(periph):
+    """return [(reg, address, [(field, bit, size)])] for a peripheral"""
+    regs, address = [], 0
+    for reg in periph['reg']:
+        address = number(reg.get('address', str(address)))
+        fields, bit = [], 0
+        for field in reg['field']:
+            if field.get('type') in ('BIT', 'MONOSTABLE'):
+                size = 1
+            else:
+                size = number(field.get('size', '1'))
+            align = number(field.get('align', '1'))
+            bit = number(field.get('bit', str((bit + align - 1) // align * align)))
+            fields.append((field, bit, size))
+            bit += size
+        regs.append((reg, address, fields))
+        address += 4
+    return regs
+
+def identifier(s):
+    s = re.sub(r'\W', '_', s.strip()).lower()
+    if s[:1].isdigit():
+        s = 'reg_' + s          # like the "1" prefix of the dummy regs
+    return s
+
+def classname(module):
+    return ''.join([ w.capitalize() for w in module.split('_') ])
+
+def generate(periph, module, bar, base, source, digest):
+    """return the Python source of the accessor module"""
+    cls = classname(module)
+    out = [ '# generated by wb2py.py from %s: do not edit' % source,
+            '# sha1 %s' % digest,
+            '',
+            'class %s(object):' % cls,
+            '    """%s' % periph['name'].strip(),
+            '',
+            '    %s, at BAR%i + 0x%x.' % (periph.get('description',
+                                   periph['name']).strip().rstrip('.'),
+                                   bar, base),
+            '    Accessors are bound to the read/write methods of the card',
+            '    when created: create them after Gennum.select().',
+            '    """',
+            '    bar, base = %i, 0x%x' % (bar, base),
+            '' ]
+    regs = layout(periph)
+    body = []
+    for reg, address, fields in regs:
+        name = identifier(reg['prefix'])
+        const = name.upper()
+        access = reg['field'] and reg['field'][0].get('access_bus',
+                                                     'READ_WRITE')
+        doc = reg['name']
+        if reg['field'] and 'prefix' not in reg['field'][0]:
+            doc += ': ' + reg['field'][0]['name']
+        out.append('    %-24s= 0x%03x # %s' % (const, address, doc))
+        var = 'a_' + name
+        body.append('        %s = base + 0x%x' % (var, address))
+        accessors = [ (name, None, 0, 32, doc) ]
+        for field, bit, size in fields:
+            if 'prefix' in field:
+                accessors.append((name + '_' + identifier(field['prefix']),
+                                  field, bit, size, field['name']))
+        for acc, field, bit, size, doc in accessors:
+            mask = ((1 << size) - 1) << bit
+            if field:
+                out.append('    %-24s= %i' % (acc.upper() + '_SHIFT', bit))
+                out.append('    %-24s= 0x%x' % (acc.upper() + '_MASK', mask))
+                access = field.get('access_bus', 'READ_WRITE')
+            if access != 'WRITE_ONLY':
+                body.append('        def get_%s():' % acc)
+                body.append('            """%s"""' % doc.strip())
+                if field:
+                    body.append('            return (read(bar, %s, 4) & 0x%x)'
+                                ' >> %i' % (var, mask, bit))
+                else:
+                    body.append('            return read(bar, %s, 4)' % var)
+            if access != 'READ_ONLY':
+                body.append('        def set_%s(value):' % acc)
+                body.append('            """%s"""' % doc.strip())
+                if field:
+                    body.append('            write(bar, %s, 4, (read(bar, %s, '
+                                '4) & 0x%x) | ((value << %i) & 0x%x))' %
+                                (var, var, ~mask & 0xffffffff, bit, mask))
+                else:
+                    body.append('            write(bar, %s, 4, value)' % var)
+            for kind in 'get', 'set':
+                if (kind, access) not in (('get', 'WRITE_ONLY'),
+                                          ('set', 'READ_ONLY')):
+                    body.append('        self.%s_%s = %s_%s' %
+                                (kind, acc, kind, acc))
+    out += [ '',
+             '    def __init__(self, card, bar=%i, base=0x%x):' % (bar, base),
+             '        read, write = card.read, card.write' ]
+    out += body
+    return '\n'.join(out) + '\n'
+
+def compile_wb(wbfile, pyfile, bar=0, base=0):
+    """generate pyfile from wbfile, unless it is up to date"""
+    text = open(wbfile).read()
+    h = hashlib.sha1()
+    h.update(('%s %i 0x%x %i\n' % (os.path.basename(pyfile), bar, base,
+                                    version)).encode())
+    h.update(text.encode('latin-1'))
+    digest = h.hexdigest()
+    try:
+        if open(pyfile).read().split('\n')[1] == '# sha1 ' + digest:
+            return False
+    except (IOError, IndexError):
+        pass
+    module = os.path.splitext(os.path.basename(pyfile))[0]
+    src = generate(parse(text), module, bar, base,
+                   os.path.basename(wbfile), digest)
+    open(pyfile, 'w').write(src)
+    return True
+
+if __name__ == '__main__':
+    opts, args = getopt.getopt(sys.argv[1:], 'b:a:')
+    opts = dict(opts)
+    if not 1 <= len(args) <= 2:
+        sys.stderr.write('use: %s [-b bar] [-a base] input.wb [output.py]\n'
+                         % sys.argv[0])
+        sys.exit(1)
+    wbfile = args[0]
+    if len(args) == 2:
+        pyfile = args[1]
+    else:
+        name = os.path.splitext(os.path.basename(wbfile))[0]
+        name = re.sub('_wb_slave$', '', name)
+        if not name.endswith('_regs'):
+            name += '_regs'
+        pyfile = name + '.py'
+    compile_wb(wbfile, pyfile, number(opts.get('-b', '0')),
+               number(opts.get('-a', '0')))
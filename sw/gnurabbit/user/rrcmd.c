@@ -32,6 +32,7 @@ void help(void)
 	fprintf(stderr, "   <cmd> = irqwait\n");
 	fprintf(stderr, "   <cmd> = irqena\n");
 	fprintf(stderr, "   <cmd> = getdmasize\n");
+	fprintf(stderr, "   <cmd> = setdmasize <size> [contig]\n");
 	fprintf(stderr, "   <cmd> = getplist\n");
 	fprintf(stderr, "   <cmd> = r[<sz>] <bar>:<addr>\n");
 	fprintf(stderr, "   <cmd> = w[<sz>] <bar>:<addr> <val>\n");
@@ -169,23 +170,49 @@ int do_iocmd(int fd, char *cmdname, char *addr, char *datum)
 
 int do_getplist(int fd)
 {
-	uintptr_t plist[RR_PLIST_LEN];
+	struct rr_plist pl;
+	uint64_t *plist;
 	int i, size;
 
 	size = ioctl(fd, RR_GETDMASIZE);
 	if (size < 0)
 		return -errno;
-	i = ioctl(fd, RR_GETPLIST, plist);
-	if (i < 0)
-		return -errno;
+	plist = malloc(size / RR_PLIST_SIZE * sizeof(*plist));
+	if (!plist)
+		return -ENOMEM;
+	pl.pages = (uintptr_t)plist;
+	pl.count = size / RR_PLIST_SIZE;
+	i = ioctl(fd, RR_GETPLIST64, &pl);
+	if (i < 0) {
+		i = -errno;
+		free(plist);
+		return i;
+	}
 
 	for (i = 0; i < size/RR_PLIST_SIZE; i++)
-		printf("buf 0x%08x: pfn 0x%08x, addr 0x%016llx\n",
-		       i * RR_PLIST_SIZE, plist[i],
+		printf("buf 0x%08x: pfn 0x%08llx, addr 0x%016llx\n",
+		       i * RR_PLIST_SIZE, (unsigned long long)plist[i],
 		       (unsigned long long)plist[i] << 12);
+	free(plist);
 	return 0;
 }
 
+int do_setdmasize(int fd, char *size, char *contig)
+{
+	struct rr_dmasize ds;
+	char rest;
+
+	if (sscanf(size, "%x%c", &ds.size, &rest) != 1)
+		return -EINVAL;
+	ds.flags = 0;
+	if (contig && strcmp(contig, "contig"))
+		return -EINVAL;
+	if (contig)
+		ds.flags = RR_DMA_CONTIGUOUS;
+	if (ioctl(fd, RR_SETDMASIZE, &ds) < 0)
+		return -errno;
+	return 0;
+}
 
 int main(int argc, char **argv)
 {
@@ -226,9 +253,13 @@ int main(int argc, char **argv)
 		ret = 0;
 	} else if (argc > 1 && !strcmp(argv[1], "irqwait")) {
 		ret = ioctl(fd, RR_IRQWAIT);
-		if (ret < 0)
+		if (ret < 0) {
 			fprintf(stderr, "%s: ioctl(IRQWAIT): %s\n", argv[0],
 				strerror(errno));
+		} else {
+			printf("wakeup: %i ns\n", ret);
+			ret = 0;
+		}
 	} else if (argc > 1 && !strcmp(argv[1], "irqena")) {
 		ret = ioctl(fd, RR_IRQENA);
 		if (ret < 0) {
@@ -245,6 +276,8 @@ int main(int argc, char **argv)
 		ret = 0;
 	} else if (argc > 1 && !strcmp(argv[1], "getplist")) {
 		ret = do_getplist(fd);
+	} else if (argc > 2 && !strcmp(argv[1], "setdmasize")) {
+		ret = do_setdmasize(fd, argv[2], argv[3] /* may be NULL */);
 	} else if (argc == 3 || argc == 4) {
 		ret = do_iocmd(fd, argv[1], argv[2], argv[3] /* may be NULL */);
 	} else if (argc > 4) {